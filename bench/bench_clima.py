@@ -0,0 +1,118 @@
+# bench/bench_clima.py
+"""
+Benchmark del parser de Clima.com (citybike.clima) contra fixtures guardados.
+
+    python bench/bench_clima.py
+
+Precisión: cada HTML de bench/fixtures/clima/ se compara con
+expected.json, también partiéndolo en trozos diminutos (textos y etiquetas
+cortados entre feeds). Tiempo: cada fixture y una página grande (el
+fixture 'actual.html' con ~2 MB de divs anidados después del bloque
+principal) con el parser nuevo y, si bs4 está instalado, con la versión
+anterior de BeautifulSoup como referencia.
+
+Sale con código 1 si algún resultado no coincide o si la página grande
+se pasa del presupuesto.
+"""
+import os
+import re
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from citybike.clima import parse_clima
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "clima")
+BIG_PAGE_BUDGET_MS = 20.0   # parser nuevo sobre la página de ~2 MB
+BIG_PAGE_TAIL_BLOCKS = 16000
+REPEAT = 5
+
+
+def legacy_parse(text):
+    """scrape_clima_miraflores() anterior (árbol completo de BeautifulSoup), solo como referencia."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(text, "html.parser")
+    temp = None
+    clima_desc = None
+    header = soup.find(lambda tag: tag.name in ['h1', 'h2', 'h3', 'div'] and 'Miraflores' in (tag.get_text() or ""))
+    if header:
+        candidate = header.find_next(string=re.compile(r'\d{1,2}(?:\.\d+)?\s*°'))
+        if candidate:
+            m = re.search(r'(\d{1,2}(?:\.\d+)?)\s*°', candidate)
+            if m:
+                temp = float(m.group(1))
+        img = header.find_next('img', alt=True)
+        if img and img.get('alt'):
+            clima_desc = img.get('alt').strip()
+    if (temp is None) or (clima_desc is None):
+        m = re.search(r'Image:\s*([A-Za-zÁÉÍÓÚáéíóúñÑ\s]+)[^\d\S\r\n]{0,40}(\d{1,2}(?:\.\d+)?)\s*°', text, flags=re.S)
+        if m:
+            if clima_desc is None:
+                clima_desc = m.group(1).strip()
+            if temp is None:
+                temp = float(m.group(2))
+    if temp is None:
+        m2 = re.search(r'(\d{1,2}(?:\.\d+)?)\s*°', text)
+        if m2:
+            temp = float(m2.group(1))
+    if clima_desc:
+        clima_desc = re.sub(r'\s+', ' ', clima_desc).strip()
+    return {'temp_C': temp, 'clima': clima_desc}
+
+def big_page():
+    with open(os.path.join(FIXTURES, "actual.html"), encoding="utf-8") as f:
+        base = f.read()
+    block = ('<div class="hour"><div class="h"><div class="t"><span>{h}:00</span>'
+             '<img src="/i/{i}.svg" alt="Nuboso"><span>{t}°</span></div></div></div>\n')
+    tail = "".join(block.format(h=i % 24, i=i % 9, t=15 + i % 7) for i in range(BIG_PAGE_TAIL_BLOCKS))
+    return base.replace("</main>", tail + "</main>")
+
+def best_ms(fn, text, repeat=REPEAT):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(text)
+        dt = (time.perf_counter() - t0) * 1000.0
+        best = dt if best is None else min(best, dt)
+    return best
+
+def main():
+    try:
+        import bs4  # noqa: F401
+        have_bs4 = True
+    except ImportError:
+        have_bs4 = False
+        print("(bs4 no instalado: se omite la referencia anterior)")
+
+    with open(os.path.join(FIXTURES, "expected.json"), encoding="utf-8") as f:
+        expected = json.load(f)
+    pages = {}
+    for name in sorted(expected):
+        with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+            pages[name] = f.read()
+    pages["actual.html + 2 MB"] = big_page()
+    expected["actual.html + 2 MB"] = expected["actual.html"]
+
+    ok = True
+    for name, text in pages.items():
+        want = expected[name]
+        got = parse_clima(text)
+        exact = got == want and all(parse_clima(text, chunk_chars=n) == want for n in (1, 7, 64))
+        new_ms = best_ms(parse_clima, text)
+        line = f"{name:24s} {len(text) / 1024:8.1f} KB  nuevo {new_ms:8.2f} ms"
+        if have_bs4:
+            t0 = time.perf_counter()
+            old = legacy_parse(text)  # una sola vez: en la página grande tarda segundos
+            line += f"  bs4 {(time.perf_counter() - t0) * 1000.0:8.2f} ms" + ("" if old == want else " (bs4 difiere)")
+        big = name.endswith("MB")
+        fast = not big or new_ms <= BIG_PAGE_BUDGET_MS
+        status = "OK" if exact and fast else "FALLA"
+        ok = ok and status == "OK"
+        print(f"{status:5s} {line}" + ("" if exact else f"  -> {got} != {want}"))
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# bench/bench_collect.py
+"""
+Benchmark de punta a punta sin red: collect_snapshot() + store_snapshot()
+contra el servidor stand-in (bench/standin.py) y en modo replay.
+
+    python bench/bench_collect.py
+    python bench/bench_collect.py --sizes 100,1000 --latency-ms 80 --fail-rate 0.2 --repeat 5 --json out.json
+
+Por cada escenario (red sintética de N estaciones, latencia, tasa de
+fallos) se toman --repeat snapshots y se guardan con cada modo de
+--modes, todo en un directorio temporal. Informa p50/p95 del snapshot
+completo, estaciones por segundo, la memoria pico (tracemalloc, en una
+corrida aparte para no distorsionar los tiempos), las peticiones y fallos
+inyectados, y el p95 de las etapas más lentas (citybike.metrics).
+
+Además graba un cassette con un snapshot real de la red más chica (modo
+"record" de citybike.replay contra el stand-in) y lo repite en modo
+replay: debe dar las mismas filas sin tocar la red.
+
+Sale con código 1 si algún escenario sin fallos inyectados no produce
+todas las estaciones, si el replay no coincide o si se pasa algún
+presupuesto.
+"""
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from standin import SyntheticCity, StandIn  # noqa: E402
+from citybike import metrics, replay  # noqa: E402
+
+SIZES = [100, 1000, 10000]
+MODES = ["full", "delta", "daily"]
+REPEAT = 3
+LATENCY_MS = 20.0
+JITTER_MS = 10.0
+FAULTY = {'stations': 1000, 'fail_rate': 0.2}  # escenario extra con fallos inyectados
+
+P95_BUDGET_SECONDS = {100: 3.0, 1000: 5.0, 10000: 15.0}  # snapshot + guardado en todos los modos
+PEAK_BYTES_PER_STATION = 40_000
+TOP_STAGES = 4
+
+
+def run_once(owm_key, modes):
+    from citybike.snapshot import collect_snapshot
+    from citybike.pipeline import store_snapshot
+
+    snap = collect_snapshot(owm_key)
+    for mode in modes:
+        store_snapshot(snap, mode=mode)
+    return snap
+
+def scenario(stations, latency_ms, jitter_ms, fail_rate, repeat, modes, owm_key):
+    """Corre un escenario en un directorio temporal; devuelve el resumen."""
+    workdir = tempfile.mkdtemp(prefix="citybike-bench-")
+    cwd = os.getcwd()
+    city = SyntheticCity(stations)
+    standin = StandIn(city, latency_ms, jitter_ms, fail_rate).start()
+    replay.use("standin", standin.base_url)
+    os.chdir(workdir)
+    try:
+        seconds = []
+        rows = []
+        for _ in range(repeat):
+            t0 = perf_counter()
+            with metrics.trace():
+                snap = run_once(owm_key, modes)
+            seconds.append(perf_counter() - t0)
+            rows.append(len(snap))
+        tracemalloc.start()
+        run_once(owm_key, modes)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stages = [r for r in metrics.summarize(metrics.load()) if r['stage'] != "total"][:TOP_STAGES]
+    finally:
+        os.chdir(cwd)
+        replay.use("live")
+        standin.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    p50 = metrics.percentile(seconds, 50)
+    return {
+        'stations': stations, 'latency_ms': latency_ms, 'fail_rate': fail_rate, 'modes': modes,
+        'runs': repeat, 'complete': sum(1 for n in rows if n == stations),
+        'p50': p50, 'p95': metrics.percentile(seconds, 95),
+        'stations_per_second': stations / p50 if p50 else None,
+        'peak_bytes': peak, 'requests': standin.served, 'injected_failures': standin.failed,
+        'stages': [{'stage': s['stage'], 'p95': s['p95']} for s in stages],
+    }
+
+# columnas que dependen del momento del snapshot y no de las respuestas grabadas
+CLOCK_COLUMNS = ('scrape_timestamp', 'day_of_week', 'periodo_dia')
+
+def _comparable(snap):
+    return [{k: v for k, v in row.items() if k not in CLOCK_COLUMNS} for row in snap] if snap else []
+
+def replay_check(stations, owm_key):
+    """
+    Graba un snapshot real contra el stand-in (fetch() en modo "record") y
+    lo repite desde el cassette en un directorio limpio (sin cachés).
+    """
+    from citybike.snapshot import collect_snapshot
+
+    workdir = tempfile.mkdtemp(prefix="citybike-replay-")
+    cwd = os.getcwd()
+    cassette = os.path.join(workdir, "cassette")
+    standin = StandIn(SyntheticCity(stations)).start()
+    try:
+        os.makedirs(os.path.join(workdir, "record"))
+        os.chdir(os.path.join(workdir, "record"))
+        replay.use("record", cassette, upstream=standin.base_url)
+        recorded = collect_snapshot(owm_key)
+        standin.stop()  # el replay no debe necesitar la red
+        os.makedirs(os.path.join(workdir, "replay"))
+        os.chdir(os.path.join(workdir, "replay"))
+        replay.use("replay", cassette)
+        t0 = perf_counter()
+        snap = collect_snapshot(owm_key)
+        seconds = perf_counter() - t0
+    finally:
+        os.chdir(cwd)
+        replay.use("live")
+        if standin.thread.is_alive():
+            standin.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    same = len(recorded) == stations and _comparable(snap) == _comparable(recorded)
+    return same, seconds
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sizes", default=",".join(str(n) for n in SIZES))
+    ap.add_argument("--modes", default=",".join(MODES))
+    ap.add_argument("--repeat", type=int, default=REPEAT)
+    ap.add_argument("--latency-ms", type=float, default=LATENCY_MS)
+    ap.add_argument("--jitter-ms", type=float, default=JITTER_MS)
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="Fallos inyectados en todos los escenarios")
+    ap.add_argument("--owm", action="store_true", help="Pasar una clave OWM (el stand-in también hace de OWM)")
+    ap.add_argument("--json", default=None, help="Guardar los resultados en este archivo")
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR,
+                        format="%(asctime)s - %(levelname)s - %(message)s")
+    owm_key = "bench" if args.owm else None
+    modes = args.modes.split(",")
+    plan = [(int(n), args.fail_rate) for n in args.sizes.split(",")]
+    if args.fail_rate == 0.0:
+        plan.append((FAULTY['stations'], FAULTY['fail_rate']))
+
+    ok = True
+    results = []
+    for stations, fail_rate in plan:
+        r = scenario(stations, args.latency_ms, args.jitter_ms, fail_rate, args.repeat, modes, owm_key)
+        results.append(r)
+        budget = P95_BUDGET_SECONDS.get(stations)
+        complete = r['complete'] == r['runs'] or fail_rate > 0
+        fast = budget is None or fail_rate > 0 or r['p95'] <= budget
+        lean = r['peak_bytes'] <= PEAK_BYTES_PER_STATION * stations
+        status = "OK" if complete and fast and lean else "FALLA"
+        ok = ok and status == "OK"
+        print(f"{status:5s} {stations:6d} est. fallos {fail_rate:4.0%}: p50 {r['p50']:6.2f} s  p95 {r['p95']:6.2f} s"
+              + (f" (presupuesto {budget:.0f} s)" if budget and not fail_rate else "")
+              + f"  {r['stations_per_second']:9.0f} est/s  pico {r['peak_bytes'] / 2 ** 20:6.1f} MB"
+              + f"  {r['complete']}/{r['runs']} completos  {r['requests']} peticiones ({r['injected_failures']} fallidas)")
+        print("      etapas p95: " + ", ".join(f"{s['stage']} {s['p95']:.3f} s" for s in r['stages']))
+
+    smallest = min(n for n, _ in plan)
+    same, seconds = replay_check(smallest, owm_key)
+    ok = ok and same
+    print(f"{'OK' if same else 'FALLA':5s} replay de {smallest} estaciones desde el cassette: {seconds:.2f} s"
+          + ("" if same else " (las estaciones no coinciden con lo grabado)"))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({'results': results, 'replay_ok': same}, f, indent=2)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
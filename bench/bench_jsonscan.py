@@ -0,0 +1,119 @@
+# bench/bench_jsonscan.py
+"""
+Micro-benchmark del extractor de JSON embebido (citybike.jsonscan).
+
+    python bench/bench_jsonscan.py [--save DIR]
+
+Genera bundles de JS sintéticos de 1, 4 y 16 MB (semilla fija) con ruido
+parecido a un bundle real: código minificado, strings y comentarios con
+corchetes, regex literales, objetos sin coordenadas y un array de
+estaciones enterrado en un objeto de configuración. Verifica que se
+extraigan exactamente las estaciones sembradas, mide el throughput y que
+el tiempo crezca linealmente con el tamaño. Con --save escribe los
+fixtures en DIR para inspeccionarlos o reutilizarlos.
+
+Sale con código 1 si la extracción no es exacta, si se pasa del
+presupuesto de tiempo o si el crecimiento no es lineal.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from citybike.jsonscan import extract_stations
+
+SIZES_MB = [1, 4, 16]
+N_STATIONS = 400
+MIN_MB_PER_S = 5.0        # throughput mínimo aceptable
+MAX_SCALING = 1.6         # (seg/MB del más grande) / (seg/MB del más chico)
+REPEAT = 3
+
+NOISE = [
+    'function a(b){return b&&b.c?[b.c[0],{d:b.c[1]}]:[]}',
+    'var s="texto con ] y } y [ sueltos";',
+    "var q='otro } string [ con comillas';",
+    'var t=`template ${"[x"} con ] raro`;',
+    '/* comentario con { y [ sin cerrar */',
+    '// comentario de línea con ]]}}\n',
+    'var r=x/2+y/3;',
+    'var re=/\\[(\\d+)/g;',
+    'var cfg={"layers":[{"id":1,"zoom":[10,18]},{"id":2,"opacity":0.5}],"theme":"dark"};',
+    'var pts=[{"x":1,"y":2},{"x":3,"y":4}];',
+    'el.addEventListener("click",function(e){e.preventDefault();});',
+]
+
+
+def station_array(rng, n):
+    return [{
+        "id": f"st-{i}",
+        "name": f"Estación {i} [Av. \"Larco\" {{{i}}}]",
+        "lat": round(-12.12 + rng.uniform(-0.02, 0.02), 6),
+        "lon": round(-77.03 + rng.uniform(-0.02, 0.02), 6),
+        "bikes": rng.randint(0, 20),
+    } for i in range(n)]
+
+def make_bundle(size_mb, seed=0):
+    """(texto, estaciones sembradas): ruido hasta ~size_mb con el array de estaciones a la mitad."""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    stations = station_array(rng, N_STATIONS)
+    payload = 'window.__APP__={"map":{"center":[-12.12,-77.03],"data":{"stations":' \
+              + json.dumps(stations, ensure_ascii=False) + '}}};'
+    chunks, n = [], 0
+    half_done = False
+    while n < target:
+        if not half_done and n >= target // 2:
+            chunks.append(payload)
+            n += len(payload)
+            half_done = True
+            continue
+        c = rng.choice(NOISE)
+        chunks.append(c)
+        n += len(c)
+    return "".join(chunks), stations
+
+def timed(text):
+    best, out = None, None
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        out = extract_stations([text])
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, out
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del extractor de JSON embebido.")
+    parser.add_argument("--save", default=None, help="Directorio donde escribir los bundles generados")
+    args = parser.parse_args(argv)
+
+    ok = True
+    per_mb = []
+    for size in SIZES_MB:
+        text, expected = make_bundle(size, seed=size)
+        if args.save:
+            os.makedirs(args.save, exist_ok=True)
+            with open(os.path.join(args.save, f"bundle_{size}mb.js"), "w", encoding="utf-8") as f:
+                f.write(text)
+        secs, got = timed(text)
+        mb = len(text) / (1024 * 1024)
+        exact = [(s['id'], s['lat'], s['lon']) for s in got] == [(s['id'], s['lat'], s['lon']) for s in expected]
+        speed = mb / secs
+        status = "OK" if exact and speed >= MIN_MB_PER_S else "FALLA"
+        ok = ok and status == "OK"
+        per_mb.append(secs / mb)
+        print(f"{status:5s} bundle {mb:5.1f} MB: {secs * 1000:8.1f} ms, {speed:6.1f} MB/s, "
+              f"{len(got)}/{len(expected)} estaciones" + ("" if exact else " (no coincide)"))
+
+    scaling = per_mb[-1] / per_mb[0]
+    status = "OK" if scaling <= MAX_SCALING else "FALLA"
+    ok = ok and status == "OK"
+    print(f"{status:5s} crecimiento: {scaling:.2f}x seg/MB entre {SIZES_MB[0]} y {SIZES_MB[-1]} MB "
+          f"(máximo {MAX_SCALING}x)")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
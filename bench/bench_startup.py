@@ -0,0 +1,68 @@
+# bench/bench_startup.py
+"""
+Benchmark de arranque: el import del recolector y un run no-op deben
+quedarse bajo un presupuesto fijo y no cargar dependencias pesadas.
+
+    python bench/bench_startup.py
+
+Mide con ``python -X importtime`` el tiempo acumulado de los imports de
+primer nivel y el tiempo total de ``python -m citybike --help``. Sale con
+código 1 si se pasa algún presupuesto o si se cargó un módulo prohibido.
+"""
+import os
+import sys
+import time
+import subprocess
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_BUDGET_MS = 250   # import prueba_5 / citybike.snapshot (sin el intérprete)
+NOOP_BUDGET_MS = 500     # proceso completo de 'python -m citybike --help'
+REPEAT = 5
+
+# No deben cargarse al importar: solo cuando se usa el fallback que los necesita
+FORBIDDEN = ["pandas", "selenium", "webdriver_manager", "bs4", "openpyxl"]
+
+
+def import_time_ms(stmt):
+    """Suma del tiempo acumulado (µs) de los imports de primer nivel según -X importtime."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", stmt],
+                          cwd=REPO, capture_output=True, text=True, check=True)
+    total_us = 0
+    modules = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.add(name.strip().split(".")[0])
+        if not name.startswith("  "):  # solo imports de primer nivel (sin sangría)
+            total_us += int(cumulative_us)
+    return total_us / 1000.0, modules
+
+def wall_ms(args):
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable] + args, cwd=REPO, capture_output=True, check=True)
+    return (time.perf_counter() - t0) * 1000.0
+
+def main():
+    ok = True
+    for stmt in ["import prueba_5", "import citybike.snapshot"]:
+        best = None
+        for _ in range(REPEAT):
+            ms, modules = import_time_ms(stmt)
+            best = ms if best is None else min(best, ms)
+        loaded = [m for m in FORBIDDEN if m in modules]
+        status = "OK" if best <= IMPORT_BUDGET_MS and not loaded else "FALLA"
+        ok = ok and status == "OK"
+        print(f"{status:5s} {stmt!r}: {best:.1f} ms (presupuesto {IMPORT_BUDGET_MS} ms)"
+              + (f", cargó {', '.join(loaded)}" if loaded else ""))
+
+    best = min(wall_ms(["-m", "citybike", "--help"]) for _ in range(REPEAT))
+    status = "OK" if best <= NOOP_BUDGET_MS else "FALLA"
+    ok = ok and status == "OK"
+    print(f"{status:5s} 'python -m citybike --help': {best:.1f} ms (presupuesto {NOOP_BUDGET_MS} ms)")
+
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+# bench/standin.py
+"""
+Servidor local que hace de api.citybik.es, Clima.com, OpenWeatherMap y el
+KML de Google My Maps, con latencia y fallos inyectados.
+
+    python bench/standin.py --stations 1000 --latency-ms 40 --fail-rate 0.1
+    python bench/standin.py --cassette data/cassettes/lima    # respuestas grabadas
+    python -m citybike snapshot --http standin --cassette http://127.0.0.1:8765
+
+Con citybike.replay en modo "standin" cada URL se pide como
+``<base>/<host>/<ruta>``. Sin --cassette responde una red sintética
+("citybike-lima", N estaciones alrededor de Lima cuyas bicicletas cambian
+en ~10% de las estaciones en cada descarga), la página de Clima.com de
+bench/fixtures/clima/actual.html, una capa KML con polígonos y puntos, y
+clima OWM fijo. Todo lo demás (p.ej. las sondas GBFS) es 404.
+
+Fallos: con probabilidad --fail-rate una petición recibe un 503 o se le
+corta la conexión sin respuesta (mitad y mitad).
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qsl
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CLIMA_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "clima", "actual.html")
+LIMA = (-12.08, -77.03)
+SPREAD_DEG = 0.12
+CHANGED_FRACTION = 0.1
+KML_ZONES = 4  # grilla de 4x4 polígonos más unos puntos
+SECRET_PARAMS = {"appid"}
+
+
+# ---------- RESPUESTAS SINTÉTICAS ----------
+class SyntheticCity:
+    """Red sintética de 'stations' estaciones; cada descarga cambia ~10% de ellas."""
+
+    def __init__(self, stations=1000, seed=7):
+        self.lock = threading.Lock()
+        self.rng = random.Random(seed)
+        self.resize(stations)
+        with open(CLIMA_FIXTURE, "rb") as f:
+            self.clima = f.read()
+        self.kml = synthetic_kml().encode("utf-8")
+
+    def resize(self, stations):
+        with self.lock:
+            rng = self.rng
+            self.stations = []
+            for i in range(stations):
+                cap = rng.randint(8, 30)
+                bikes = rng.randint(0, cap)
+                self.stations.append({
+                    'id': f"{i:08x}{rng.getrandbits(64):016x}",
+                    'name': f"Estación sintética {i}",
+                    'latitude': round(LIMA[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG), 6),
+                    'longitude': round(LIMA[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG), 6),
+                    'free_bikes': bikes,
+                    'empty_slots': cap - bikes,
+                    'timestamp': None,
+                    'extra': {'slots': cap, 'uid': str(i)},
+                })
+
+    def network(self):
+        with self.lock:
+            now = time.strftime("%Y-%m-%dT%H:%M:%S.000000Z", time.gmtime())
+            for s in self.rng.sample(self.stations, int(len(self.stations) * CHANGED_FRACTION)):
+                cap = s['extra']['slots']
+                s['free_bikes'] = self.rng.randint(0, cap)
+                s['empty_slots'] = cap - s['free_bikes']
+                s['timestamp'] = now
+            body = json.dumps({'network': {'id': "citybike-lima", 'name': "Citybike Lima",
+                                           'stations': self.stations}})
+        return body.encode("utf-8")
+
+    def route(self, host, path, query):
+        """(status, content_type, cuerpo) para host + ruta."""
+        if host == "api.citybik.es" and path == "/v2/networks":
+            body = {'networks': [
+                {'id': "ecobici", 'name': "Ecobici", 'location': {'city': "Ciudad de México", 'country': "MX"}},
+                {'id': "citybike-lima", 'name': "Citybike Lima", 'location': {'city': "Lima", 'country': "PE"}},
+            ]}
+            return 200, "application/json", json.dumps(body).encode("utf-8")
+        if host == "api.citybik.es" and path == "/v2/networks/citybike-lima":
+            return 200, "application/json", self.network()
+        if host == "www.clima.com":
+            return 200, "text/html; charset=utf-8", self.clima
+        if host == "api.openweathermap.org":
+            body = {'weather': [{'main': "Clouds", 'description': "nubes dispersas"}],
+                    'main': {'temp': 18.4}, 'wind': {'speed': 3.6}}
+            return 200, "application/json", json.dumps(body).encode("utf-8")
+        if host == "www.google.com" and path.startswith("/maps/d/kml"):
+            return 200, "application/vnd.google-earth.kml+xml", self.kml
+        return 404, "text/plain", b"no encontrado"
+
+def synthetic_kml(zones=KML_ZONES):
+    step = 2 * SPREAD_DEG / zones
+    marks = []
+    for i in range(zones):
+        for j in range(zones):
+            lat0 = LIMA[0] - SPREAD_DEG + i * step
+            lon0 = LIMA[1] - SPREAD_DEG + j * step
+            ring = " ".join(f"{lon},{lat},0" for lat, lon in [(lat0, lon0), (lat0, lon0 + step),
+                                                               (lat0 + step, lon0 + step), (lat0 + step, lon0),
+                                                               (lat0, lon0)])
+            marks.append(f"<Placemark><name>Zona {i}-{j}</name><ExtendedData><Data name=\"densidad\">"
+                         f"<value>{1000 + 250 * (i + j)}</value></Data></ExtendedData><Polygon><outerBoundaryIs>"
+                         f"<LinearRing><coordinates>{ring}</coordinates></LinearRing></outerBoundaryIs></Polygon>"
+                         f"</Placemark>")
+    points = "".join(f"<Placemark><name>Universidad {k}</name><Point><coordinates>"
+                     f"{LIMA[1] + 0.02 * k},{LIMA[0] - 0.01 * k},0</coordinates></Point></Placemark>"
+                     for k in range(5))
+    return ('<?xml version="1.0" encoding="UTF-8"?><kml xmlns="http://www.opengis.net/kml/2.2"><Document>'
+            f"<Folder><name>Distritos</name>{''.join(marks)}</Folder>"
+            f"<Folder><name>Universidades</name>{points}</Folder></Document></kml>")
+
+
+# ---------- RESPUESTAS GRABADAS ----------
+def _query_key(url, pairs):
+    return url + "?" + json.dumps(sorted((k, str(v)) for k, v in pairs if k not in SECRET_PARAMS))
+
+class CassetteRoutes:
+    """Sirve las respuestas de un cassette de citybike.replay (las URLs que no estén grabadas: 404)."""
+
+    def __init__(self, root):
+        from citybike.replay import Cassette
+
+        self.entries = {}
+        for url, params, status, ctype, body_path in Cassette(root).entries():
+            parts = urlsplit(url)
+            pairs = parse_qsl(parts.query) + list((params or {}).items())
+            base = f"{parts.scheme}://{parts.netloc}{parts.path}"
+            self.entries[_query_key(base, pairs)] = (status, ctype, body_path)
+
+    def route(self, host, path, query):
+        for scheme in ("https", "http"):
+            hit = self.entries.get(_query_key(f"{scheme}://{host}{path}", parse_qsl(query)))
+            if hit:
+                status, ctype, body_path = hit
+                with open(body_path, "rb") as f:
+                    return status, ctype, f.read()
+        return 404, "text/plain", b"sin respuesta grabada"
+
+
+# ---------- SERVIDOR ----------
+class StandIn:
+    """
+    Servidor en un hilo propio. 'routes' responde route(host, path, query);
+    'latency_ms' (+ 'jitter_ms' aleatorio) se duerme antes de cada respuesta
+    y 'fail_rate' es la probabilidad de un 503 o una conexión cortada.
+    """
+
+    def __init__(self, routes, latency_ms=0.0, jitter_ms=0.0, fail_rate=0.0, port=0, seed=11):
+        self.routes = routes
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.served = 0
+        self.failed = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                host, _, rest = parts.path.lstrip("/").partition("/")
+                with standin.lock:
+                    delay = standin.latency_ms + standin.rng.uniform(0, standin.jitter_ms)
+                    fail = standin.rng.random() < standin.fail_rate
+                    drop = fail and standin.rng.random() < 0.5
+                    standin.served += 1
+                    standin.failed += int(fail)
+                time.sleep(delay / 1000.0)
+                if drop:
+                    self.close_connection = True
+                    self.connection.close()
+                    return
+                if fail:
+                    status, ctype, body = 503, "text/plain", b"falla inyectada"
+                else:
+                    status, ctype, body = standin.routes.route(host, "/" + rest, parts.query)
+                self.send_response(status)
+                self.send_header("Content-Type", ctype or "application/octet-stream")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="standin", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Servidor stand-in para citybike (modo HTTP 'standin')")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--stations", type=int, default=1000, help="Estaciones de la red sintética")
+    ap.add_argument("--cassette", default=None, help="Servir un cassette grabado en vez de la red sintética")
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    args = ap.parse_args()
+    routes = CassetteRoutes(args.cassette) if args.cassette else SyntheticCity(args.stations)
+    standin = StandIn(routes, args.latency_ms, args.jitter_ms, args.fail_rate, port=args.port)
+    print(f"Stand-in en {standin.base_url} (Ctrl+C para salir)")
+    try:
+        standin.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        standin.server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Recolector CityBike Lima.
+
+Paquete ligero: importar ``citybike`` no carga pandas, Selenium ni
+BeautifulSoup. Cada módulo importa sus dependencias pesadas solo cuando
+se usan.
+
+- config:    URLs, rutas y parámetros de muestreo
+- fetch:     capa HTTP compartida (sesión, caché condicional, reintentos)
+- replay:    grabación / reproducción de respuestas HTTP y redirección al stand-in de bench/
+- networks:  redes a recolectar y sus regiones de clima (networks.json)
+- metrics:   trazas por etapa de cada snapshot (data/metrics.jsonl) y su resumen p50/p95
+- discovery: caché de la fuente de estaciones que funcionó
+- stations:  fuentes de estaciones (CityBikes API, GBFS, feed JSON, Selenium)
+- browser:   pool de Chrome headless reutilizable para el fallback Selenium
+- jsonscan:  extractor lineal de arrays de estaciones en scripts embebidos
+- weather:   fuentes de clima (Clima.com, OpenWeatherMap por celdas)
+- clima:     parser en streaming de la página de Clima.com
+- enrich:    enriquecimiento geográfico de cada estación
+- snapshot:  arma un snapshot completo (estaciones + clima)
+- model:     Snapshot compacto (campos compartidos + columnas tipadas)
+- storage:   almacén append-only de snapshots
+- delta:     registro solo-cambios (dimensión + estados + keyframes) y su reconstrucción
+- daily:     un .csv.gz determinista por día (lo que versiona el workflow)
+- quality:   normalización de fuentes, validación de tipos y deduplicación en streaming
+- analytics: agregados incrementales de uso por estación
+- pipeline:  guarda cada snapshot (almacén, delta o diario + agregados)
+- export:    CSV/Excel bajo demanda, en streaming
+- multi:     recolección de varias redes en paralelo, aisladas entre sí
+- daemon:    recolección continua alineada al reloj
+- runner:    bucle de recolección de varios días (interfaz original)
+- cli:       punto de entrada único (``python -m citybike``)
+"""
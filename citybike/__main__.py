@@ -0,0 +1,3 @@
+from citybike.cli import main
+
+main()
@@ -0,0 +1,259 @@
+# citybike/analytics.py
+"""
+Agregados incrementales de uso por estación.
+
+Se mantienen sumas acumuladas por (station_id, day_of_week, periodo_dia) en
+``data/aggregates.json``: cada snapshot nuevo los actualiza en O(estaciones)
+y las consultas (tasa de ocupación, tiempo vacía/llena, rotación entre
+snapshots) salen de esas sumas sin releer el historial.
+
+compute_from_history() recalcula lo mismo desde cero con pandas sobre el
+almacén completo; check() compara ambos para validar el incremental. El
+estado recuerda de qué historial salieron sus snapshots ('source': el
+almacén, el registro delta o los .csv.gz diarios, según el modo de
+grabación), que es contra el que se verifica por defecto.
+"""
+import os
+import json
+import math
+import logging
+from datetime import datetime
+
+from citybike.config import AGGREGATES_FILE, AGGREGATE_MAX_GAP_SECONDS
+
+STATE_VERSION = 1
+SUM_FIELDS = ['n', 'occ_sum', 'occ_n', 'empty_n', 'full_n',
+              'empty_seconds', 'full_seconds', 'turnover_sum', 'turnover_n']
+BUCKET_COLS = ['station_id', 'day_of_week', 'periodo_dia']
+SOURCES = ("store", "delta", "daily")
+MIXED_SOURCE = "mixed"  # snapshots grabados con modos distintos: ningún historial los tiene todos
+
+
+# ---------- ESTADO ----------
+def new_state(source=None):
+    return {'version': STATE_VERSION, 'watermark': None, 'buckets': {}, 'last': {}, 'source': source}
+
+def history_source(state):
+    """Historial del que salen los agregados (None si todavía no se aplicó ningún snapshot)."""
+    return state.get('source')
+
+def note_source(state, source):
+    """Registra que se aplicó un snapshot grabado en 'source'; si no es el de siempre, el estado queda mezclado."""
+    current = history_source(state)
+    if current is None or current == source:
+        state['source'] = source
+    elif current != MIXED_SOURCE:
+        logging.warning(f"Agregados: snapshot de '{source}' sobre agregados de '{current}'; "
+                        f"para verificarlos hay que rearmarlos (aggregates --rebuild --source ...)")
+        state['source'] = MIXED_SOURCE
+
+def load_state(path=AGGREGATES_FILE):
+    if not os.path.exists(path):
+        return new_state()
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    # los estados sin 'source' son de antes del modo diario: salieron del almacén
+    state.setdefault('source', "store" if state['buckets'] else None)
+    return state
+
+def save_state(state, path=AGGREGATES_FILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+# ---------- ACTUALIZACIÓN INCREMENTAL ----------
+def _num(x):
+    try:
+        v = float(x)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(v) else v
+
+def _flags(free, empty, capacity):
+    """(ocupación, vacía, llena) de una fila; None donde no se puede saber."""
+    occ = None
+    if free is not None and capacity:
+        occ = free / capacity
+    elif free is not None and empty is not None and free + empty > 0:
+        occ = free / (free + empty)
+    is_empty = (free == 0) if free is not None else None
+    if empty is not None:
+        is_full = empty == 0
+    elif free is not None and capacity:
+        is_full = free >= capacity
+    else:
+        is_full = None
+    return occ, is_empty, is_full
+
+def _bucket_key(station_id, day, periodo):
+    return f"{station_id}|{day}|{periodo}"
+
+def _bucket(state, key):
+    b = state['buckets'].get(key)
+    if b is None:
+        b = state['buckets'][key] = {f: 0 for f in SUM_FIELDS}
+    return b
+
+def update(state, rows):
+    """
+    Suma un snapshot (lista de filas con el esquema de collect_snapshot) a los
+    agregados. Idempotente por scrape_timestamp: un snapshot igual o anterior
+    a la marca de agua se ignora. Devuelve True si se aplicó.
+    """
+    if not rows:
+        return False
+    ts_iso = str(rows[0]['scrape_timestamp'])
+    ts = datetime.fromisoformat(ts_iso).timestamp()
+    if state['watermark'] is not None and ts <= state['watermark']:
+        logging.info(f"Agregados: snapshot {ts_iso} ya procesado, se omite.")
+        return False
+
+    seen = set()
+    for r in rows:
+        sid = str(r.get('station_id'))
+        if sid in seen:
+            continue  # fila repetida dentro del mismo snapshot
+        seen.add(sid)
+        free, empty, cap = _num(r.get('free_bikes')), _num(r.get('empty_slots')), _num(r.get('capacity'))
+        occ, is_empty, is_full = _flags(free, empty, cap)
+        key = _bucket_key(sid, r.get('day_of_week'), r.get('periodo_dia'))
+        b = _bucket(state, key)
+        b['n'] += 1
+        if occ is not None:
+            b['occ_sum'] += occ
+            b['occ_n'] += 1
+        b['empty_n'] += 1 if is_empty else 0
+        b['full_n'] += 1 if is_full else 0
+
+        last = state['last'].get(sid)
+        if last is not None and 0 < ts - last['ts'] <= AGGREGATE_MAX_GAP_SECONDS:
+            gap = ts - last['ts']
+            # el tiempo entre snapshots se atribuye al estado (y franja) anterior
+            prev = _bucket(state, last['bucket'])
+            prev['empty_seconds'] += gap if last['empty'] else 0
+            prev['full_seconds'] += gap if last['full'] else 0
+            if free is not None and last['free'] is not None:
+                b['turnover_sum'] += abs(free - last['free'])
+                b['turnover_n'] += 1
+        state['last'][sid] = {'ts': ts, 'free': free, 'empty': bool(is_empty), 'full': bool(is_full), 'bucket': key}
+
+    state['watermark'] = ts
+    return True
+
+
+# ---------- CONSULTAS ----------
+def buckets_frame(state):
+    """Sumas crudas por franja como DataFrame (una fila por bucket)."""
+    import pandas as pd
+
+    records = []
+    for key, b in state['buckets'].items():
+        sid, day, periodo = key.split("|", 2)
+        records.append({'station_id': sid, 'day_of_week': day, 'periodo_dia': periodo, **b})
+    return pd.DataFrame(records, columns=BUCKET_COLS + SUM_FIELDS)
+
+def query(state, by=BUCKET_COLS):
+    """
+    Métricas de uso agrupadas por 'by' (subconjunto de station_id/day_of_week/periodo_dia):
+    tasa de ocupación media, fracción de muestras vacía/llena, horas vacía/llena
+    y rotación media (bicis que entran o salen) entre snapshots consecutivos.
+    """
+    df = buckets_frame(state)
+    g = df.groupby(list(by), as_index=False)[SUM_FIELDS].sum()
+    g['occupancy_rate'] = g['occ_sum'] / g['occ_n'].where(g['occ_n'] > 0)
+    g['empty_share'] = g['empty_n'] / g['n'].where(g['n'] > 0)
+    g['full_share'] = g['full_n'] / g['n'].where(g['n'] > 0)
+    g['empty_hours'] = g['empty_seconds'] / 3600.0
+    g['full_hours'] = g['full_seconds'] / 3600.0
+    g['turnover_per_snapshot'] = g['turnover_sum'] / g['turnover_n'].where(g['turnover_n'] > 0)
+    return g[list(by) + ['n', 'occupancy_rate', 'empty_share', 'full_share',
+                         'empty_hours', 'full_hours', 'turnover_per_snapshot']]
+
+
+# ---------- RECONSTRUCCIÓN Y VERIFICACIÓN ----------
+def rebuild(iter_snapshots, source=None):
+    """Estado nuevo aplicando, en orden, cada snapshot de 'iter_snapshots' (listas de filas) leídos de 'source'."""
+    state = new_state(source)
+    for rows in iter_snapshots:
+        update(state, rows)
+    return state
+
+def iter_store_snapshots(df):
+    """Agrupa un DataFrame del almacén en snapshots (listas de filas) ordenados por tiempo."""
+    if df.empty:
+        return
+    ts = df['scrape_timestamp'].map(lambda s: datetime.fromisoformat(str(s)).timestamp())
+    for _, group in df.assign(_ts=ts).sort_values('_ts', kind="mergesort").groupby('_ts', sort=True):
+        yield group.drop(columns='_ts').to_dict('records')
+
+def compute_from_history(df):
+    """Las mismas sumas que update(), pero vectorizadas con pandas sobre todo el historial."""
+    import numpy as np
+    import pandas as pd
+
+    if df.empty:
+        return pd.DataFrame(columns=BUCKET_COLS + SUM_FIELDS)
+    d = pd.DataFrame({
+        'station_id': df['station_id'].astype(str),
+        'day_of_week': df['day_of_week'].astype(str),
+        'periodo_dia': df['periodo_dia'].astype(str),
+        'ts': df['scrape_timestamp'].map(lambda s: datetime.fromisoformat(str(s)).timestamp()),
+        'free': pd.to_numeric(df['free_bikes'], errors="coerce"),
+        'empty': pd.to_numeric(df['empty_slots'], errors="coerce"),
+        'cap': pd.to_numeric(df['capacity'], errors="coerce"),
+    })
+    # un mismo snapshot repetido cuenta una sola vez (como la marca de agua del incremental)
+    d = d.drop_duplicates(['station_id', 'ts'], keep="first")
+    d = d.sort_values(['station_id', 'ts'], kind="mergesort").reset_index(drop=True)
+
+    cap_ok = d['cap'].fillna(0) != 0
+    occ = np.where(d['free'].notna() & cap_ok, d['free'] / d['cap'].where(cap_ok), np.nan)
+    tot = d['free'] + d['empty']
+    occ = np.where(np.isnan(occ) & d['free'].notna() & d['empty'].notna() & (tot > 0), d['free'] / tot.where(tot > 0), occ)
+    d['occ'] = occ
+    d['is_empty'] = (d['free'] == 0) & d['free'].notna()
+    d['is_full'] = np.where(d['empty'].notna(), d['empty'] == 0,
+                            d['free'].notna() & cap_ok & (d['free'] >= d['cap']))
+
+    prev = d.groupby('station_id', sort=False).shift(1)
+    gap = d['ts'] - prev['ts']
+    within = (gap > 0) & (gap <= AGGREGATE_MAX_GAP_SECONDS)
+    turn = within & d['free'].notna() & prev['free'].notna()
+
+    cur = pd.DataFrame({
+        'station_id': d['station_id'], 'day_of_week': d['day_of_week'], 'periodo_dia': d['periodo_dia'],
+        'n': 1,
+        'occ_sum': d['occ'].fillna(0.0),
+        'occ_n': d['occ'].notna().astype(int),
+        'empty_n': d['is_empty'].astype(int),
+        'full_n': d['is_full'].astype(bool).astype(int),
+        'turnover_sum': np.where(turn, (d['free'] - prev['free']).abs(), 0.0),
+        'turnover_n': turn.astype(int),
+        'empty_seconds': 0.0,
+        'full_seconds': 0.0,
+    })
+    # las duraciones van a la franja del snapshot anterior
+    dur = pd.DataFrame({
+        'station_id': d['station_id'], 'day_of_week': prev['day_of_week'], 'periodo_dia': prev['periodo_dia'],
+        'empty_seconds': np.where(within & prev['is_empty'].astype(bool), gap, 0.0),
+        'full_seconds': np.where(within & prev['is_full'].astype(bool), gap, 0.0),
+    })[within]
+    out = pd.concat([cur, dur], ignore_index=True).fillna({f: 0 for f in SUM_FIELDS})
+    return out.groupby(BUCKET_COLS, as_index=False)[SUM_FIELDS].sum()
+
+def check(state, df, rtol=1e-9, atol=1e-6):
+    """
+    Compara el estado incremental con un cálculo desde cero sobre 'df'.
+    Devuelve un DataFrame con los buckets que difieren (vacío si todo coincide).
+    """
+    import numpy as np
+
+    inc = buckets_frame(state).set_index(BUCKET_COLS).sort_index()
+    full = compute_from_history(df).set_index(BUCKET_COLS).sort_index()
+    joined = inc.join(full, how="outer", lsuffix="_inc", rsuffix="_full").fillna(0)
+    bad = np.zeros(len(joined), dtype=bool)
+    for f in SUM_FIELDS:
+        bad |= ~np.isclose(joined[f + "_inc"].astype(float), joined[f + "_full"].astype(float), rtol=rtol, atol=atol)
+    return joined[bad].reset_index()
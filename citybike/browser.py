@@ -0,0 +1,229 @@
+# citybike/browser.py
+"""
+Pool de navegadores headless para el fallback de Selenium.
+
+- El Chrome se lanza una vez y se reutiliza entre snapshots (en modo daemon
+  vive todo el proceso); ChromeDriverManager().install() corre una sola vez.
+- En vez de un time.sleep fijo se espera (WebDriverWait) a que aparezcan
+  los marcadores o un script con estaciones.
+- Los atributos de todos los marcadores se leen con un solo execute_script,
+  no con un get_attribute por elemento (cada uno es un viaje al driver).
+- Se leen los logs de red (CDP) para encontrar el feed XHR/JSON de
+  estaciones que usa la página: las siguientes corridas pueden pedirlo
+  directo por HTTP sin renderizar.
+
+Selenium se importa solo al crear el primer navegador.
+"""
+import os
+import sys
+import json
+import atexit
+import logging
+import threading
+from queue import Queue, Empty
+from contextlib import contextmanager
+
+from citybike.config import CHROMEDRIVER_COLAB, BROWSER_POOL_SIZE, BROWSER_WAIT_SECONDS
+
+MARKER_SELECTOR = "[class*='station'], [class*='marker'], [class*='leaflet-marker'], [data-lat]"
+
+# Un solo viaje al driver: atributos de todos los candidatos
+MARKERS_JS = """
+return Array.from(document.querySelectorAll(arguments[0])).map(function (el) {
+  return {
+    name: el.getAttribute('title') || el.getAttribute('data-name') || el.textContent,
+    lat: el.getAttribute('data-lat'),
+    lon: el.getAttribute('data-lon'),
+    id: el.getAttribute('data-id')
+  };
+});
+"""
+
+# Listo cuando hay marcadores con coordenadas o algún script menciona estaciones
+READY_JS = """
+if (document.querySelector('[data-lat]')) return true;
+var s = document.getElementsByTagName('script');
+for (var i = 0; i < s.length; i++) {
+  var t = (s[i].textContent || '').toLowerCase();
+  if (t.indexOf('stations') >= 0 || t.indexOf('markers') >= 0) return true;
+}
+return false;
+"""
+
+SCRIPTS_JS = """
+return Array.from(document.getElementsByTagName('script'))
+  .map(function (s) { return s.textContent || ''; })
+  .filter(function (t) { var l = t.toLowerCase(); return l.indexOf('stations') >= 0 || l.indexOf('markers') >= 0; });
+"""
+
+
+class BrowserSession:
+    """Un Chrome headless reutilizable."""
+
+    def __init__(self, headless=True):
+        self.headless = headless
+        self.driver = None
+
+    def start(self):
+        if os.path.isdir(CHROMEDRIVER_COLAB) and CHROMEDRIVER_COLAB not in sys.path:
+            sys.path.insert(0, CHROMEDRIVER_COLAB)
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+        from selenium.webdriver.chrome.options import Options
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        chrome_options = Options()
+        if self.headless:
+            chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+        # logs de red para descubrir el feed JSON de estaciones
+        chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        self.driver = webdriver.Chrome(service=Service(_chromedriver_path(ChromeDriverManager)), options=chrome_options)
+        self.driver.set_page_load_timeout(30)
+        logging.info("Chrome headless iniciado (se reutiliza entre snapshots).")
+
+    def quit(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+            self.driver = None
+
+    def load(self, url, wait_seconds=BROWSER_WAIT_SECONDS):
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.common.exceptions import TimeoutException
+
+        if self.driver is None:
+            self.start()
+        try:
+            self.driver.get_log("performance")  # descartar eventos de la carga anterior
+        except Exception:
+            pass
+        self.driver.get(url)
+        try:
+            WebDriverWait(self.driver, wait_seconds, poll_frequency=0.25).until(lambda d: d.execute_script(READY_JS))
+        except TimeoutException:
+            logging.warning(f"No aparecieron estaciones en {wait_seconds}s; se intenta con lo cargado.")
+
+    def markers(self):
+        return self.driver.execute_script(MARKERS_JS, MARKER_SELECTOR) or []
+
+    def station_scripts(self):
+        return self.driver.execute_script(SCRIPTS_JS) or []
+
+    def json_responses(self):
+        """(url, cuerpo) de las respuestas JSON vistas en la carga, vía CDP."""
+        out = []
+        try:
+            entries = self.driver.get_log("performance")
+        except Exception:
+            return out
+        for entry in entries:
+            try:
+                msg = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            if msg.get('method') != 'Network.responseReceived':
+                continue
+            resp = msg['params']['response']
+            if 'json' not in (resp.get('mimeType') or ""):
+                continue
+            try:
+                body = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": msg['params']['requestId']})
+            except Exception:
+                continue
+            out.append((resp.get('url'), body.get('body') or ""))
+        return out
+
+
+_chromedriver = {}
+
+def _chromedriver_path(manager_cls):
+    # ChromeDriverManager().install() consulta la red: una vez por proceso
+    if 'path' not in _chromedriver:
+        _chromedriver['path'] = manager_cls().install()
+    return _chromedriver['path']
+
+
+class BrowserPool:
+    def __init__(self, size=BROWSER_POOL_SIZE, headless=True):
+        self.size = size
+        self.headless = headless
+        self.idle = Queue()
+        self.created = 0
+        self.lock = threading.Lock()
+        self.all = []
+
+    @contextmanager
+    def session(self, timeout=None):
+        """
+        Presta una sesión; si falla durante el uso se descarta (el siguiente
+        préstamo crea otra). Si el pool está lleno espera a lo sumo 'timeout'
+        s a que se libere una (None: sin límite) y si no, TimeoutError.
+        """
+        s = self._acquire(timeout)
+        ok = False
+        try:
+            yield s
+            ok = True
+        finally:
+            if ok:
+                self.idle.put(s)
+            else:
+                self._discard(s)
+
+    def _acquire(self, timeout):
+        try:
+            return self.idle.get_nowait()
+        except Empty:
+            pass
+        with self.lock:
+            if self.created < self.size:
+                self.created += 1
+                s = BrowserSession(self.headless)
+                self.all.append(s)
+                return s
+        try:
+            return self.idle.get(timeout=timeout)
+        except Empty:
+            raise TimeoutError(f"ningún navegador del pool se liberó en {timeout:.1f}s") from None
+
+    def _discard(self, s):
+        s.quit()
+        with self.lock:
+            self.created -= 1
+            if s in self.all:
+                self.all.remove(s)
+
+    def close(self):
+        with self.lock:
+            sessions, self.all = self.all, []
+            self.created = 0
+        for s in sessions:
+            s.quit()
+        while True:
+            try:
+                self.idle.get_nowait()
+            except Empty:
+                break
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_browser_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            atexit.register(shutdown_pool)
+        return _pool
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
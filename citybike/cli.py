@@ -0,0 +1,412 @@
+# citybike/cli.py
+"""
+Punto de entrada único: ``python -m citybike <comando>`` (o ``python collector.py``).
+
+Sin comando se toma un snapshot y se guarda en el almacén (lo que corre el
+cron cada 30 minutos). Los módulos de cada comando se importan dentro de su
+handler, así ``--help`` o un comando liviano no pagan el import de pandas.
+"""
+import os
+import sys
+import argparse
+import logging
+
+from citybike.config import (
+    INTERVAL_MINUTES, DAYS, OUTPUT_EXCEL, OUTPUT_CSV, RING_BUFFER_SNAPSHOTS,
+    RECORD_MODE, RECORD_MODES, DELTA_ROOT, DAILY_ROOT, CONSOLIDATED_CSV, NETWORKS_FILE, METRICS_FILE,
+)
+
+# CSV acumulado antiguo (solo para migrarlo al almacén o a data/daily con 'import-legacy')
+LEGACY_CSV = "data/citybike_lima.csv"
+
+
+# ---------- REDES ----------
+def _networks(args):
+    """Redes pedidas con --networks ('all' o ids separados por coma); None = solo la red por defecto."""
+    if not getattr(args, "networks", None):
+        return None
+    from citybike.networks import load_networks, select
+
+    try:
+        return select(load_networks(), args.networks)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(2)
+
+def _network_paths(args):
+    """Rutas de la red de --network (por defecto, la de siempre)."""
+    from citybike.networks import get_network, paths
+
+    try:
+        return paths(get_network(getattr(args, "network", None)))
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(2)
+
+
+# ---------- COMANDOS ----------
+def cmd_snapshot(args):
+    from citybike import metrics
+    from citybike.pipeline import store_snapshot
+    from citybike.snapshot import collect_snapshot
+
+    networks = _networks(args)
+    if networks:
+        return snapshot_networks(args, networks)
+    with metrics.trace():
+        snapshot = collect_snapshot(owm_key=args.owm_key)
+        if not snapshot:
+            print("⚠️ No se recolectaron datos en este snapshot.")
+            return
+
+        # Cada snapshot va a una partición nueva (o al archivo del día): no se relee ni reescribe el historial
+        where = store_snapshot(snapshot, mode=args.record) or DELTA_ROOT
+    print(f"✅ Guardadas {len(snapshot)} nuevas filas en {where}" + (" (+ delta)" if args.record == "both" else ""))
+
+def snapshot_networks(args, networks):
+    from citybike.multi import NetworkCollector
+
+    collector = NetworkCollector(networks, owm_key=args.owm_key, record_mode=args.record)
+    try:
+        results = collector.collect()
+    finally:
+        collector.shutdown()  # las que no llegaron al plazo del turno terminan y se guardan
+    for nid, r in results.items():
+        if r.get('pending'):
+            print(f"⏳ [{nid}] Terminó fuera del plazo del turno")
+        elif r.get('rows'):
+            print(f"✅ [{nid}] Guardadas {r['rows']} nuevas filas en {r['where'] or 'el registro delta'}")
+        else:
+            print(f"⚠️ [{nid}] No se recolectaron datos" + (f" ({r['error']})" if r.get('error') else ""))
+
+def cmd_run(args):
+    from citybike.runner import run_collector
+
+    run_collector(owm_key=args.owm_key, out_excel=args.out_excel, out_csv=args.out_csv,
+                  interval_seconds=args.interval_minutes * 60,
+                  total_seconds=args.days * 24 * 3600,
+                  export_every_seconds=args.export_every_hours * 3600 if args.export_every_hours else None,
+                  record_mode=args.record, networks=_networks(args))
+
+def cmd_daemon(args):
+    from citybike.daemon import Daemon
+
+    Daemon(owm_key=args.owm_key, interval_seconds=args.interval_minutes * 60,
+           total_seconds=args.days * 24 * 3600 if args.days else None,
+           run_now=args.now, ring_size=args.ring_size,
+           export_every_seconds=args.export_every_hours * 3600 if args.export_every_hours else None,
+           out_csv=args.out_csv, out_excel=args.out_excel, record_mode=args.record,
+           networks=_networks(args)).run()
+
+def cmd_compact(args):
+    from citybike import storage
+
+    days = storage.compact(date=args.date)
+    print(f"✅ Compactados {len(days)} días" + (f": {', '.join(days)}" if days else ""))
+
+def cmd_read(args):
+    from citybike import storage, export
+
+    if args.out:
+        n = export.export_csv(args.out, start=args.start, end=args.end)
+        print(f"✅ Exportadas {n} filas a {args.out}")
+    else:
+        parts = storage.list_partitions(start=args.start, end=args.end)
+        print(f"{sum(p['rows'] for p in parts)} filas en {len(parts)} particiones")
+
+def cmd_export(args):
+    from citybike import export
+
+    stations = [s.strip() for s in args.stations.split(",") if s.strip()] if args.stations else None
+    n = export.export(args.out, fmt=args.format, start=args.start, end=args.end, stations=stations,
+                      root=_network_paths(args)[args.source], source=args.source)
+    print(f"✅ Exportadas {n} filas a {args.out}")
+
+def cmd_delta(args):
+    from citybike import delta
+
+    if args.at:
+        rows = delta.snapshot_at(args.at)
+        if not rows:
+            print(f"⚠️ No hay snapshots grabados en o antes de {args.at}")
+            return
+        print(f"Snapshot {rows[0]['scrape_timestamp']}: {len(rows)} estaciones")
+        if args.out:
+            import pandas as pd
+
+            os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+            pd.DataFrame(rows).to_csv(args.out, index=False)
+            print(f"✅ Exportadas {len(rows)} filas a {args.out}")
+        return
+    info = delta.summary()
+    ratio = info['status_rows'] / info['full_rows'] if info['full_rows'] else 0.0
+    print(f"{info['snapshots']} snapshots ({info['keyframes']} keyframes), {info['status_rows']} filas de estado "
+          f"grabadas por {info['full_rows']} reconstruidas ({ratio:.1%}), {info['bytes'] / 1024:.1f} KB en {DELTA_ROOT}")
+
+def cmd_consolidate(args):
+    from citybike import export
+
+    p = _network_paths(args)
+    out = args.out or p['consolidated']
+    n = export.export_csv(out, start=args.start, end=args.end, root=p['daily'], source="daily")
+    print(f"✅ Dataset consolidado: {n} filas en {out}")
+    if args.xlsx:
+        export.export_excel(args.xlsx, start=args.start, end=args.end, root=p['daily'], source="daily")
+        print(f"✅ Excel consolidado en {args.xlsx}")
+
+def cmd_validate(args):
+    from collections import Counter
+    from citybike import export
+    from citybike.model import SNAPSHOT_COLUMNS
+
+    p = _network_paths(args)
+    root = {"store": p['store'], "delta": p['delta'], "daily": p['daily']}[args.source]
+    report = Counter()
+    days = set()
+    # SNAPSHOT_COLUMNS empieza por scrape_timestamp
+    for row in export.iter_clean_rows(args.start, args.end, root=root, source=args.source, report=report):
+        days.add(row[0][:10])
+    if not report['filas']:
+        print(f"⚠️ No hay filas en {root}")
+        return
+    line = (f"{report['filas']} filas en {len(days)} días: {report['duplicadas']} repetidas, "
+            f"{report['invalidas']} inválidas, {report['anulados']} valores fuera de tipo o rango")
+    ok = not (report['duplicadas'] or report['invalidas'] or report['anulados'])
+    print(("✅ " if ok else "⚠️ ") + line)
+    if not ok:
+        print("   'consolidate' y 'export' ya las omiten; el almacén no se modifica.")
+
+def cmd_networks(args):
+    from citybike.networks import load_networks, paths
+
+    try:
+        networks = load_networks(args.file)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(2)
+    for net in networks:
+        region = net['region']['id'] if net['region'] else "sin región"
+        source = net['citybikes_id'] or "/".join(net['match']) or "solo GBFS"
+        print(f"{net['id']:16s} {source:28s} {region:14s} {net['tz']:20s} -> {paths(net)['store']}")
+
+def cmd_stats(args):
+    from citybike import metrics
+
+    runs = metrics.load(args.file, network=args.network, since=args.since, last=args.last)
+    if not runs:
+        print(f"⚠️ No hay métricas en {args.file}")
+        return
+    failed = sum(1 for r in runs if r.get('error') or not r.get('stations'))
+    print(f"{len(runs)} corridas desde {runs[0]['started_at']} ({failed} sin datos o con error)")
+    print(f"{'etapa':24s} {'n':>5s} {'p50 ms':>9s} {'p95 ms':>9s} {'máx ms':>9s} {'KB prom':>8s} {'errores':>7s}  fuente/errores")
+    for row in metrics.summarize(runs):
+        detail = ", ".join(f"{k}×{v}" for k, v in sorted(row['error_classes'].items())) or (row['top_source'] or "")
+        print(f"{row['stage']:24s} {row['n']:5d} {row['p50'] * 1000:9.1f} {row['p95'] * 1000:9.1f} "
+              f"{row['max'] * 1000:9.1f} {row['avg_bytes'] / 1024:8.1f} {row['errors']:7d}  {detail}")
+
+def _import_daily(args):
+    import csv
+    from collections import Counter
+    from citybike import daily, export
+    from citybike.model import SNAPSHOT_COLUMNS
+
+    report = Counter()
+    days = set()
+    if args.from_store:
+        days.update(daily.import_rows(export.iter_rows(source="store"), report=report))
+    if os.path.exists(args.csv):
+        with open(args.csv, newline="", encoding="utf-8") as f:
+            rows = (tuple(r.get(c) for c in SNAPSHOT_COLUMNS) for r in csv.DictReader(f))
+            days.update(daily.import_rows(rows, report=report))
+    elif not args.from_store:
+        print(f"⚠️ No existe {args.csv}")
+        return
+    print(f"✅ Importadas {report['filas'] - report['duplicadas'] - report['invalidas']} filas a {len(days)} días "
+          f"de {DAILY_ROOT} ({report['duplicadas']} repetidas y {report['invalidas']} inválidas omitidas)")
+
+def cmd_import_legacy(args):
+    from citybike import storage
+
+    if args.to == "daily":
+        return _import_daily(args)
+    if not os.path.exists(args.csv):
+        print(f"⚠️ No existe {args.csv}")
+        return
+    n = storage.import_legacy_csv(args.csv)
+    print(f"✅ Importados {n} snapshots desde {args.csv}")
+
+def cmd_aggregates(args):
+    from citybike import storage, analytics
+
+    p = _network_paths(args)
+    if args.rebuild or args.check:
+        state = analytics.load_state(p['aggregates'])
+        # por defecto, el historial en el que grabó el modo que alimentó los agregados
+        source = args.source or analytics.history_source(state) or "store"
+        if source == analytics.MIXED_SOURCE:
+            print("⚠️ Los agregados mezclan snapshots de varios modos de grabación: "
+                  "elige un historial con --source (y --rebuild para rearmarlos desde él)")
+            sys.exit(1)
+        if source == "daily":
+            from citybike import daily
+
+            df = daily.read_all(p['daily'])
+        elif source == "delta":
+            import pandas as pd
+            from citybike import export
+            from citybike.model import SNAPSHOT_COLUMNS
+
+            df = pd.DataFrame(list(export.iter_rows(root=p['delta'], source="delta")), columns=SNAPSHOT_COLUMNS)
+        else:
+            df = storage.read_all(p['store'])
+        if args.check:
+            diff = analytics.check(state, df)
+            if len(diff):
+                print(f"❌ {len(diff)} franjas difieren entre el incremental y el cálculo desde cero")
+                print(diff.head(20).to_string(index=False))
+                sys.exit(1)
+            print(f"✅ Agregados incrementales coinciden con el historial de '{source}' ({len(df)} filas)")
+        if args.rebuild:
+            state = analytics.rebuild(analytics.iter_store_snapshots(df), source)
+            analytics.save_state(state, p['aggregates'])
+            print(f"✅ Agregados reconstruidos: {len(state['buckets'])} franjas desde {len(df)} filas")
+        return
+
+    by = [c.strip() for c in args.by.split(",") if c.strip()]
+    table = analytics.query(analytics.load_state(p['aggregates']), by=by)
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        table.to_csv(args.out, index=False)
+        print(f"✅ Exportadas {len(table)} filas de métricas a {args.out}")
+    else:
+        print(table.to_string(index=False))
+
+
+# ---------- CLI ----------
+def build_parser():
+    parser = argparse.ArgumentParser(prog="citybike", description="Scraper CityBike Lima con Clima.com Miraflores")
+    sub = parser.add_subparsers(dest="cmd")
+
+    owm = argparse.ArgumentParser(add_help=False)
+    owm.add_argument("--owm_key", help="OpenWeatherMap API key (opcional, fallback)", default=os.getenv("OWM_KEY"))
+    owm.add_argument("--record", choices=RECORD_MODES, default=RECORD_MODE,
+                     help="Snapshots completos (full), solo cambios (delta), ambos o un .csv.gz por día (daily)")
+    owm.add_argument("--networks", default=None,
+                     help=f"Recolectar en paralelo las redes de {NETWORKS_FILE}: 'all' o ids separados por coma "
+                          "(por defecto solo Lima)")
+    owm.add_argument("--http", choices=["live", "record", "replay", "standin"], default=None,
+                     help="HTTP en vivo, grabando en --cassette, reproduciendo --cassette sin red, "
+                          "o contra el servidor stand-in de --cassette (URL base)")
+    owm.add_argument("--cassette", default=os.getenv("CITYBIKE_CASSETTE"),
+                     help="Directorio del cassette (record/replay) o URL del stand-in")
+
+    net = argparse.ArgumentParser(add_help=False)
+    net.add_argument("--network", default=None, help=f"Id de red de {NETWORKS_FILE} (por defecto Lima)")
+
+    p = sub.add_parser("snapshot", parents=[owm], help="Tomar un snapshot y guardarlo en el almacén (por defecto)")
+    p.set_defaults(func=cmd_snapshot)
+
+    p = sub.add_parser("run", parents=[owm], help="Muestrear en bucle durante varios días")
+    p.add_argument("--interval_minutes", type=int, help=f"Intervalo en minutos (por defecto {INTERVAL_MINUTES})", default=INTERVAL_MINUTES)
+    p.add_argument("--days", type=float, help=f"Dias a recolectar (por defecto {DAYS})", default=DAYS)
+    p.add_argument("--out_excel", default=OUTPUT_EXCEL)
+    p.add_argument("--out_csv", default=OUTPUT_CSV)
+    p.add_argument("--export_every_hours", type=float, default=None,
+                   help="Exportar CSV/Excel cada N horas (por defecto solo al terminar)")
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("daemon", parents=[owm], help="Recolectar sin fin, alineado a :00/:30, con parada ordenada por SIGTERM")
+    p.add_argument("--interval_minutes", type=int, default=INTERVAL_MINUTES)
+    p.add_argument("--days", type=float, default=None, help="Detenerse tras N días (por defecto nunca)")
+    p.add_argument("--now", action="store_true", help="Tomar un snapshot inmediato antes del primer borde")
+    p.add_argument("--ring_size", type=int, default=RING_BUFFER_SNAPSHOTS, help="Snapshots recientes en memoria")
+    p.add_argument("--export_every_hours", type=float, default=None)
+    p.add_argument("--out_excel", default=OUTPUT_EXCEL)
+    p.add_argument("--out_csv", default=OUTPUT_CSV)
+    p.set_defaults(func=cmd_daemon)
+
+    p = sub.add_parser("compact", help="Unir las particiones de cada día en un solo archivo")
+    p.add_argument("--date", help="Solo este día (YYYY-MM-DD)", default=None)
+    p.set_defaults(func=cmd_compact)
+
+    p = sub.add_parser("read", help="Leer todas las particiones como una sola tabla")
+    p.add_argument("--start", help="Día inicial (YYYY-MM-DD)", default=None)
+    p.add_argument("--end", help="Día final (YYYY-MM-DD)", default=None)
+    p.add_argument("--out", help=f"CSV de salida (p.ej. {LEGACY_CSV})", default=None)
+    p.set_defaults(func=cmd_read)
+
+    p = sub.add_parser("export", parents=[net], help="Exportar a CSV o Excel (streaming, con filtros)")
+    p.add_argument("--out", required=True, help="Archivo de salida (.csv o .xlsx)")
+    p.add_argument("--format", choices=["csv", "xlsx"], default=None, help="Por defecto según la extensión")
+    p.add_argument("--start", help="Desde (YYYY-MM-DD o timestamp ISO)", default=None)
+    p.add_argument("--end", help="Hasta (YYYY-MM-DD o timestamp ISO, inclusive)", default=None)
+    p.add_argument("--stations", help="station_id separados por coma", default=None)
+    p.add_argument("--source", choices=["store", "delta", "daily"], default="store",
+                   help="Leer del almacén completo, del registro delta o de los .csv.gz diarios")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("delta", help="Resumen del registro delta o snapshot reconstruido en un instante")
+    p.add_argument("--at", help="Timestamp ISO: reconstruir el último snapshot en o antes de él", default=None)
+    p.add_argument("--out", help="CSV de salida para --at", default=None)
+    p.set_defaults(func=cmd_delta)
+
+    p = sub.add_parser("validate", parents=[net], help="Revisar tipos y filas repetidas de una fuente (en streaming)")
+    p.add_argument("--source", choices=["store", "delta", "daily"], default="store")
+    p.add_argument("--start", help="Desde (YYYY-MM-DD o timestamp ISO)", default=None)
+    p.add_argument("--end", help="Hasta (YYYY-MM-DD o timestamp ISO, inclusive)", default=None)
+    p.set_defaults(func=cmd_validate)
+
+    p = sub.add_parser("consolidate", parents=[net], help="Rearmar el dataset completo desde los .csv.gz diarios")
+    p.add_argument("--out", default=None, help=f"CSV consolidado (por defecto {CONSOLIDATED_CSV} para Lima)")
+    p.add_argument("--xlsx", default=None, help="Además, un Excel consolidado")
+    p.add_argument("--start", help="Desde (YYYY-MM-DD o timestamp ISO)", default=None)
+    p.add_argument("--end", help="Hasta (YYYY-MM-DD o timestamp ISO, inclusive)", default=None)
+    p.set_defaults(func=cmd_consolidate)
+
+    p = sub.add_parser("networks", help="Listar las redes configuradas y dónde guarda cada una")
+    p.add_argument("--file", default=NETWORKS_FILE)
+    p.set_defaults(func=cmd_networks)
+
+    p = sub.add_parser("stats", help="Latencia p50/p95 por etapa de los snapshots guardados")
+    p.add_argument("--file", default=METRICS_FILE)
+    p.add_argument("--network", default=None, help="Solo esta red")
+    p.add_argument("--since", default=None, help="Corridas iniciadas desde (timestamp ISO en UTC)")
+    p.add_argument("--last", type=int, default=None, help="Solo las últimas N corridas")
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser("import-legacy", help="Migrar el CSV acumulado antiguo al almacén o a data/daily")
+    p.add_argument("--csv", default=LEGACY_CSV)
+    p.add_argument("--to", choices=["store", "daily"], default="store",
+                   help="Almacén Parquet (por defecto) o los .csv.gz diarios que versiona el workflow")
+    p.add_argument("--from-store", action="store_true",
+                   help="Con --to daily: traer también los snapshots del almacén Parquet")
+    p.set_defaults(func=cmd_import_legacy)
+
+    p = sub.add_parser("aggregates", parents=[net], help="Métricas de uso por estación desde los agregados incrementales")
+    p.add_argument("--by", default="station_id,day_of_week,periodo_dia",
+                   help="Columnas de agrupación (subconjunto de station_id,day_of_week,periodo_dia)")
+    p.add_argument("--out", help="CSV de salida", default=None)
+    p.add_argument("--rebuild", action="store_true", help="Recalcular los agregados desde todo el almacén")
+    p.add_argument("--check", action="store_true", help="Verificar el incremental contra un cálculo desde cero")
+    p.add_argument("--source", choices=["store", "delta", "daily"], default=None,
+                   help="Historial para --rebuild/--check: almacén, registro delta o .csv.gz diarios "
+                        "(por defecto, el del modo de grabación que alimentó los agregados)")
+    p.set_defaults(func=cmd_aggregates)
+
+    return parser
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # sin comando (o solo opciones) -> snapshot, que es lo que corre el cron
+    if not argv or (argv[0].startswith("-") and argv[0] not in ("-h", "--help")):
+        argv = ["snapshot"] + argv
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if getattr(args, "http", None):
+        from citybike import replay
+        try:
+            replay.use(args.http, args.cassette)
+        except ValueError as e:
+            parser.error(str(e))
+    args.func(args)
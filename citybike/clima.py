@@ -0,0 +1,114 @@
+# citybike/clima.py
+"""
+Parser de la página de Clima.com (Miraflores u otra región) sin armar un árbol.
+
+Un HTMLParser de la stdlib recibe el HTML en trozos y solo guarda dos
+cosas: si ya pasó el encabezado de la región ('header', p.ej.
+'Miraflores') y, desde ahí, el primer
+texto con grados y el primer <img alt>. En cuanto tiene temperatura y
+descripción deja de leer, así que casi nunca recorre la página entera.
+Scripts y estilos no se miran.
+
+Si el bloque principal no aparece, se cae a las mismas heurísticas de
+antes sobre el texto crudo: 'Image: Nuboso 16°' y el primer número con °.
+"""
+import re
+from html.parser import HTMLParser
+
+from citybike.config import CLIMA_MIRAFLORES_HEADER
+
+CHUNK_CHARS = 4 * 1024
+HEADER_TAGS = frozenset(["h1", "h2", "h3", "div"])
+SKIP_TAGS = frozenset(["script", "style"])
+
+DEGREES = re.compile(r'(\d{1,2}(?:\.\d+)?)\s*°')
+IMAGE_TEXT = re.compile(r'Image:\s*([A-Za-zÁÉÍÓÚáéíóúñÑ\s]+)[^\d\S\r\n]{0,40}(\d{1,2}(?:\.\d+)?)\s*°', re.S)
+
+
+class ClimaParser(HTMLParser):
+    def __init__(self, header=CLIMA_MIRAFLORES_HEADER):
+        super().__init__(convert_charrefs=True)
+        self.header = header      # texto del encabezado de la región
+        self.header_depth = 0     # cuántos h1/h2/h3/div abiertos
+        self.skip_depth = 0       # dentro de <script>/<style>
+        self.seen_header = False
+        self.temp = None
+        self.desc = None
+        self.done = False
+        self.pending = []         # texto entre dos etiquetas (puede llegar partido entre trozos)
+
+    def handle_starttag(self, tag, attrs):
+        self.flush_text()
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in HEADER_TAGS:
+            self.header_depth += 1
+        elif tag == "img" and self.seen_header and self.desc is None:
+            alt = dict(attrs).get("alt")
+            if alt and alt.strip():
+                self.desc = alt.strip()
+                self._check_done()
+
+    def handle_endtag(self, tag):
+        self.flush_text()
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in HEADER_TAGS:
+            self.header_depth = max(0, self.header_depth - 1)
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.pending.append(data)
+
+    def flush_text(self):
+        if not self.pending:
+            return
+        data = "".join(self.pending)
+        self.pending = []
+        if not self.seen_header:
+            if self.header_depth and self.header in data:
+                self.seen_header = True
+                # el propio encabezado puede traer la temperatura ('Miraflores 18°')
+                data = data[data.index(self.header):]
+            else:
+                return
+        if self.temp is None:
+            m = DEGREES.search(data)
+            if m:
+                self.temp = float(m.group(1))
+                self._check_done()
+
+    def _check_done(self):
+        self.done = self.temp is not None and self.desc is not None
+
+
+def parse_clima(text, chunk_chars=CHUNK_CHARS, header=CLIMA_MIRAFLORES_HEADER):
+    """
+    {'temp_C', 'clima'} desde el HTML de Clima.com; lee solo hasta encontrar
+    ambos. 'header' es el encabezado de la región en la página.
+    """
+    p = ClimaParser(header)
+    for i in range(0, len(text), chunk_chars):
+        p.feed(text[i:i + chunk_chars])
+        if p.done:
+            break
+    else:
+        p.close()
+        p.flush_text()
+    temp, desc = p.temp, p.desc
+
+    if temp is None or desc is None:
+        m = IMAGE_TEXT.search(text)
+        if m:
+            if desc is None:
+                desc = m.group(1).strip()
+            if temp is None:
+                temp = float(m.group(2))
+    if temp is None:
+        m = DEGREES.search(text)
+        if m:
+            temp = float(m.group(1))
+
+    if desc:
+        desc = re.sub(r'\s+', ' ', desc).strip()
+    return {'temp_C': temp, 'clima': desc}
@@ -0,0 +1,114 @@
+# citybike/config.py
+from dateutil import tz
+
+# ---------- CONFIG ----------
+CITYBIKE_URL = "https://www.citybikelima.com/es#the-map"
+# Google My Maps KML (usa el MID que diste)
+GMAPS_KML = "https://www.google.com/maps/d/kml?mid=12PUl4VbbO3IBWRSaXrCMHH0u_NI&hl=es"
+
+# API pública de CityBikes
+CITYBIKES_API_ROOT = "https://api.citybik.es/v2/networks"
+
+# Sitios donde probar GBFS directo
+GBFS_BASE_CANDIDATES = ["https://www.citybikelima.com", "https://citybikelima.com", "https://www.citybikelima.com/es"]
+
+# Resolución de fuentes de estaciones: plazo total por snapshot y sondas en paralelo
+SOURCE_DEADLINE_SECONDS = 120
+MAX_PROBE_WORKERS = 20
+
+# Almacén de snapshots completos (citybike.storage)
+STORE_ROOT = "data/snapshots"
+
+# Varias redes (citybike.networks). Sin NETWORKS_FILE se recolecta solo Lima, armada con las
+# constantes de este archivo y con las rutas de siempre; las demás redes van en NETWORKS_DATA_ROOT/<id>
+NETWORKS_FILE = "networks.json"
+DEFAULT_NETWORK = "lima"
+NETWORKS_DATA_ROOT = "data/networks"
+NETWORK_MAX_WORKERS = 4        # redes recolectadas a la vez (cada una con su plazo y sus sondas)
+
+# Caché local (descubrimiento de fuentes, respuestas HTTP, etc.)
+CACHE_DIR = "data/.cache"
+DISCOVERY_CACHE = CACHE_DIR + "/discovery.json"
+DISCOVERY_TTL_SECONDS = 7 * 24 * 3600     # redescubrir la red al menos una vez por semana
+PROBE_BACKOFF_BASE_SECONDS = 30 * 60      # una sonda caída no se reintenta antes de 30 min...
+PROBE_BACKOFF_MAX_SECONDS = 24 * 3600     # ...duplicando hasta un máximo de 1 día
+HTTP_CACHE_DIR = CACHE_DIR + "/http"       # cuerpos + ETag/Last-Modified para GET condicional
+
+# Reintentos HTTP (backoff exponencial con jitter)
+FETCH_RETRIES = 2
+FETCH_BACKOFF_BASE_SECONDS = 0.5
+FETCH_BACKOFF_MAX_SECONDS = 8.0
+
+# Muestreo
+INTERVAL_MINUTES = 30
+INTERVAL_SECONDS = INTERVAL_MINUTES * 60  # cada 30 minutos
+DAYS = 5
+TOTAL_RUN_SECONDS = DAYS * 24 * 3600
+
+# Daemon: snapshots recientes que se guardan en memoria para diffs rápidos (48 = un día a 30 min)
+RING_BUFFER_SNAPSHOTS = 48
+
+# Agregados incrementales de uso por estación (citybike.analytics)
+AGGREGATES_FILE = "data/aggregates.json"
+AGGREGATE_MAX_GAP_SECONDS = 2 * INTERVAL_SECONDS  # huecos más largos no suman tiempo vacía/llena ni rotación
+
+# Cómo se graba cada snapshot: "full" (almacén de snapshots completos), "delta"
+# (solo cambios, citybike.delta), "both" (full + delta) o "daily" (un .csv.gz
+# por día, citybike.daily: lo que commitea el workflow)
+RECORD_MODES = ("full", "delta", "both", "daily")
+RECORD_MODE = "full"
+DELTA_ROOT = "data/delta"
+DELTA_KEYFRAME_SECONDS = 3 * 3600  # además del primer snapshot de cada día
+DAILY_ROOT = "data/daily"
+CONSOLIDATED_CSV = "data/citybike_lima_consolidated.csv"   # se rearma con 'consolidate', no se commitea
+
+# Deduplicación (citybike.quality): claves (scrape_timestamp, station_id) ya
+# grabadas, por modo de grabación y un archivo por día; si falta se rearma desde
+# la partición de ese día
+SEEN_ROOT = CACHE_DIR + "/seen"
+SEEN_DAYS_IN_MEMORY = 2   # al recorrer en orden de fecha basta el día actual y el anterior
+
+# Métricas por etapa de cada snapshot (citybike.metrics, comando 'stats')
+METRICS_FILE = "data/metrics.jsonl"
+METRICS_MAX_BYTES = 5 * 1024 * 1024   # al pasarlo se rota a metrics.jsonl.1
+
+# Output del bucle de varios días
+OUTPUT_EXCEL = "citybike_lima_5days.xlsx"
+OUTPUT_CSV = "citybike_lima_5days.csv"
+
+# Timezone de Lima
+LIMA_TZ = tz.gettz("America/Lima")
+
+# OpenWeatherMap - para clima por coordenadas (fallback)
+OWM_BASE = "https://api.openweathermap.org/data/2.5/weather"
+
+# Clima OWM por celdas: una consulta por celda de grilla (~2 km), cacheada en disco
+WEATHER_CELL_DEG = 0.02
+WEATHER_TTL_SECONDS = 20 * 60
+WEATHER_CACHE = CACHE_DIR + "/weather.json"
+OWM_MAX_WORKERS = 4
+OWM_MAX_PER_SECOND = 1.0  # plan gratuito de OWM: 60 llamadas/minuto
+
+# Clima.com Miraflores (fuente principal para temp_C y clima)
+CLIMA_MIRAFLORES_URL = "https://www.clima.com/peru/lima/miraflores-4"
+CLIMA_MIRAFLORES_HEADER = "Miraflores"  # texto del encabezado desde el que se leen temperatura y descripción
+
+# Centro aproximado de Miraflores (usado para saber si una estación está en Miraflores)
+# Coordenadas de referencia (lat, lon) - fuente pública (ej. latlong.net)
+MIRAFLORES_CENTER = (-12.117880, -77.033043)  # lat, lon
+MIRAFLORES_RADIUS_KM = 2.0  # radio para considerar "en Miraflores" (ajustable)
+
+# Capa de zonas para 'zona_inferida'/'densidad_poblacional': KML local si existe, si no el de GMAPS_KML
+ZONES_FILE = "data/zonas.kml"
+ZONES_TTL_SECONDS = 7 * 24 * 3600      # recalcular zonas de todas las estaciones una vez por semana
+ZONE_POINT_RADIUS_KM = 0.5             # radio para asignar una estación al punto de interés más cercano
+STATION_ZONES_CACHE = CACHE_DIR + "/station_zones.json"
+
+# Chromedriver instalado por apt en Colab
+CHROMEDRIVER_COLAB = "/usr/lib/chromium-browser/chromedriver"
+
+# Pool de navegadores del fallback Selenium (se reutiliza entre snapshots)
+BROWSER_POOL_SIZE = 1
+BROWSER_WAIT_SECONDS = 15   # espera máxima a que el mapa pinte estaciones
+
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120 Safari/537.36"
@@ -0,0 +1,230 @@
+# citybike/daemon.py
+"""
+Modo daemon: recolección continua alineada al reloj.
+
+- Los snapshots se disparan en los bordes de reloj del intervalo (:00/:30
+  para 30 min, en hora de Lima). Cada objetivo se calcula desde el reloj y
+  la espera se mide con time.monotonic(), así no se acumula deriva aunque
+  un snapshot tarde; si uno se pasa del siguiente borde, ese turno se salta.
+- Cada snapshot se guarda en el almacén apenas se toma y se suelta de
+  memoria; solo queda un ring buffer acotado con el estado reciente de las
+  estaciones para diffs rápidos.
+- SIGTERM/SIGINT piden una parada ordenada: el snapshot en curso se termina
+  y se guarda antes de salir. El Chrome del fallback Selenium (si se lanzó)
+  vive entre snapshots y se cierra al final.
+- Con varias redes (citybike.networks) cada turno las recolecta en paralelo
+  (citybike.multi): cada una con su ring buffer, sus rutas y su export.
+"""
+import os
+import time
+import signal
+import logging
+import threading
+from collections import deque
+
+from citybike.config import (
+    INTERVAL_SECONDS, LIMA_TZ, RING_BUFFER_SNAPSHOTS, OUTPUT_EXCEL, OUTPUT_CSV, RECORD_MODE,
+)
+from citybike import metrics
+from citybike.model import Snapshot
+from citybike.snapshot import collect_snapshot
+
+
+def next_boundary(now, interval, tzinfo=LIMA_TZ):
+    """Próximo instante (epoch) múltiplo de 'interval' contado desde la medianoche local."""
+    from datetime import datetime
+
+    offset = datetime.fromtimestamp(now, tz=tzinfo).utcoffset().total_seconds()
+    return ((now + offset) // interval + 1) * interval - offset
+
+
+class SnapshotRing:
+    """Últimos N snapshots, compactos: {station_id: (free_bikes, empty_slots)} por timestamp."""
+
+    def __init__(self, maxlen=RING_BUFFER_SNAPSHOTS):
+        self.buf = deque(maxlen=maxlen)
+
+    def __len__(self):
+        return len(self.buf)
+
+    def push(self, rows):
+        if isinstance(rows, Snapshot):
+            # directo de las columnas, sin armar una fila por estación
+            ids, free, empty = (rows.values(c) for c in ('station_id', 'free_bikes', 'empty_slots'))
+            state = {str(sid): (f, e) for sid, f, e in zip(ids, free, empty)}
+            self.buf.append((rows.shared['scrape_timestamp'], state))
+            return
+        state = {str(r.get('station_id')): (r.get('free_bikes'), r.get('empty_slots')) for r in rows}
+        self.buf.append((rows[0]['scrape_timestamp'], state))
+
+    def diff(self, back=1):
+        """Estaciones cuyo (free_bikes, empty_slots) cambió respecto de 'back' snapshots atrás."""
+        if len(self.buf) <= back:
+            return {}
+        _, old = self.buf[-1 - back]
+        _, new = self.buf[-1]
+        return {sid: (old.get(sid), cur) for sid, cur in new.items() if old.get(sid) != cur}
+
+
+class Daemon:
+    def __init__(self, owm_key=None, interval_seconds=INTERVAL_SECONDS, total_seconds=None,
+                 run_now=False, ring_size=RING_BUFFER_SNAPSHOTS, export_every_seconds=None,
+                 out_csv=OUTPUT_CSV, out_excel=OUTPUT_EXCEL, export_at_exit=False, record_mode=RECORD_MODE,
+                 networks=None):
+        self.owm_key = owm_key
+        self.interval = interval_seconds
+        self.total_seconds = total_seconds
+        self.run_now = run_now
+        self.ring = SnapshotRing(ring_size)
+        self.export_every_seconds = export_every_seconds
+        self.export_at_exit = export_at_exit
+        self.out_csv = out_csv
+        self.out_excel = out_excel
+        self.record_mode = record_mode
+        self.stop_event = threading.Event()
+        self.first_ts = None
+        self.last_ts = None
+        self.exported_ts = None
+        self.n_rows = 0
+        # varias redes: un recolector en paralelo y, por red, su ring buffer y su rango de timestamps
+        self.collector = None
+        if networks:
+            from citybike.multi import NetworkCollector
+
+            self.collector = NetworkCollector(networks, owm_key=owm_key, record_mode=record_mode)
+            self.rings = {n['id']: SnapshotRing(ring_size) for n in networks}
+            self.spans = {}
+
+    # ----- parada -----
+    def request_stop(self, signum=None, frame=None):
+        if signum is not None:
+            logging.info(f"Señal {signal.Signals(signum).name} recibida: se termina el snapshot en curso y se sale.")
+        self.stop_event.set()
+
+    def install_signal_handlers(self):
+        try:
+            signal.signal(signal.SIGTERM, self.request_stop)
+            signal.signal(signal.SIGINT, self.request_stop)
+        except ValueError:
+            # fuera del hilo principal no se pueden instalar; se para con request_stop()
+            pass
+
+    def sleep_until(self, wall_target):
+        """Espera hasta el instante de reloj 'wall_target' (medido con monotonic). False si se pidió parar."""
+        deadline = time.monotonic() + max(0.0, wall_target - time.time())
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            if self.stop_event.wait(min(remaining, 60.0)):
+                return False
+
+    # ----- trabajo -----
+    def tick(self):
+        from citybike.pipeline import store_snapshot
+
+        if self.collector is not None:
+            return self.tick_networks()
+        logging.info("Ejecutando snapshot...")
+        with metrics.trace():
+            try:
+                snapshot = collect_snapshot(self.owm_key)
+            except Exception as e:
+                logging.error(f"Error en snapshot: {e}")
+                metrics.annotate(error=type(e).__name__)
+                return
+            if not snapshot:
+                logging.warning("Snapshot vacío en esta ejecución.")
+                return
+            store_snapshot(snapshot, mode=self.record_mode)  # se guarda ya; en memoria solo queda el ring buffer
+        ts = snapshot[0]['scrape_timestamp']
+        self.first_ts = self.first_ts or ts
+        self.last_ts = ts
+        self.n_rows += len(snapshot)
+        self.ring.push(snapshot)
+        if len(self.ring) > 1:
+            logging.info(f"{len(self.ring.diff())} de {len(snapshot)} estaciones cambiaron desde el snapshot anterior.")
+
+    def tick_networks(self):
+        logging.info(f"Ejecutando snapshot de {len(self.collector.networks)} redes...")
+        for nid, r in self.collector.collect().items():
+            if not r.get('rows'):
+                continue
+            first, _ = self.spans.get(nid, (r['ts'], None))
+            self.spans[nid] = (first, r['ts'])
+            self.last_ts = r['ts']
+            self.first_ts = self.first_ts or r['ts']
+            self.n_rows += r['rows']
+            ring = self.rings[nid]
+            ring.push(r['snapshot'])
+            if len(ring) > 1:
+                logging.info(f"[{nid}] {len(ring.diff())} de {r['rows']} estaciones cambiaron desde el snapshot anterior.")
+
+    def export(self):
+        from citybike import export
+
+        if self.first_ts is None:
+            return 0
+        # sin almacén completo se exporta desde lo que sí se grabó
+        source = {"delta": "delta", "daily": "daily"}.get(self.record_mode, "store")
+        if self.collector is not None:
+            return self.export_networks(source)
+        n = export.export_csv(self.out_csv, start=self.first_ts, end=self.last_ts, source=source)
+        export.export_excel(self.out_excel, start=self.first_ts, end=self.last_ts, source=source)
+        self.exported_ts = self.last_ts
+        return n
+
+    def export_networks(self, source):
+        """Un CSV/Excel por red: la red por defecto en las rutas de siempre, las demás con su id como sufijo."""
+        from citybike import export
+        from citybike.networks import paths
+
+        n = 0
+        for net in self.collector.networks:
+            span = self.spans.get(net['id'])
+            if span is None:
+                continue
+            suffix = "" if net['default'] else f"_{net['id']}"
+            out_csv, out_excel = (f"{stem}{suffix}{ext}" for stem, ext in
+                                  (os.path.splitext(self.out_csv), os.path.splitext(self.out_excel)))
+            root = paths(net)[source]
+            n += export.export_csv(out_csv, start=span[0], end=span[1], root=root, source=source)
+            export.export_excel(out_excel, start=span[0], end=span[1], root=root, source=source)
+        self.exported_ts = self.last_ts
+        return n
+
+    def run(self):
+        self.install_signal_handlers()
+        start = time.time()
+        end_wall = start + self.total_seconds if self.total_seconds else None
+        last_export = start
+        logging.info(f"Daemon: intervalo {self.interval}s alineado al reloj"
+                     + (f" durante {self.total_seconds / 86400:g} días." if end_wall else " sin fin."))
+        try:
+            if self.run_now:
+                self.tick()
+            target = next_boundary(time.time(), self.interval)
+            while not self.stop_event.is_set():
+                if end_wall and target > end_wall:
+                    break
+                logging.info(f"Próximo snapshot en {max(0.0, target - time.time()):.1f}s.")
+                if not self.sleep_until(target):
+                    break
+                self.tick()
+                if self.export_every_seconds and time.time() - last_export >= self.export_every_seconds:
+                    self.export()
+                    last_export = time.time()
+                nxt = next_boundary(time.time(), self.interval)
+                skipped = int(round((nxt - target) / self.interval)) - 1
+                if skipped > 0:
+                    logging.warning(f"El snapshot tardó más que el intervalo: se saltan {skipped} turnos.")
+                target = nxt
+        finally:
+            if (self.export_at_exit or self.export_every_seconds) and self.exported_ts != self.last_ts:
+                n = self.export()
+                logging.info(f"Export final: {n} registros en {self.out_csv} y {self.out_excel}.")
+            if self.collector is not None:
+                self.collector.shutdown()  # las redes que quedaron en curso terminan y se guardan
+            from citybike.browser import shutdown_pool
+            shutdown_pool()  # cierra el Chrome del fallback si llegó a lanzarse
+            logging.info(f"Daemon detenido. {self.n_rows} registros guardados en esta corrida.")
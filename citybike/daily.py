@@ -0,0 +1,180 @@
+# citybike/daily.py
+"""
+Layout diario para versionar en git: un .csv.gz por día.
+
+``data/daily/YYYY-MM/citybike-YYYY-MM-DD.csv.gz`` tiene todas las filas
+de ese día (esquema SNAPSHOT_COLUMNS). Cada snapshot reescribe solo el
+archivo del día en curso, así un commit del workflow toca un único archivo
+chico y los días cerrados no vuelven a cambiar.
+
+La salida es determinista: filas ordenadas por (scrape_timestamp,
+station_id), una sola fila por par (la última grabada gana), valores
+formateados siempre igual y gzip sin fecha ni nombre en el encabezado.
+El mismo contenido da siempre los mismos bytes, y git no ve cambios
+donde no los hay.
+
+El dataset consolidado (CSV o Excel) se rearma localmente con el comando
+``consolidate``, que recorre los días en orden y en streaming
+(citybike.export con source="daily"). El historial anterior a este layout
+(el CSV acumulado o el almacén Parquet) se trae una vez con
+``import-legacy --to daily`` (import_rows()).
+"""
+import os
+import io
+import csv
+import gzip
+import math
+import logging
+
+from citybike.config import DAILY_ROOT
+from citybike.model import SNAPSHOT_COLUMNS, SHARED_FIELDS, STATION_FIELDS, FLOAT, INT, BOOL, Snapshot
+
+COLUMN_KINDS = {**SHARED_FIELDS, **STATION_FIELDS}
+GZIP_LEVEL = 9
+
+
+def day_path(date, root=DAILY_ROOT):
+    return os.path.join(root, date[:7], f"citybike-{date}.csv.gz")
+
+def list_days(root=DAILY_ROOT, start=None, end=None):
+    """Días ('YYYY-MM-DD') con archivo, en orden, filtrados a [start, end]."""
+    if not os.path.isdir(root):
+        return []
+    days = []
+    for month in os.listdir(root):
+        mdir = os.path.join(root, month)
+        if not os.path.isdir(mdir):
+            continue
+        for name in os.listdir(mdir):
+            if name.startswith("citybike-") and name.endswith(".csv.gz"):
+                days.append(name[len("citybike-"):-len(".csv.gz")])
+    days.sort()
+    return [d for d in days if (not start or d >= start[:10]) and (not end or d <= end[:10])]
+
+
+# ---------- ESCRITURA ----------
+def _fmt(v):
+    if hasattr(v, "item"):
+        v = v.item()  # escalares numpy
+    if v is None or (isinstance(v, float) and math.isnan(v)):
+        return ""
+    if isinstance(v, bool):
+        return "True" if v else "False"
+    if isinstance(v, float):
+        return repr(v)
+    return str(v)
+
+def _read_raw(path):
+    """Filas del archivo del día como listas de strings en el orden de SNAPSHOT_COLUMNS."""
+    if not os.path.exists(path):
+        return []
+    with gzip.open(path, "rt", newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return []
+        if header == SNAPSHOT_COLUMNS:
+            return list(reader)
+        idx = [header.index(c) if c in header else None for c in SNAPSHOT_COLUMNS]
+        return [[r[i] if i is not None and i < len(r) else "" for i in idx] for r in reader]
+
+def _write_raw(path, rows):
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    w.writerow(SNAPSHOT_COLUMNS)
+    w.writerows(rows)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as raw:
+        # mtime=0 y sin nombre de archivo: mismos datos -> mismos bytes
+        with gzip.GzipFile(filename="", mode="wb", fileobj=raw, compresslevel=GZIP_LEVEL, mtime=0) as gz:
+            gz.write(buf.getvalue().encode("utf-8"))
+    os.replace(tmp, path)
+
+def append(snapshot, root=DAILY_ROOT):
+    """
+    Agrega un snapshot (citybike.model.Snapshot o lista de filas) al archivo
+    de su día. Idempotente: volver a grabar el mismo snapshot no cambia el
+    archivo. Devuelve la ruta escrita.
+    """
+    snap = snapshot if isinstance(snapshot, Snapshot) else Snapshot.from_rows(snapshot)
+    if not len(snap):
+        return None
+    ts = snap.shared['scrape_timestamp']
+    path = day_path(ts[:10], root)
+    ts_i, sid_i = SNAPSHOT_COLUMNS.index('scrape_timestamp'), SNAPSHOT_COLUMNS.index('station_id')
+
+    merged = {(r[ts_i], r[sid_i]): r for r in _read_raw(path)}
+    cols = [snap.values(c) for c in SNAPSHOT_COLUMNS]
+    for vals in zip(*cols):
+        r = [_fmt(v) for v in vals]
+        merged[(r[ts_i], r[sid_i])] = r
+    _write_raw(path, [merged[k] for k in sorted(merged)])
+    logging.info(f"Diario: {len(snap)} filas -> {path} ({len(merged)} en el día)")
+    return path
+
+def import_rows(rows, root=DAILY_ROOT, report=None):
+    """
+    Agrega filas sueltas (tuplas en el orden de SNAPSHOT_COLUMNS, p.ej. del
+    CSV acumulado o del almacén) a los archivos de sus días. Se validan y
+    deduplican en streaming (citybike.quality.clean_rows) y se junta un día
+    por vez: con las filas en orden cada archivo se escribe una sola vez.
+    Idempotente como append(). Devuelve los días escritos.
+    """
+    from citybike.quality import clean_rows
+
+    ts_i, sid_i = SNAPSHOT_COLUMNS.index('scrape_timestamp'), SNAPSHOT_COLUMNS.index('station_id')
+    written = []
+    day, pending = None, {}
+
+    def flush():
+        if not pending:
+            return
+        path = day_path(day, root)
+        merged = {(r[ts_i], r[sid_i]): r for r in _read_raw(path)}
+        merged.update(pending)
+        _write_raw(path, [merged[k] for k in sorted(merged)])
+        logging.info(f"Diario: {len(pending)} filas importadas -> {path} ({len(merged)} en el día)")
+        if day not in written:
+            written.append(day)
+
+    for r in clean_rows(rows, SNAPSHOT_COLUMNS, report=report):
+        if r[ts_i][:10] != day:
+            flush()
+            day, pending = r[ts_i][:10], {}
+        row = [_fmt(v) for v in r]
+        pending[(row[ts_i], row[sid_i])] = row
+    flush()
+    return written
+
+
+# ---------- LECTURA ----------
+def _parse(kind, s):
+    if s == "":
+        return None
+    if kind == FLOAT:
+        return float(s)
+    if kind == INT:
+        return int(float(s))
+    if kind == BOOL:
+        return s == "True"
+    return s
+
+def iter_rows(start=None, end=None, root=DAILY_ROOT):
+    """Filas (tuplas tipadas en el orden de SNAPSHOT_COLUMNS) de los días en [start, end], en orden."""
+    kinds = [COLUMN_KINDS[c] for c in SNAPSHOT_COLUMNS]
+    ts_i = SNAPSHOT_COLUMNS.index('scrape_timestamp')
+    for day in list_days(root, start, end):
+        for r in _read_raw(day_path(day, root)):
+            ts = r[ts_i]
+            if start and ts < start:
+                continue
+            if end and ts[:len(end)] > end:
+                continue
+            yield tuple(_parse(k, s) for k, s in zip(kinds, r))
+
+def read_all(root=DAILY_ROOT, start=None, end=None):
+    """Todos los días (opcionalmente filtrados) en un solo DataFrame."""
+    import pandas as pd
+
+    return pd.DataFrame(list(iter_rows(start, end, root)), columns=SNAPSHOT_COLUMNS)
@@ -0,0 +1,288 @@
+# citybike/delta.py
+"""
+Modo delta: se graba solo lo que cambió de cada estación.
+
+En ``data/delta/``:
+
+- stations.csv.gz: tabla de dimensión con lo estático de cada estación
+  (nombre, lat, lon, capacidad, zona...). Se agrega una fila, con su
+  valid_from, solo cuando alguno de esos atributos cambia.
+- date=YYYY-MM-DD/ticks.csv.gz: una fila por snapshot con los campos
+  compartidos (timestamp, franja, clima de Clima.com) y si fue keyframe.
+- date=YYYY-MM-DD/status.csv.gz: estado por estación (bicis, espacios,
+  clima de OWM). Solo van las estaciones que cambiaron respecto del
+  snapshot anterior, o todas si es un keyframe. Una estación que
+  desaparece se anota con present=0.
+- state.json: último estado grabado de cada estación, para calcular el
+  próximo delta.
+
+Los .csv.gz se abren en modo append y cada snapshot agrega un miembro
+gzip nuevo (gzip admite miembros concatenados), así grabar cuesta
+O(cambios). Hay keyframe en el primer snapshot de cada día y cada
+DELTA_KEYFRAME_SECONDS, de modo que un día se reconstruye sin leer el
+anterior y llegar a un instante nunca reproduce más que ese tramo.
+
+iter_snapshots() / reconstruct() / snapshot_at() rearman las filas
+completas (esquema SNAPSHOT_COLUMNS) en cualquier instante o rango.
+"""
+import os
+import csv
+import gzip
+import json
+import bisect
+import logging
+from datetime import datetime
+
+from citybike.config import DELTA_ROOT, DELTA_KEYFRAME_SECONDS
+from citybike.model import SNAPSHOT_COLUMNS, Snapshot
+
+STATE_NAME = "state.json"
+DIMENSION_NAME = "stations.csv.gz"
+TICKS_NAME = "ticks.csv.gz"
+STATUS_NAME = "status.csv.gz"
+
+STATIC_FIELDS = ['station_name', 'lat', 'lon', 'capacity', 'in_miraflores', 'zona_inferida', 'densidad_poblacional']
+STATUS_FIELDS = ['free_bikes', 'empty_slots', 'weather_main', 'weather_desc', 'temp_C', 'wind_speed']
+TICK_FIELDS = ['day_of_week', 'periodo_dia', 'clima_miraflores', 'temp_miraflores']
+
+DIMENSION_COLUMNS = ['station_id', 'valid_from'] + STATIC_FIELDS
+TICKS_COLUMNS = ['scrape_timestamp', 'keyframe', 'n_status'] + TICK_FIELDS
+STATUS_COLUMNS = ['scrape_timestamp', 'station_id', 'present'] + STATUS_FIELDS
+
+
+# ---------- ESTADO ----------
+def new_state():
+    return {'last_ts': None, 'keyframe_ts': None, 'keyframe_date': None, 'static': {}, 'status': {}}
+
+def load_state(root=DELTA_ROOT):
+    path = os.path.join(root, STATE_NAME)
+    if not os.path.exists(path):
+        return new_state()
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_state(state, root=DELTA_ROOT):
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, STATE_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+# ---------- ESCRITURA ----------
+def _epoch(ts_iso):
+    return datetime.fromisoformat(str(ts_iso)).timestamp()
+
+def _append_csv(path, columns, rows):
+    """Agrega filas como un miembro gzip nuevo; el encabezado solo si el archivo no existía."""
+    if not rows:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    new = not os.path.exists(path)
+    with gzip.open(path, "at", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        if new:
+            w.writerow(columns)
+        w.writerows(rows)
+
+def record(snapshot, root=DELTA_ROOT):
+    """
+    Graba un snapshot (citybike.model.Snapshot o lista de filas) en modo
+    delta. Idempotente por scrape_timestamp. Devuelve un resumen
+    {'keyframe', 'status_rows', 'dimension_rows', 'stations'} o None si no grabó nada.
+    """
+    snap = snapshot if isinstance(snapshot, Snapshot) else Snapshot.from_rows(snapshot)
+    if not len(snap):
+        return None
+    ts = snap.shared['scrape_timestamp']
+    t = _epoch(ts)
+    date = ts[:10]
+    state = load_state(root)
+    if state['last_ts'] is not None and t <= state['last_ts']:
+        logging.info(f"Delta: snapshot {ts} ya grabado, se omite.")
+        return None
+
+    keyframe = (state['keyframe_ts'] is None or state['keyframe_date'] != date
+                or t - state['keyframe_ts'] >= DELTA_KEYFRAME_SECONDS)
+    ids = [str(x) for x in snap.values('station_id')]
+    statics = zip(*(snap.values(f) for f in STATIC_FIELDS))
+    statuses = zip(*(snap.values(f) for f in STATUS_FIELDS))
+
+    dim_rows, status_rows, current = [], [], {}
+    for sid, static, status in zip(ids, statics, statuses):
+        if sid in current:
+            continue  # fila repetida dentro del mismo snapshot
+        static, status = list(static), list(status)
+        if state['static'].get(sid) != static:
+            dim_rows.append([sid, ts] + static)
+            state['static'][sid] = static
+        current[sid] = status
+        if keyframe or state['status'].get(sid) != status:
+            status_rows.append([ts, sid, 1] + status)
+    if not keyframe:
+        status_rows += [[ts, sid, 0] + [None] * len(STATUS_FIELDS) for sid in state['status'] if sid not in current]
+
+    # la fila de ticks va al final: marca el snapshot como completo para el lector
+    day_dir = os.path.join(root, f"date={date}")
+    _append_csv(os.path.join(day_dir, STATUS_NAME), STATUS_COLUMNS, status_rows)
+    _append_csv(os.path.join(root, DIMENSION_NAME), DIMENSION_COLUMNS, dim_rows)
+    _append_csv(os.path.join(day_dir, TICKS_NAME), TICKS_COLUMNS,
+                [[ts, int(keyframe), len(status_rows)] + [snap.shared.get(f) for f in TICK_FIELDS]])
+
+    state['status'] = current
+    state['last_ts'] = t
+    if keyframe:
+        state['keyframe_ts'], state['keyframe_date'] = t, date
+    save_state(state, root)
+    logging.info(f"Delta: {len(status_rows)} de {len(current)} estaciones grabadas"
+                 + (" (keyframe)" if keyframe else "") + (f", {len(dim_rows)} cambios de dimensión" if dim_rows else ""))
+    return {'keyframe': keyframe, 'status_rows': len(status_rows), 'dimension_rows': len(dim_rows),
+            'stations': len(current)}
+
+
+# ---------- LECTURA ----------
+def _read_csv(path):
+    """Filas de un .csv.gz como dicts de strings ('' = nulo)."""
+    if not os.path.exists(path):
+        return []
+    with gzip.open(path, "rt", newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+def _value(s, kind=float):
+    if s == "" or s is None:
+        return None
+    if kind is bool:
+        return s == "True"
+    if kind is str:
+        return s
+    x = float(s)
+    return int(x) if kind is int else x
+
+FIELD_KINDS = {
+    'station_name': str, 'zona_inferida': str, 'weather_main': str, 'weather_desc': str,
+    'day_of_week': str, 'periodo_dia': str, 'clima_miraflores': str,
+    'capacity': int, 'free_bikes': int, 'empty_slots': int, 'in_miraflores': bool,
+}
+
+def _parse(row, fields):
+    return [_value(row[f], FIELD_KINDS.get(f, float)) for f in fields]
+
+def list_days(root=DELTA_ROOT, start=None, end=None):
+    if not os.path.isdir(root):
+        return []
+    days = sorted(d[len("date="):] for d in os.listdir(root) if d.startswith("date="))
+    return [d for d in days if (not start or d >= start[:10]) and (not end or d <= end[:10])]
+
+def load_dimension(root=DELTA_ROOT):
+    """{station_id: ([valid_from epoch...], [atributos estáticos...])} ordenado por valid_from."""
+    dim = {}
+    for r in _read_csv(os.path.join(root, DIMENSION_NAME)):
+        times, values = dim.setdefault(r['station_id'], ([], []))
+        t = _epoch(r['valid_from'])
+        i = bisect.bisect_right(times, t)
+        times.insert(i, t)
+        values.insert(i, _parse(r, STATIC_FIELDS))
+    return dim
+
+def _static_at(dim, sid, t):
+    entry = dim.get(sid)
+    if not entry:
+        return [None] * len(STATIC_FIELDS)
+    times, values = entry
+    i = bisect.bisect_right(times, t) - 1
+    return values[max(i, 0)]
+
+def _in_window(ts, start, end):
+    # mismo criterio que el export: ISO con la misma zona; 'end' de solo fecha incluye el día
+    if start and ts < start:
+        return False
+    if end and ts[:len(end)] > end:
+        return False
+    return True
+
+def iter_snapshots(start=None, end=None, root=DELTA_ROOT, dim=None):
+    """
+    Genera (scrape_timestamp, filas) de cada snapshot grabado con timestamp en
+    [start, end], con las filas completas (dicts con SNAPSHOT_COLUMNS).
+    Cada día arranca en un keyframe; dentro del día se reproduce desde el
+    último keyframe anterior a 'start'.
+    """
+    dim = load_dimension(root) if dim is None else dim
+    for day in list_days(root, start, end):
+        day_dir = os.path.join(root, f"date={day}")
+        ticks = sorted(_read_csv(os.path.join(day_dir, TICKS_NAME)), key=lambda r: _epoch(r['scrape_timestamp']))
+        if not ticks:
+            continue
+        by_ts = {}
+        for r in _read_csv(os.path.join(day_dir, STATUS_NAME)):
+            by_ts.setdefault(r['scrape_timestamp'], []).append(r)
+
+        first = 0
+        if start:
+            for i, tk in enumerate(ticks):
+                if tk['scrape_timestamp'] >= start:
+                    break
+                if tk['keyframe'] == "1":
+                    first = i
+        cur = {}
+        for tk in ticks[first:]:
+            ts = tk['scrape_timestamp']
+            if end and ts[:len(end)] > end:
+                break
+            if tk['keyframe'] == "1":
+                cur = {}
+            for r in by_ts.get(ts, ()):
+                if r['present'] == "1":
+                    cur[r['station_id']] = _parse(r, STATUS_FIELDS)
+                else:
+                    cur.pop(r['station_id'], None)
+            if not _in_window(ts, start, end):
+                continue
+            t = _epoch(ts)
+            shared = dict(zip(TICK_FIELDS, _parse(tk, TICK_FIELDS)), scrape_timestamp=ts)
+            rows = []
+            for sid, status in cur.items():
+                row = dict(shared, station_id=sid)
+                row.update(zip(STATIC_FIELDS, _static_at(dim, sid, t)))
+                row.update(zip(STATUS_FIELDS, status))
+                rows.append({c: row.get(c) for c in SNAPSHOT_COLUMNS})
+            yield ts, rows
+
+def reconstruct(start=None, end=None, root=DELTA_ROOT):
+    """DataFrame con la serie completa (una fila por estación y snapshot) en [start, end]."""
+    import pandas as pd
+
+    rows = [r for _, snap in iter_snapshots(start, end, root) for r in snap]
+    return pd.DataFrame(rows, columns=SNAPSHOT_COLUMNS)
+
+def snapshot_at(ts, root=DELTA_ROOT):
+    """Filas del último snapshot grabado en o antes de 'ts' (timestamp ISO); [] si no hay."""
+    days = list_days(root, end=ts[:10])
+    for day in reversed(days):
+        ticks = [r['scrape_timestamp'] for r in _read_csv(os.path.join(root, f"date={day}", TICKS_NAME))]
+        before = [x for x in ticks if _epoch(x) <= _epoch(ts)]
+        if before:
+            at = max(before, key=_epoch)
+            for _, rows in iter_snapshots(at, at, root):
+                return rows
+    return []
+
+def summary(root=DELTA_ROOT):
+    """Snapshots, filas de estado grabadas vs. las que ocuparía el modo completo, y bytes en disco."""
+    n_ticks = status_rows = full_rows = keyframes = 0
+    size = 0
+    for day in list_days(root):
+        day_dir = os.path.join(root, f"date={day}")
+        for tk in _read_csv(os.path.join(day_dir, TICKS_NAME)):
+            n_ticks += 1
+            keyframes += tk['keyframe'] == "1"
+            status_rows += int(tk['n_status'])
+        for name in (TICKS_NAME, STATUS_NAME):
+            p = os.path.join(day_dir, name)
+            size += os.path.getsize(p) if os.path.exists(p) else 0
+    for _, rows in iter_snapshots(root=root):
+        full_rows += len(rows)
+    p = os.path.join(root, DIMENSION_NAME)
+    size += os.path.getsize(p) if os.path.exists(p) else 0
+    return {'snapshots': n_ticks, 'keyframes': keyframes, 'status_rows': status_rows,
+            'full_rows': full_rows, 'bytes': size}
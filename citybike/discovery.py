@@ -0,0 +1,68 @@
+# citybike/discovery.py
+"""
+Caché de descubrimiento de fuentes de estaciones (en disco, ``data/.cache/discovery.json``).
+
+Guarda la red de CityBikes resuelta, la URL GBFS que funcionó, el feed
+JSON que Selenium vio pasar por la red (si lo hubo), cuál fue la
+última fuente buena y la salud de cada sonda (éxitos, fallos consecutivos y
+hasta cuándo no volver a probarla). Así un snapshot normal hace una sola
+petición dirigida y el redescubrimiento completo solo ocurre si esa falla.
+"""
+import os
+import json
+import time
+import logging
+
+from citybike.config import DISCOVERY_CACHE, DISCOVERY_TTL_SECONDS, PROBE_BACKOFF_BASE_SECONDS, PROBE_BACKOFF_MAX_SECONDS
+
+
+def empty_cache():
+    return {'network_id': None, 'gbfs_url': None, 'xhr_feed_url': None, 'preferred': None,
+            'discovered_at': None, 'health': {}}
+
+def load_cache(path=DISCOVERY_CACHE):
+    if not os.path.exists(path):
+        return empty_cache()
+    try:
+        with open(path, encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Caché de descubrimiento ilegible ({e}); se redescubre.")
+        return empty_cache()
+    base = empty_cache()
+    base.update(cache)
+    return base
+
+def save_cache(cache, path=DISCOVERY_CACHE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+def is_fresh(cache, now=None):
+    """True si hay una fuente preferida descubierta hace menos de DISCOVERY_TTL_SECONDS."""
+    now = time.time() if now is None else now
+    if not cache.get('preferred') or not cache.get('discovered_at'):
+        return False
+    return now - cache['discovered_at'] < DISCOVERY_TTL_SECONDS
+
+
+# ---------- SALUD POR SONDA ----------
+def record_success(cache, name, now=None):
+    now = time.time() if now is None else now
+    cache['health'][name] = {'last_ok': now, 'fails': 0, 'retry_after': 0}
+
+def record_failure(cache, name, now=None):
+    """Backoff exponencial: 30 min, 1 h, 2 h... hasta PROBE_BACKOFF_MAX_SECONDS."""
+    now = time.time() if now is None else now
+    h = cache['health'].get(name) or {'last_ok': None, 'fails': 0, 'retry_after': 0}
+    h['fails'] += 1
+    wait = min(PROBE_BACKOFF_MAX_SECONDS, PROBE_BACKOFF_BASE_SECONDS * 2 ** (h['fails'] - 1))
+    h['retry_after'] = now + wait
+    cache['health'][name] = h
+
+def is_backed_off(cache, name, now=None):
+    now = time.time() if now is None else now
+    h = cache['health'].get(name)
+    return bool(h) and h.get('retry_after', 0) > now
@@ -0,0 +1,316 @@
+# citybike/enrich.py
+"""
+Enriquecimiento geográfico de estaciones: distancia a Miraflores y capas
+de zonas (Google My Maps KML).
+
+El cálculo es vectorizado con NumPy (todas las estaciones contra todos los
+centros/polígonos a la vez) y se guarda por station_id en
+``data/.cache/station_zones.json``: las estaciones no se mueven, así que un
+snapshot normal solo calcula las estaciones nuevas o movidas. NumPy se
+importa dentro de las funciones vectorizadas.
+"""
+import os
+import json
+import math
+import time
+import logging
+import xml.etree.ElementTree as ET
+
+from citybike.fetch import fetch
+from citybike.config import (
+    MIRAFLORES_CENTER, MIRAFLORES_RADIUS_KM, GMAPS_KML, ZONES_FILE, ZONES_TTL_SECONDS,
+    ZONE_POINT_RADIUS_KM, STATION_ZONES_CACHE,
+)
+
+KML_NS = {'kml': 'http://www.opengis.net/kml/2.2'}
+EARTH_RADIUS_KM = 6371.0
+
+
+# ---------- CAPA DE ZONAS (KML) ----------
+def _parse_coords(text):
+    """'lon,lat[,alt] lon,lat[,alt] ...' -> [(lat, lon), ...]"""
+    out = []
+    for chunk in (text or "").split():
+        lon, lat, *_ = chunk.split(',')
+        out.append((float(lat), float(lon)))
+    return out
+
+def _extended_density(pm):
+    for data in pm.findall('.//kml:ExtendedData/kml:Data', KML_NS):
+        if (data.get('name') or "").lower() in ("densidad", "densidad_poblacional"):
+            value = data.find('kml:value', KML_NS)
+            try:
+                return float(value.text)
+            except (AttributeError, TypeError, ValueError):
+                return None
+    return None
+
+def _walk_placemarks(node, folder, out):
+    for child in node:
+        tag = child.tag.split('}')[-1]
+        if tag in ('Folder', 'Document'):
+            name_el = child.find('kml:name', KML_NS)
+            sub = name_el.text if (tag == 'Folder' and name_el is not None) else folder
+            _walk_placemarks(child, sub, out)
+        elif tag == 'Placemark':
+            out.append((child, folder))
+
+def parse_kml(content):
+    """
+    Placemarks del KML. Los puntos conservan 'lat'/'lon'; los polígonos traen
+    además 'polygon' (lista de (lat, lon)) y su centroide en 'lat'/'lon'.
+    'folder' es la capa de My Maps que los agrupa (p.ej. 'Universidades').
+    """
+    root = ET.fromstring(content)
+    found = []
+    _walk_placemarks(root, None, found)
+    placemarks = []
+    for pm, folder in found:
+        name_el = pm.find('kml:name', KML_NS)
+        name = name_el.text if name_el is not None else None
+        desc_el = pm.find('kml:description', KML_NS)
+        desc = desc_el.text if desc_el is not None else None
+        ring = pm.find('.//kml:Polygon/kml:outerBoundaryIs/kml:LinearRing/kml:coordinates', KML_NS)
+        coord_el = ring if ring is not None else pm.find('.//kml:coordinates', KML_NS)
+        if coord_el is None:
+            continue
+        coords = _parse_coords(coord_el.text)
+        if not coords:
+            continue
+        entry = {
+            'name': name,
+            'description': desc,
+            'folder': folder,
+            'densidad': _extended_density(pm),
+        }
+        if ring is not None and len(coords) >= 3:
+            entry['geometry'] = 'polygon'
+            entry['polygon'] = coords
+            entry['lat'] = sum(c[0] for c in coords) / len(coords)
+            entry['lon'] = sum(c[1] for c in coords) / len(coords)
+        else:
+            entry['geometry'] = 'point'
+            entry['lat'], entry['lon'] = coords[0]
+        placemarks.append(entry)
+    return placemarks
+
+def fetch_kml_gmaps(kml_url):
+    r = fetch(kml_url, timeout=30, conditional=True)
+    r.raise_for_status()
+    return parse_kml(r.content)
+
+def load_zone_layer(source=None):
+    """
+    Capa de 'source' (KML local o URL). Por defecto la capa local
+    (ZONES_FILE) si existe; si no, el KML de Google My Maps.
+    """
+    if source is None:
+        source = ZONES_FILE if os.path.exists(ZONES_FILE) else GMAPS_KML
+    if os.path.exists(source):
+        with open(source, "rb") as f:
+            return parse_kml(f.read())
+    return fetch_kml_gmaps(source)
+
+
+# ---------- DISTANCIAS ----------
+# Haversine: distancia en km entre 2 coordenadas
+def haversine_km(lat1, lon1, lat2, lon2):
+    R = EARTH_RADIUS_KM
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi/2.0)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda/2.0)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    return R * c
+
+def haversine_matrix(lats, lons, ref_lats, ref_lons):
+    """Distancias en km (N estaciones x M referencias) en una sola operación."""
+    import numpy as np
+
+    phi1 = np.radians(np.asarray(lats, dtype=float))[:, None]
+    lam1 = np.radians(np.asarray(lons, dtype=float))[:, None]
+    phi2 = np.radians(np.asarray(ref_lats, dtype=float))[None, :]
+    lam2 = np.radians(np.asarray(ref_lons, dtype=float))[None, :]
+    a = np.sin((phi2 - phi1) / 2.0) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin((lam2 - lam1) / 2.0) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+# ---------- ZONAS (VECTORIZADO) ----------
+def points_in_polygon(lats, lons, polygon):
+    """Ray casting vectorizado: máscara booleana de los puntos dentro del polígono [(lat, lon), ...]."""
+    import numpy as np
+
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    poly = np.asarray(polygon, dtype=float)
+    inside = np.zeros(lats.shape, dtype=bool)
+    y1, x1 = poly[:, 0], poly[:, 1]
+    y2, x2 = np.roll(y1, -1), np.roll(x1, -1)
+    for k in range(len(poly)):
+        crosses = (y1[k] > lats) != (y2[k] > lats)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_at = (x2[k] - x1[k]) * (lats - y1[k]) / (y2[k] - y1[k]) + x1[k]
+        inside ^= crosses & (lons < x_at)
+    return inside
+
+def build_zone_index(zones):
+    """
+    Índice espacial de la capa: cajas envolventes (bbox) de los polígonos en
+    arreglos, para descartar con una sola comparación vectorizada los pares
+    estación-polígono imposibles, y los puntos de interés como arreglos lat/lon.
+    """
+    import numpy as np
+
+    polys = [z for z in zones if z.get('geometry') == 'polygon']
+    points = [z for z in zones if z.get('geometry') != 'polygon']
+    bbox = np.array([[min(c[0] for c in z['polygon']), max(c[0] for c in z['polygon']),
+                      min(c[1] for c in z['polygon']), max(c[1] for c in z['polygon'])] for z in polys],
+                    dtype=float).reshape(-1, 4)
+    return {
+        'polygons': polys,
+        'bbox': bbox,
+        'points': points,
+        'point_lat': np.array([z['lat'] for z in points], dtype=float),
+        'point_lon': np.array([z['lon'] for z in points], dtype=float),
+    }
+
+def _zone_label(z):
+    return z.get('folder') or z.get('name')
+
+def assign_zones(lats, lons, index, point_radius_km=ZONE_POINT_RADIUS_KM):
+    """
+    Zona y densidad para cada estación. Prioridad: polígono que la contiene
+    (el primero de la capa); si ninguno, el punto de interés más cercano dentro
+    de 'point_radius_km'. Devuelve (zonas, densidades) como listas.
+    """
+    import numpy as np
+
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    n = len(lats)
+    zona = [None] * n
+    densidad = [None] * n
+    if n == 0:
+        return zona, densidad
+
+    bbox = index['bbox']
+    if len(bbox):
+        # (N x P): estaciones dentro de la caja de cada polígono
+        cand = ((lats[:, None] >= bbox[None, :, 0]) & (lats[:, None] <= bbox[None, :, 1])
+                & (lons[:, None] >= bbox[None, :, 2]) & (lons[:, None] <= bbox[None, :, 3]))
+        for p in np.flatnonzero(cand.any(axis=0)):
+            rows = np.flatnonzero(cand[:, p])
+            hit = rows[points_in_polygon(lats[rows], lons[rows], index['polygons'][p]['polygon'])]
+            z = index['polygons'][p]
+            for i in hit:
+                if zona[i] is None:
+                    zona[i] = _zone_label(z)
+                    densidad[i] = z.get('densidad')
+
+    if len(index['point_lat']):
+        d = haversine_matrix(lats, lons, index['point_lat'], index['point_lon'])
+        nearest = d.argmin(axis=1)
+        near_ok = d[np.arange(n), nearest] <= point_radius_km
+        for i in np.flatnonzero(near_ok):
+            if zona[i] is None:
+                z = index['points'][nearest[i]]
+                zona[i] = _zone_label(z)
+                densidad[i] = z.get('densidad')
+    return zona, densidad
+
+
+# ---------- CACHÉ POR ESTACIÓN ----------
+def _load_station_cache(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'layer_at': None, 'region': None, 'stations': {}}
+
+def _save_station_cache(cache, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(cache, f, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def _station_key(s):
+    return str(s.get('id')) if s.get('id') is not None else f"{s.get('name')}@{s.get('lat')},{s.get('lon')}"
+
+def _to_float(x):
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return float("nan")
+
+def enrich_stations(stations, cache_path=STATION_ZONES_CACHE, load_layer=load_zone_layer,
+                    center=MIRAFLORES_CENTER, radius_km=MIRAFLORES_RADIUS_KM):
+    """
+    in_miraflores, zona_inferida y densidad_poblacional para cada estación
+    (lista alineada con 'stations'). Reutiliza lo calculado por station_id y solo
+    calcula, en bloque, las estaciones nuevas o cuyas coordenadas cambiaron.
+    'center'/'radius_km' definen la región de referencia (Miraflores por
+    defecto; None = ninguna estación dentro). La caché guarda la región con
+    la que se calculó y se descarta si cambia.
+    """
+    import numpy as np
+
+    now = time.time()
+    region = [float(center[0]), float(center[1]), float(radius_km)] if center is not None else None
+    cache = _load_station_cache(cache_path)
+    if not cache.get('layer_at') or now - cache['layer_at'] > ZONES_TTL_SECONDS:
+        cache = {'layer_at': None, 'region': region, 'stations': {}}  # capa vencida: recalcular todo
+    elif cache.get('region') != region:
+        # otro centro o radio: in_miraflores de la caché ya no vale
+        logging.info("Enriquecimiento: cambió la región de referencia, se recalculan todas las estaciones")
+        cache = {'layer_at': None, 'region': region, 'stations': {}}
+
+    keys = [_station_key(s) for s in stations]
+    todo = []
+    for idx, (key, s) in enumerate(zip(keys, stations)):
+        hit = cache['stations'].get(key)
+        if not hit or hit['lat'] != s.get('lat') or hit['lon'] != s.get('lon'):
+            todo.append(idx)
+
+    if todo:
+        lats = np.array([_to_float(stations[i].get('lat')) for i in todo])
+        lons = np.array([_to_float(stations[i].get('lon')) for i in todo])
+        valid = ~(np.isnan(lats) | np.isnan(lons))
+
+        in_miraf = np.zeros(len(todo), dtype=bool)
+        if valid.any() and center is not None:
+            d = haversine_matrix(lats[valid], lons[valid], [center[0]], [center[1]])[:, 0]
+            in_miraf[valid] = d <= radius_km
+
+        zona = [None] * len(todo)
+        densidad = [None] * len(todo)
+        layer_ok = False
+        try:
+            index = build_zone_index(load_layer())
+            vz, vd = assign_zones(lats[valid], lons[valid], index)
+            for k, i in enumerate(np.flatnonzero(valid)):
+                zona[i], densidad[i] = vz[k], vd[k]
+            layer_ok = True
+        except Exception as e:
+            logging.warning(f"No se pudo cargar la capa de zonas: {e}")
+
+        for k, idx in enumerate(todo):
+            cache['stations'][keys[idx]] = {
+                'lat': stations[idx].get('lat'),
+                'lon': stations[idx].get('lon'),
+                'in_miraflores': bool(in_miraf[k]),
+                'zona_inferida': zona[k],
+                'densidad_poblacional': densidad[k],
+            }
+        # sin capa no se persiste: el próximo snapshot lo vuelve a intentar
+        if layer_ok:
+            if cache['layer_at'] is None:
+                cache['layer_at'] = now
+            _save_station_cache(cache, cache_path)
+        logging.info(f"Enriquecimiento: {len(todo)} estaciones calculadas, {len(stations) - len(todo)} desde caché")
+
+    out = []
+    for key in keys:
+        hit = cache['stations'][key]
+        out.append({k: hit[k] for k in ('in_miraflores', 'zona_inferida', 'densidad_poblacional')})
+    return out
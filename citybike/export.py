@@ -0,0 +1,167 @@
+# citybike/export.py
+"""
+Exportación a CSV / Excel bajo demanda (fuera del camino de cada snapshot).
+
+Las filas se leen del almacén partición por partición y en lotes
+(pyarrow iter_batches), de los .csv.gz diarios o se reconstruyen
+snapshot a snapshot desde el registro delta; se filtran por rango de fechas y estaciones, y se
+escriben en streaming: csv.writer para CSV y openpyxl en modo write_only
+para Excel. La memoria no depende de cuántos meses se exporten.
+
+Con clean=True (por defecto en los exports) las filas pasan por
+citybike.quality.clean_rows(): tipos validados y una sola fila por
+(scrape_timestamp, station_id), recordando solo las claves de los últimos
+días recorridos.
+"""
+import os
+import csv
+import math
+import logging
+from collections import Counter
+
+from citybike import storage, quality
+from citybike.snapshot import SNAPSHOT_COLUMNS
+
+EXPORT_BATCH_ROWS = 50_000
+EXCEL_MAX_ROWS = 1_048_576  # límite de filas por hoja (incluye encabezado)
+
+
+def _in_range(ts, start, end):
+    # ISO 8601 con la misma zona horaria: la comparación de strings respeta el orden;
+    # 'end' de solo fecha incluye el día completo
+    if start and ts < start:
+        return False
+    if end and ts[:len(end)] > end:
+        return False
+    return True
+
+def _clean(v):
+    if isinstance(v, float) and math.isnan(v):
+        return None
+    return v
+
+def _iter_delta_rows(start, end, wanted, columns, root):
+    from citybike import delta
+
+    for _, rows in delta.iter_snapshots(start, end, root or delta.DELTA_ROOT):
+        for r in rows:
+            if wanted is not None and str(r['station_id']) not in wanted:
+                continue
+            yield tuple(_clean(r.get(c)) for c in columns)
+
+def _iter_daily_rows(start, end, wanted, columns, root):
+    from citybike import daily
+
+    sid_i = SNAPSHOT_COLUMNS.index('station_id')
+    idx = [SNAPSHOT_COLUMNS.index(c) for c in columns]
+    for r in daily.iter_rows(start, end, root or daily.DAILY_ROOT):
+        if wanted is not None and str(r[sid_i]) not in wanted:
+            continue
+        yield tuple(r[i] for i in idx)
+
+def iter_rows(start=None, end=None, stations=None, columns=SNAPSHOT_COLUMNS, root=None, source="store"):
+    """
+    Genera las filas (tuplas en el orden de 'columns') del almacén con
+    scrape_timestamp en [start, end] y station_id en 'stations' (si se indica).
+    start/end aceptan 'YYYY-MM-DD' o timestamps ISO completos.
+    Con source="delta" las filas se reconstruyen desde el registro delta y
+    con source="daily" se leen de los .csv.gz diarios. 'root' es el
+    directorio de la fuente (por defecto, el de la red por defecto).
+    """
+    wanted = {str(s) for s in stations} if stations else None
+    if source == "delta":
+        yield from _iter_delta_rows(start, end, wanted, columns, root)
+        return
+    if source == "daily":
+        yield from _iter_daily_rows(start, end, wanted, columns, root)
+        return
+    root = root or storage.STORE_ROOT
+
+    import pyarrow.parquet as pq
+
+    parts = storage.list_partitions(root, start[:10] if start else None, end[:10] if end else None)
+    # las columnas de los filtros se leen siempre, aunque no se pidan en la salida
+    wanted_cols = list(columns) + [c for c in ('scrape_timestamp', 'station_id') if c not in columns]
+    for p in parts:
+        pf = pq.ParquetFile(os.path.join(root, p['path']))
+        present = [c for c in wanted_cols if c in pf.schema_arrow.names]
+        for batch in pf.iter_batches(batch_size=EXPORT_BATCH_ROWS, columns=present):
+            data = batch.to_pydict()
+            n = batch.num_rows
+            cols = [data[c] if c in data else [None] * n for c in columns]
+            ts_col = data.get('scrape_timestamp')
+            sid_col = data.get('station_id')
+            for i in range(n):
+                if ts_col is not None and not _in_range(str(ts_col[i]), start, end):
+                    continue
+                if wanted is not None and (sid_col is None or str(sid_col[i]) not in wanted):
+                    continue
+                yield tuple(_clean(col[i]) for col in cols)
+
+def _log_quality(report):
+    if report['invalidas'] or report['duplicadas'] or report['anulados']:
+        logging.warning(f"Calidad: {report['duplicadas']} filas repetidas y {report['invalidas']} inválidas omitidas, "
+                        f"{report['anulados']} valores inválidos anulados (de {report['filas']} filas)")
+
+def iter_clean_rows(start=None, end=None, stations=None, columns=SNAPSHOT_COLUMNS, root=None, source="store",
+                    report=None):
+    """iter_rows() validado y sin filas repetidas (citybike.quality.clean_rows); cuenta en 'report'."""
+    return quality.clean_rows(iter_rows(start, end, stations, columns, root, source), list(columns), report=report)
+
+def export_csv(out, start=None, end=None, stations=None, columns=SNAPSHOT_COLUMNS, root=None, source="store",
+               clean=True):
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    n = 0
+    tmp = out + ".tmp"
+    report = Counter()
+    rows = (iter_clean_rows(start, end, stations, columns, root, source, report) if clean
+            else iter_rows(start, end, stations, columns, root, source))
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(columns)
+        for row in rows:
+            w.writerow(row)
+            n += 1
+    os.replace(tmp, out)
+    _log_quality(report)
+    logging.info(f"Export CSV: {n} filas -> {out}")
+    return n
+
+def export_excel(out, start=None, end=None, stations=None, columns=SNAPSHOT_COLUMNS, root=None, source="store",
+                 clean=True):
+    """Excel en modo write_only (memoria constante); abre otra hoja al llegar al límite de filas."""
+    from openpyxl import Workbook
+
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    wb = Workbook(write_only=True)
+    ws = None
+    sheet_rows = EXCEL_MAX_ROWS
+    n = 0
+    report = Counter()
+    rows = (iter_clean_rows(start, end, stations, columns, root, source, report) if clean
+            else iter_rows(start, end, stations, columns, root, source))
+    for row in rows:
+        if sheet_rows >= EXCEL_MAX_ROWS:
+            ws = wb.create_sheet(f"datos_{len(wb.worksheets) + 1}" if wb.worksheets else "datos")
+            ws.append(list(columns))
+            sheet_rows = 1
+        ws.append(list(row))
+        sheet_rows += 1
+        n += 1
+    if ws is None:
+        wb.create_sheet("datos").append(list(columns))
+    tmp = out + ".tmp.xlsx"
+    wb.save(tmp)
+    os.replace(tmp, out)
+    _log_quality(report)
+    logging.info(f"Export Excel: {n} filas -> {out}")
+    return n
+
+def export(out, fmt=None, **kwargs):
+    """Despacha por formato ('csv' / 'xlsx'); si no se indica, por la extensión de 'out'."""
+    fmt = (fmt or os.path.splitext(out)[1].lstrip(".") or "csv").lower()
+    if fmt in ("xlsx", "excel"):
+        return export_excel(out, **kwargs)
+    if fmt == "csv":
+        return export_csv(out, **kwargs)
+    raise ValueError(f"Formato de export no soportado: {fmt}")
@@ -0,0 +1,238 @@
+# citybike/fetch.py
+"""
+Capa HTTP compartida por todos los fetchers.
+
+- Una sola requests.Session con pool de conexiones y keep-alive (reutiliza
+  TCP/TLS entre las sondas y entre snapshots del mismo proceso).
+- gzip/deflate negociado siempre (Accept-Encoding).
+- GET condicional (ETag / Last-Modified) respaldado por una caché en disco:
+  si el servidor responde 304 se devuelve el cuerpo guardado.
+- Reintentos con backoff exponencial y jitter ante errores de conexión,
+  timeouts y respuestas 429/5xx.
+- Registro de tiempo y bytes de cada petición (fetch_stats()), que
+  también se suman a la etapa en curso de citybike.metrics.
+- Grabación / reproducción (citybike.replay): en modo "replay" la
+  respuesta sale del cassette sin red, en "record" se guarda la respuesta
+  final y en "standin" la petición va al servidor local que hace de todos
+  los hosts.
+"""
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from citybike import metrics, replay
+from citybike.config import (
+    HTTP_CACHE_DIR, MAX_PROBE_WORKERS, FETCH_RETRIES, FETCH_BACKOFF_BASE_SECONDS, FETCH_BACKOFF_MAX_SECONDS,
+)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+_stats = []
+_stats_lock = threading.Lock()
+
+
+class FetchResult(namedtuple('FetchResult', ['url', 'status_code', 'content', 'headers', 'from_cache', 'elapsed'])):
+    """Respuesta mínima con la interfaz que usan los fetchers (json(), text, raise_for_status())."""
+    __slots__ = ()
+
+    @property
+    def text(self):
+        ctype = self.headers.get('Content-Type') or ""
+        charset = "utf-8"
+        if "charset=" in ctype:
+            charset = ctype.split("charset=", 1)[1].split(";")[0].strip() or charset
+        return self.content.decode(charset, errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} para {self.url}")
+
+
+# ---------- SESIÓN ----------
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=10, pool_maxsize=MAX_PROBE_WORKERS)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            s.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+            _session = s
+        return _session
+
+
+# ---------- CACHÉ EN DISCO ----------
+def _cache_key(url, params):
+    raw = url + "?" + json.dumps(params or {}, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def _load_cached(key):
+    meta_path = os.path.join(HTTP_CACHE_DIR, key + ".json")
+    body_path = os.path.join(HTTP_CACHE_DIR, key + ".body")
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(body_path, "rb") as f:
+            return meta, f.read()
+    except (OSError, ValueError):
+        return None
+
+def _save_cached(key, url, resp):
+    etag = resp.headers.get('ETag')
+    last_modified = resp.headers.get('Last-Modified')
+    if not etag and not last_modified:
+        return  # sin validadores no hay GET condicional posible
+    os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
+    meta = {
+        'url': url,
+        'etag': etag,
+        'last_modified': last_modified,
+        'content_type': resp.headers.get('Content-Type'),
+        'saved_at': time.time(),
+    }
+    body_path = os.path.join(HTTP_CACHE_DIR, key + ".body")
+    meta_path = os.path.join(HTTP_CACHE_DIR, key + ".json")
+    # temporales por hilo: dos redes pueden pedir la misma URL a la vez
+    suffix = f".{threading.get_ident()}.tmp"
+    with open(body_path + suffix, "wb") as f:
+        f.write(resp.content)
+    os.replace(body_path + suffix, body_path)
+    with open(meta_path + suffix, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(meta_path + suffix, meta_path)
+
+
+# ---------- ESTADÍSTICAS ----------
+def _record(url, status, elapsed, nbytes, wire_bytes, from_cache, attempts, error=None):
+    entry = {
+        'url': url,
+        'status': status,
+        'elapsed': round(elapsed, 4),
+        'bytes': nbytes,
+        'wire_bytes': wire_bytes,
+        'from_cache': from_cache,
+        'attempts': attempts,
+        'error': error,
+    }
+    with _stats_lock:
+        _stats.append(entry)
+    metrics.add_http(nbytes, error)
+    logging.debug(f"GET {url} -> {status} en {elapsed * 1000:.0f} ms, {nbytes} B"
+                  + (" (304, desde caché)" if from_cache else ""))
+
+def fetch_stats():
+    with _stats_lock:
+        return list(_stats)
+
+def reset_fetch_stats():
+    with _stats_lock:
+        _stats.clear()
+
+def log_fetch_summary(stats=None):
+    stats = fetch_stats() if stats is None else stats
+    if not stats:
+        return
+    total_bytes = sum(s['bytes'] or 0 for s in stats)
+    wire = sum(s['wire_bytes'] or 0 for s in stats)
+    cached = sum(1 for s in stats if s['from_cache'])
+    errors = sum(1 for s in stats if s['error'])
+    logging.info(f"HTTP: {len(stats)} peticiones, {total_bytes / 1024:.1f} KB ({wire / 1024:.1f} KB en red), "
+                 f"{sum(s['elapsed'] for s in stats):.2f} s acumulados, {cached} desde caché (304), {errors} con error")
+
+
+# ---------- GET ----------
+def _backoff(attempt, retry_after=None):
+    if retry_after is not None:
+        return min(FETCH_BACKOFF_MAX_SECONDS, retry_after)
+    # "full jitter": uniforme entre 0 y base * 2^intento
+    return random.uniform(0, min(FETCH_BACKOFF_MAX_SECONDS, FETCH_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+def _retry_after(resp):
+    value = resp.headers.get('Retry-After')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+def _replay(cassette, url, params):
+    hit = cassette.get(url, params)
+    if hit is None:
+        _record(url, None, 0.0, 0, 0, False, 1, "ConnectionError")
+        raise requests.ConnectionError(f"Sin respuesta grabada para {url} en {cassette.root}")
+    status, content_type, body = hit
+    headers = CaseInsensitiveDict({'Content-Type': content_type} if content_type else {})
+    _record(url, status, 0.0, len(body), 0, True, 1, None if status < 400 else f"HTTP{status}")
+    return FetchResult(url, status, body, headers, True, 0.0)
+
+def fetch(url, params=None, headers=None, timeout=20, conditional=False, retries=FETCH_RETRIES):
+    """
+    GET con la sesión compartida. Con conditional=True envía If-None-Match /
+    If-Modified-Since según la caché en disco y, ante un 304, devuelve el
+    cuerpo guardado. Reintenta 'retries' veces ante fallos transitorios.
+    Devuelve un FetchResult; los errores de red finales se propagan.
+    """
+    cassette = replay.cassette()
+    if cassette is not None and replay.mode() == "replay":
+        return _replay(cassette, url, params)
+    session = get_session()
+    req_headers = dict(headers or {})
+    key = _cache_key(url, params) if conditional else None
+    cached = _load_cached(key) if conditional else None
+    if cached:
+        meta, _ = cached
+        if meta.get('etag'):
+            req_headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            req_headers['If-Modified-Since'] = meta['last_modified']
+
+    t0 = time.perf_counter()
+    attempt = 0
+    while True:
+        try:
+            resp = session.get(replay.route(url), params=params, headers=req_headers, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt >= retries:
+                _record(url, None, time.perf_counter() - t0, 0, 0, False, attempt + 1, type(e).__name__)
+                raise
+            time.sleep(_backoff(attempt))
+            attempt += 1
+            continue
+        if resp.status_code in RETRY_STATUSES and attempt < retries:
+            time.sleep(_backoff(attempt, _retry_after(resp)))
+            attempt += 1
+            continue
+        break
+
+    elapsed = time.perf_counter() - t0
+    wire_bytes = int(resp.headers.get('Content-Length') or len(resp.content))
+    if resp.status_code == 304 and cached:
+        meta, body = cached
+        result_headers = CaseInsensitiveDict(resp.headers)
+        if meta.get('content_type'):
+            result_headers['Content-Type'] = meta['content_type']
+        _record(url, 304, elapsed, len(body), wire_bytes, True, attempt + 1)
+        if cassette is not None:
+            cassette.put(url, params, 200, meta.get('content_type'), body)
+        return FetchResult(url, 200, body, result_headers, True, elapsed)
+
+    if conditional and resp.status_code == 200:
+        _save_cached(key, url, resp)
+    _record(url, resp.status_code, elapsed, len(resp.content), wire_bytes, False, attempt + 1,
+            None if resp.status_code < 400 else f"HTTP{resp.status_code}")
+    if cassette is not None:
+        cassette.put(url, params, resp.status_code, resp.headers.get('Content-Type'), resp.content)
+    return FetchResult(url if replay.routed() else resp.url, resp.status_code, resp.content, resp.headers, False, elapsed)
@@ -0,0 +1,94 @@
+# citybike/jsonscan.py
+"""
+Extractor de JSON embebido en scripts (fallback de Selenium).
+
+Un solo recorrido lineal del texto con un tokenizador de corchetes: la
+regex TOKEN salta directo entre los caracteres que importan ([ ] { } :)
+y consume enteros los strings ("...", '...', `...`) y comentarios, así los
+corchetes dentro de ellos no desbalancean la pila. Un objeto se marca como
+registro de estación si tiene una clave "lat"/"lon"/"latitude"/"longitude";
+un array que contiene objetos marcados se entrega como candidato, y solo
+esos pocos tramos pasan por json.loads.
+
+Un corchete de cierre que no corresponde (p.ej. el de una regex literal
+de JS) vacía la pila: el escaneo se resincroniza en vez de fallar.
+"""
+import re
+import json
+
+STATION_KEYS = frozenset(["lat", "lon", "latitude", "longitude"])
+
+TOKEN = re.compile(r"""
+    "(?:[^"\\\n]|\\.)*"        # string con comillas dobles
+  | '(?:[^'\\\n]|\\.)*'        # string con comillas simples (JS)
+  | `(?:[^`\\]|\\.)*`          # template literal (JS)
+  | //[^\n]*                   # comentario de línea
+  | /\*.*?\*/                  # comentario de bloque
+  | [\[\]{}:]
+""", re.S | re.X)
+
+_OPEN = {']': '[', '}': '{'}
+
+
+def iter_station_spans(text):
+    """
+    Genera (inicio, fin) de los arrays balanceados de 'text' que contienen
+    objetos con claves de coordenadas. Si hay arrays de estaciones anidados,
+    sale primero el interior (se cierra antes).
+    """
+    # marco: [corchete, inicio, objeto con clave de estación, array con objeto de estación]
+    stack = []
+    key = None
+    for m in TOKEN.finditer(text):
+        tok = m.group()
+        c = tok[0]
+        if c == '"' or c == "'":
+            key = tok[1:-1]
+            continue
+        if c == ':':
+            if key in STATION_KEYS and stack and stack[-1][0] == '{':
+                stack[-1][2] = True
+        elif c == '[' or c == '{':
+            stack.append([c, m.start(), False, False])
+        elif c == ']' or c == '}':
+            if not stack or stack[-1][0] != _OPEN[c]:
+                stack.clear()  # desbalanceado: resincronizar
+            else:
+                frame = stack.pop()
+                if c == '}':
+                    if frame[2] and stack and stack[-1][0] == '[':
+                        stack[-1][3] = True
+                elif frame[3]:
+                    yield frame[1], m.end()
+        key = None
+
+def iter_station_arrays(text):
+    """Los arrays de estaciones de 'text' ya decodificados (los que no son JSON válido se saltan)."""
+    for start, end in iter_station_spans(text):
+        try:
+            arr = json.loads(text[start:end])
+        except ValueError:
+            continue
+        yield arr
+
+def extract_stations(texts):
+    """
+    Estaciones de una lista de textos de scripts: los registros con lat/lon
+    (o latitude/longitude) del primer array que tenga alguno.
+    """
+    for txt in texts:
+        if not txt:
+            continue
+        for arr in iter_station_arrays(txt):
+            out = []
+            for e in arr:
+                if not isinstance(e, dict):
+                    continue
+                lat = e.get('lat', e.get('latitude'))
+                lon = e.get('lon', e.get('longitude'))
+                if lat is None or lon is None:
+                    continue
+                out.append({'id': e.get('station_id') or e.get('id'), 'name': e.get('name'), 'lat': lat, 'lon': lon})
+            if out:
+                return out
+    return []
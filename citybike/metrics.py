@@ -0,0 +1,209 @@
+# citybike/metrics.py
+"""
+Métricas por etapa de cada snapshot, en ``data/metrics.jsonl``.
+
+Cada corrida (una red, un snapshot) es una traza: trace() la abre y al
+cerrarse agrega una línea JSON con la red, el inicio, la duración total,
+la fuente elegida, las estaciones, la clase del error (si lo hubo) y la
+lista de etapas. Cada etapa (stage()) registra su duración, los bytes y
+peticiones HTTP hechas dentro de ella (los anota citybike.fetch), el error
+y los campos que le agregue quien la mide (fuente, estaciones, modo...).
+
+Las etapas se anidan con nombres con puntos ('stations' >
+'stations.gbfs'); los bytes de una etapa incluyen los de sus hijas. La
+traza en curso viaja en un contextvars.ContextVar: en los hilos propios
+(sondas, OWM, varias redes a la vez) la tarea se envuelve con bind() para
+que sus peticiones cuenten en la etapa que la lanzó. Sin traza abierta,
+stage() no mide nada.
+
+summarize() agrega p50/p95 por etapa sobre las corridas guardadas (comando
+``stats``). El archivo se rota a ``.1`` al pasar METRICS_MAX_BYTES.
+"""
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from citybike.config import METRICS_FILE, METRICS_MAX_BYTES
+
+_trace = contextvars.ContextVar("citybike_trace", default=None)
+_stage = contextvars.ContextVar("citybike_stage", default=None)
+
+
+class Trace:
+    def __init__(self, network=None):
+        self.record = {
+            'run_id': os.urandom(6).hex(),
+            'network': network,
+            'started_at': datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            'seconds': None,
+            'source': None,
+            'stations': None,
+            'requests': 0,
+            'bytes': 0,
+            'error': None,
+            'stages': [],
+        }
+        self.lock = threading.Lock()
+
+    def add_stage(self, rec):
+        with self.lock:
+            self.record['stages'].append(rec)
+
+
+# ---------- MEDICIÓN ----------
+@contextmanager
+def trace(network=None, path=METRICS_FILE):
+    """Abre la traza de una corrida y, al cerrarla, la agrega a 'path' (path=None: no se guarda)."""
+    t = Trace(network)
+    token = _trace.set(t)
+    stage_token = _stage.set(None)
+    t0 = time.perf_counter()
+    try:
+        yield t.record
+    except BaseException as e:
+        t.record['error'] = type(e).__name__
+        raise
+    finally:
+        t.record['seconds'] = round(time.perf_counter() - t0, 4)
+        _stage.reset(stage_token)
+        _trace.reset(token)
+        if path:
+            try:
+                # bajo el lock: una sonda abandonada puede seguir sumando etapas o bytes
+                with t.lock:
+                    line = json.dumps(t.record, sort_keys=True, ensure_ascii=False)
+                append_line(line, path)
+            except OSError as e:
+                logging.warning(f"No se pudieron guardar las métricas en {path}: {e}")
+
+@contextmanager
+def stage(name, **fields):
+    """
+    Mide una etapa de la traza en curso. Devuelve el dict de la etapa para
+    agregarle campos (p.ej. rec['stations'] = n). Una excepción queda como
+    'error' (su clase) y se propaga.
+    """
+    t = _trace.get()
+    if t is None:
+        yield {}
+        return
+    rec = {'stage': name, 'seconds': None, 'requests': 0, 'bytes': 0, 'error': None, **fields}
+    parent = _stage.get()
+    token = _stage.set((rec, parent))
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    except BaseException as e:
+        rec['error'] = type(e).__name__
+        raise
+    finally:
+        rec['seconds'] = round(time.perf_counter() - t0, 4)
+        _stage.reset(token)
+        t.add_stage(rec)
+
+def annotate(**fields):
+    """Campos de la corrida (source, stations...) en la traza en curso."""
+    t = _trace.get()
+    if t is not None:
+        with t.lock:
+            t.record.update(fields)
+
+def add_http(nbytes, error=None):
+    """Una petición HTTP: suma a la etapa en curso, a sus padres y a la corrida (lo llama citybike.fetch)."""
+    t = _trace.get()
+    if t is None:
+        return
+    with t.lock:
+        t.record['requests'] += 1
+        t.record['bytes'] += nbytes or 0
+        node = _stage.get()
+        while node is not None:
+            rec, node = node
+            rec['requests'] += 1
+            rec['bytes'] += nbytes or 0
+
+def bind(fn):
+    """'fn' para correr en otro hilo dentro de la traza y la etapa actuales."""
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
+
+
+# ---------- ARCHIVO ----------
+def append_line(line, path=METRICS_FILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if os.path.exists(path) and os.path.getsize(path) > METRICS_MAX_BYTES:
+        os.replace(path, path + ".1")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+def load(path=METRICS_FILE, network=None, since=None, last=None):
+    """Corridas guardadas (la rotada primero), filtradas por red, inicio >= 'since' y últimas 'last'."""
+    runs = []
+    for p in (path + ".1", path):
+        if not os.path.exists(p):
+            continue
+        with open(p, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    r = json.loads(line)
+                except ValueError:
+                    continue  # línea cortada por una corrida interrumpida
+                if network is not None and r.get('network') != network:
+                    continue
+                if since and r.get('started_at', "") < since:
+                    continue
+                runs.append(r)
+    return runs[-last:] if last else runs
+
+
+# ---------- RESUMEN ----------
+def percentile(values, q):
+    """Percentil 'q' (0-100) con interpolación lineal; None si no hay valores."""
+    if not values:
+        return None
+    xs = sorted(values)
+    k = (len(xs) - 1) * q / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(xs) - 1)
+    return xs[lo] + (xs[hi] - xs[lo]) * (k - lo)
+
+def summarize(runs):
+    """
+    Una fila por etapa (más 'total' por corrida): n, p50/p95/máx en
+    segundos, errores, bytes promedio y la fuente más usada. Ordenadas por
+    p95 descendente.
+    """
+    groups = {}
+    for r in runs:
+        entries = [{'stage': "total", 'seconds': r.get('seconds'), 'bytes': r.get('bytes'),
+                    'error': r.get('error'), 'source': r.get('source')}] + list(r.get('stages') or [])
+        for s in entries:
+            if s.get('seconds') is None:
+                continue
+            g = groups.setdefault(s['stage'], {'seconds': [], 'bytes': [], 'errors': {}, 'sources': {}})
+            g['seconds'].append(s['seconds'])
+            g['bytes'].append(s.get('bytes') or 0)
+            if s.get('error'):
+                g['errors'][s['error']] = g['errors'].get(s['error'], 0) + 1
+            if s.get('source'):
+                g['sources'][s['source']] = g['sources'].get(s['source'], 0) + 1
+    rows = []
+    for name, g in groups.items():
+        rows.append({
+            'stage': name,
+            'n': len(g['seconds']),
+            'p50': percentile(g['seconds'], 50),
+            'p95': percentile(g['seconds'], 95),
+            'max': max(g['seconds']),
+            'errors': sum(g['errors'].values()),
+            'error_classes': g['errors'],
+            'avg_bytes': sum(g['bytes']) / len(g['bytes']),
+            'top_source': max(g['sources'], key=g['sources'].get) if g['sources'] else None,
+        })
+    rows.sort(key=lambda row: (row['stage'] != "total", -row['p95']))
+    return rows
@@ -0,0 +1,297 @@
+# citybike/model.py
+"""
+Modelo compacto de un snapshot.
+
+Lo que vale igual para todas las estaciones de un snapshot (timestamp,
+día, franja, clima de Clima.com) se guarda una sola vez en 'shared'. Lo
+que es de cada estación va en columnas numpy tipadas:
+
+- float64 para coordenadas, temperatura, viento y densidad (None -> NaN)
+- int32 con máscara de nulos para capacidad y bicis/espacios libres
+- bool para in_miraflores
+- textos (id, nombre, zona, clima de OWM) como códigos int32 contra un
+  diccionario por campo compartido por todo el proceso (-1 = None): en
+  modo daemon cada nombre de estación existe una sola vez en memoria.
+
+Una columna sin ningún valor (p.ej. el clima de OWM cuando no hay key) no
+ocupa nada: queda como None y se expande recién al convertir.
+
+to_arrow() envuelve los mismos buffers sin copiarlos (los textos como
+DictionaryArray sobre los códigos); to_pandas() también para las columnas
+numéricas (float64, IntegerArray sobre valores + máscara), mientras que
+los textos salen como category (pandas reempaqueta los códigos al entero
+más chico que alcance, una copia de 1-2 bytes por estación).
+Iterar un Snapshot da las filas como dicts, igual que la lista que
+devolvía collect_snapshot, así que el código que esperaba filas sigue
+funcionando.
+
+numpy, pandas y pyarrow se importan solo al usarse.
+"""
+import math
+import threading
+
+# Columnas de cada fila de snapshot, en orden (también las del export)
+SNAPSHOT_COLUMNS = [
+    'scrape_timestamp', 'station_id', 'station_name', 'lat', 'lon', 'capacity', 'free_bikes', 'empty_slots',
+    'day_of_week', 'periodo_dia', 'weather_main', 'weather_desc', 'temp_C', 'wind_speed',
+    'clima_miraflores', 'temp_miraflores', 'in_miraflores', 'zona_inferida', 'densidad_poblacional',
+]
+
+FLOAT, INT, BOOL, STR = "float", "int", "bool", "str"
+
+# Un valor por snapshot
+SHARED_FIELDS = {
+    'scrape_timestamp': STR, 'day_of_week': STR, 'periodo_dia': STR,
+    'clima_miraflores': STR, 'temp_miraflores': FLOAT,
+}
+
+# Un valor por estación
+STATION_FIELDS = {
+    'station_id': STR, 'station_name': STR, 'lat': FLOAT, 'lon': FLOAT,
+    'capacity': INT, 'free_bikes': INT, 'empty_slots': INT,
+    'weather_main': STR, 'weather_desc': STR, 'temp_C': FLOAT, 'wind_speed': FLOAT,
+    'in_miraflores': BOOL, 'zona_inferida': STR, 'densidad_poblacional': FLOAT,
+}
+
+
+# ---------- DICCIONARIOS ----------
+class ValueDictionary:
+    """Textos -> códigos int32. Solo crece, así los códigos de snapshots viejos siguen valiendo."""
+
+    def __init__(self):
+        self.values = []
+        self.index = {}
+        self.lock = threading.Lock()
+        self._pandas = (-1, None)
+        self._arrow = (-1, None)
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, seq):
+        import numpy as np
+
+        codes = np.empty(len(seq), dtype=np.int32)
+        with self.lock:
+            for i, v in enumerate(seq):
+                if v is None:
+                    codes[i] = -1
+                    continue
+                v = str(v)
+                c = self.index.get(v)
+                if c is None:
+                    c = self.index[v] = len(self.values)
+                    self.values.append(v)
+                codes[i] = c
+        return codes
+
+    def decode(self, codes):
+        values = self.values
+        return [values[c] if c >= 0 else None for c in codes.tolist()]
+
+    def pandas_dtype(self):
+        import pandas as pd
+
+        n = len(self.values)
+        if self._pandas[0] != n:
+            self._pandas = (n, pd.CategoricalDtype(self.values[:n]))
+        return self._pandas[1]
+
+    def arrow_values(self):
+        import pyarrow as pa
+
+        n = len(self.values)
+        if self._arrow[0] != n:
+            self._arrow = (n, pa.array(self.values[:n], type=pa.string()))
+        return self._arrow[1]
+
+
+DICTIONARIES = {name: ValueDictionary() for name, kind in STATION_FIELDS.items() if kind == STR}
+
+
+# ---------- CODIFICACIÓN ----------
+def _float(v):
+    try:
+        x = float(v)
+    except (TypeError, ValueError):
+        return math.nan
+    return x
+
+def _encode(name, kind, seq):
+    import numpy as np
+
+    if kind == FLOAT:
+        return np.array([_float(v) for v in seq], dtype=np.float64)
+    if kind == INT:
+        f = np.array([_float(v) for v in seq], dtype=np.float64)
+        mask = np.isnan(f)
+        return np.where(mask, 0, f).astype(np.int32), mask
+    if kind == BOOL:
+        return np.array([bool(v) for v in seq], dtype=np.bool_)
+    return DICTIONARIES[name].encode(seq)
+
+def _decode(name, kind, col, n):
+    """Columna como lista de valores Python (None para nulos)."""
+    if col is None:
+        return [None] * n
+    if kind == FLOAT:
+        return [None if x != x else x for x in col.tolist()]
+    if kind == INT:
+        values, mask = col
+        return [None if m else v for v, m in zip(values.tolist(), mask.tolist())]
+    if kind == BOOL:
+        return col.tolist()
+    return DICTIONARIES[name].decode(col)
+
+
+# ---------- SNAPSHOT ----------
+class Snapshot:
+    __slots__ = ('shared', 'columns', 'n', 'source')
+
+    def __init__(self, shared, columns, n, source=None):
+        self.shared = shared      # {campo: valor} de SHARED_FIELDS
+        self.columns = columns    # {campo: array | (valores, máscara) | None} de STATION_FIELDS
+        self.n = n
+        self.source = source
+
+    @classmethod
+    def from_values(cls, shared, values, source=None):
+        """'values': {campo por estación: lista de valores Python}; los campos ausentes quedan nulos."""
+        n = len(next(iter(values.values()))) if values else 0
+        columns = {}
+        for name, kind in STATION_FIELDS.items():
+            seq = values.get(name)
+            if seq is None or all(v is None for v in seq):
+                columns[name] = None
+            else:
+                columns[name] = _encode(name, kind, seq)
+        return cls({f: shared.get(f) for f in SHARED_FIELDS}, columns, n, source)
+
+    @classmethod
+    def from_rows(cls, rows, source=None):
+        """Desde la lista de dicts de antes (los campos compartidos se toman de la primera fila)."""
+        rows = list(rows)
+        shared = {f: rows[0].get(f) for f in SHARED_FIELDS} if rows else {}
+        values = {name: [r.get(name) for r in rows] for name in STATION_FIELDS}
+        return cls.from_values(shared, values, source) if rows else cls(shared, {}, 0, source)
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self):
+        return iter(self.rows())
+
+    def __getitem__(self, i):
+        if not -self.n <= i < self.n:
+            raise IndexError(i)
+        i %= self.n
+        row = {}
+        for name in SNAPSHOT_COLUMNS:
+            if name in SHARED_FIELDS:
+                row[name] = self.shared.get(name)
+            else:
+                kind, col = STATION_FIELDS[name], self.columns.get(name)
+                if col is None:
+                    row[name] = None
+                elif kind == INT:
+                    row[name] = None if col[1][i] else int(col[0][i])
+                else:
+                    row[name] = _decode(name, kind, col[i:i + 1], 1)[0]
+        return row
+
+    def values(self, name):
+        """Una columna como lista de valores Python (los compartidos, repetidos)."""
+        if name in SHARED_FIELDS:
+            return [self.shared.get(name)] * self.n
+        return _decode(name, STATION_FIELDS[name], self.columns.get(name), self.n)
+
+    def rows(self):
+        """Las filas como dicts con el esquema de SNAPSHOT_COLUMNS."""
+        cols = [self.values(name) for name in SNAPSHOT_COLUMNS]
+        return [dict(zip(SNAPSHOT_COLUMNS, vals)) for vals in zip(*cols)]
+
+    def take(self, positions):
+        """Snapshot con solo las estaciones en 'positions' (mismos campos compartidos)."""
+        import numpy as np
+
+        idx = np.asarray(positions, dtype=np.intp)
+        columns = {}
+        for name, col in self.columns.items():
+            if col is None:
+                columns[name] = None
+            elif isinstance(col, tuple):
+                columns[name] = (col[0][idx], col[1][idx])
+            else:
+                columns[name] = col[idx]
+        return Snapshot(dict(self.shared), columns, len(idx), self.source)
+
+    def nbytes(self):
+        """Bytes de los buffers por estación (sin contar los diccionarios compartidos)."""
+        total = 0
+        for col in self.columns.values():
+            if col is None:
+                continue
+            total += sum(a.nbytes for a in col) if isinstance(col, tuple) else col.nbytes
+        return total
+
+    # ----- conversión -----
+    def to_pandas(self):
+        """DataFrame sobre los mismos buffers (Int32 nullable, category, float64, bool)."""
+        import numpy as np
+        import pandas as pd
+
+        n = self.n
+        data = {}
+        for name in SNAPSHOT_COLUMNS:
+            if name in SHARED_FIELDS:
+                v = self.shared.get(name)
+                if SHARED_FIELDS[name] == FLOAT:
+                    data[name] = np.full(n, math.nan if v is None else float(v))
+                elif v is None:
+                    data[name] = pd.Categorical.from_codes(np.full(n, -1, dtype=np.int8), categories=[])
+                else:
+                    data[name] = pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), categories=[v])
+                continue
+            kind, col = STATION_FIELDS[name], self.columns.get(name)
+            if kind == FLOAT:
+                data[name] = col if col is not None else np.full(n, math.nan)
+            elif kind == INT:
+                values, mask = col if col is not None else (np.zeros(n, dtype=np.int32), np.ones(n, dtype=np.bool_))
+                data[name] = pd.arrays.IntegerArray(values, mask)
+            elif kind == BOOL:
+                data[name] = col if col is not None else pd.array([None] * n, dtype="boolean")
+            else:
+                codes = col if col is not None else np.full(n, -1, dtype=np.int32)
+                data[name] = pd.Categorical.from_codes(codes, dtype=DICTIONARIES[name].pandas_dtype())
+        return pd.DataFrame(data, copy=False)
+
+    def to_arrow(self, dictionary=True):
+        """
+        Tabla Arrow sobre los mismos buffers numéricos. Con dictionary=False los
+        textos salen como string plano (lo que se escribe a disco, para que las
+        particiones nuevas y viejas tengan el mismo esquema).
+        """
+        import pyarrow as pa
+
+        types = {FLOAT: pa.float64(), INT: pa.int32(), BOOL: pa.bool_(), STR: pa.string()}
+        n = self.n
+        arrays = []
+        for name in SNAPSHOT_COLUMNS:
+            if name in SHARED_FIELDS:
+                v = self.shared.get(name)
+                typ = types[SHARED_FIELDS[name]]
+                arrays.append(pa.nulls(n, typ) if v is None else pa.repeat(pa.scalar(v, typ), n))
+                continue
+            kind, col = STATION_FIELDS[name], self.columns.get(name)
+            if col is None:
+                arrays.append(pa.nulls(n, types[kind]))
+            elif kind == FLOAT:
+                arrays.append(pa.array(col, from_pandas=True))  # NaN -> null
+            elif kind == INT:
+                arrays.append(pa.array(col[0], mask=col[1]))
+            elif kind == BOOL:
+                arrays.append(pa.array(col))
+            else:
+                arr = pa.DictionaryArray.from_arrays(pa.array(col, mask=col < 0), DICTIONARIES[name].arrow_values())
+                arrays.append(arr if dictionary else arr.dictionary_decode())
+        return pa.Table.from_arrays(arrays, names=SNAPSHOT_COLUMNS)
@@ -0,0 +1,93 @@
+# citybike/multi.py
+"""
+Recolección de varias redes en paralelo (citybike.networks).
+
+Cada red corre en su propio hilo, a lo sumo NETWORK_MAX_WORKERS a la vez,
+con su plazo (deadline_seconds), su límite de sondas y consultas OWM
+(max_concurrency), sus cachés y sus rutas de salida, y se guarda apenas
+termina sin esperar a las demás. Un error en una red se loguea y no toca al
+resto. Una red que sigue ocupada con el turno anterior se salta en este
+turno, así una red lenta no apila snapshots ni retrasa a las otras.
+"""
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+
+from citybike import metrics
+from citybike.config import RECORD_MODE, NETWORK_MAX_WORKERS
+from citybike.fetch import reset_fetch_stats, log_fetch_summary
+from citybike.snapshot import collect_snapshot
+
+TURN_GRACE_SECONDS = 60  # clima, enriquecimiento y guardado después de resolver las estaciones
+
+
+class NetworkCollector:
+    def __init__(self, networks, owm_key=None, record_mode=RECORD_MODE, max_workers=NETWORK_MAX_WORKERS):
+        self.networks = list(networks)
+        self.owm_key = owm_key
+        self.record_mode = record_mode
+        self.pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(self.networks))),
+                                       thread_name_prefix="net")
+        self.busy = {}  # id de red -> Future del turno que todavía no terminó
+        self.lock = threading.Lock()
+
+    def _collect_one(self, net):
+        from citybike.pipeline import store_network_snapshot
+
+        t0 = time.monotonic()
+        result = {'network': net['id'], 'rows': 0, 'where': None, 'source': None, 'ts': None,
+                  'snapshot': None, 'error': None}
+        with metrics.trace(net['id']):
+            try:
+                snapshot = collect_snapshot(self.owm_key, net=net, http_summary=False)
+                if snapshot:
+                    result['where'] = store_network_snapshot(snapshot, net, self.record_mode)
+                    result.update(rows=len(snapshot), source=snapshot.source,
+                                  ts=snapshot.shared['scrape_timestamp'], snapshot=snapshot)
+                else:
+                    logging.warning(f"[{net['id']}] Snapshot vacío en esta ejecución.")
+            except Exception as e:
+                logging.error(f"[{net['id']}] Error en snapshot: {e}")
+                result['error'] = type(e).__name__
+                metrics.annotate(error=result['error'])
+        result['seconds'] = round(time.monotonic() - t0, 3)
+        return result
+
+    def collect(self, timeout=None):
+        """
+        Un turno: lanza un snapshot por cada red libre y espera a lo sumo
+        'timeout' s (por defecto el mayor plazo de las redes más
+        TURN_GRACE_SECONDS). Devuelve {id de red: resultado}; las redes
+        saltadas o que no terminaron a tiempo quedan con 'pending': True (estas
+        últimas se guardan igual al terminar, en segundo plano).
+        """
+        if timeout is None:
+            timeout = max(n['deadline_seconds'] for n in self.networks) + TURN_GRACE_SECONDS
+        reset_fetch_stats()
+        results = {}
+        futures = {}
+        with self.lock:
+            for net in self.networks:
+                prev = self.busy.get(net['id'])
+                if prev is not None and not prev.done():
+                    logging.warning(f"[{net['id']}] Sigue ocupada con el turno anterior: se salta este turno.")
+                    results[net['id']] = {'network': net['id'], 'pending': True}
+                    continue
+                fut = self.pool.submit(self._collect_one, net)
+                self.busy[net['id']] = fut
+                futures[fut] = net['id']
+        done, not_done = wait_futures(futures, timeout=timeout)
+        for fut in done:
+            results[futures[fut]] = fut.result()
+        for fut in not_done:
+            logging.warning(f"[{futures[fut]}] No terminó en {timeout:.0f}s; se guardará cuando termine.")
+            results[futures[fut]] = {'network': futures[fut], 'pending': True}
+        log_fetch_summary()
+        ok = sum(1 for r in results.values() if r.get('rows'))
+        logging.info(f"Redes: {ok} de {len(self.networks)} con datos en este turno "
+                     f"({sum(r.get('rows') or 0 for r in results.values())} filas).")
+        return results
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)
@@ -0,0 +1,168 @@
+# citybike/networks.py
+"""
+Redes de bicicletas a recolectar y sus regiones de clima.
+
+Se leen de NETWORKS_FILE (JSON, ver networks.example.json). Sin archivo
+hay una sola red, la de Lima, armada con las constantes de citybike.config,
+así todo sigue igual que antes. Formato (todo salvo 'id' es opcional):
+
+    {
+      "regions": [
+        {"id": "miraflores", "clima_url": "https://www.clima.com/peru/lima/miraflores-4",
+         "clima_header": "Miraflores", "center": [-12.11788, -77.033043], "radius_km": 2.0}
+      ],
+      "networks": [
+        {"id": "lima", "region": "miraflores"},
+        {"id": "santiago", "match": ["santiago"], "country": "CL", "tz": "America/Santiago",
+         "max_concurrency": 4, "deadline_seconds": 60}
+      ]
+    }
+
+Red: 'citybikes_id' (id en api.citybik.es; si falta se busca por 'match'
+en el nombre o la ciudad, filtrando por 'country'), 'gbfs_bases' (sitios
+donde probar GBFS), 'map_url' (página para el fallback Selenium; null lo
+desactiva), 'zones_kml' (KML local o URL de la capa de zonas), 'tz',
+'region', 'max_concurrency' (sondas a la vez), 'owm_concurrency'
+(consultas OWM a la vez; la cuota por segundo es por clave y la comparten
+todas las redes) y 'deadline_seconds' (plazo de su snapshot).
+
+Región: 'clima_url' (página de Clima.com; sin ella el clima sale solo de
+OWM), 'clima_header' (encabezado de la región en esa página; por defecto
+el 'id' capitalizado), 'center' y 'radius_km' (qué estaciones caen dentro: columnas
+in_miraflores / clima_miraflores / temp_miraflores, que conservan su
+nombre por compatibilidad del esquema).
+
+Cada red tiene sus propias rutas (paths()): la red por defecto conserva
+las de siempre y las demás guardan todo en NETWORKS_DATA_ROOT/<id>/ y su
+caché en data/.cache/networks/<id>/, así ninguna pisa el estado de otra.
+"""
+import os
+import re
+import json
+
+from citybike.config import (
+    NETWORKS_FILE, DEFAULT_NETWORK, NETWORKS_DATA_ROOT, CACHE_DIR, STORE_ROOT, DISCOVERY_CACHE, STATION_ZONES_CACHE,
+    AGGREGATES_FILE, DELTA_ROOT, DAILY_ROOT, CONSOLIDATED_CSV, SEEN_ROOT, WEATHER_CACHE, CITYBIKE_URL,
+    GBFS_BASE_CANDIDATES, CLIMA_MIRAFLORES_URL, CLIMA_MIRAFLORES_HEADER, MIRAFLORES_CENTER, MIRAFLORES_RADIUS_KM,
+    SOURCE_DEADLINE_SECONDS, MAX_PROBE_WORKERS, OWM_MAX_WORKERS,
+)
+
+NETWORK_ID_RE = re.compile(r"^[a-z0-9][a-z0-9_-]*$")
+DEFAULT_MATCH = ["lima", "citybike"]
+DEFAULT_TZ = "America/Lima"
+
+
+# ---------- DEFINICIONES ----------
+def default_region():
+    return {'id': "miraflores", 'clima_url': CLIMA_MIRAFLORES_URL, 'clima_header': CLIMA_MIRAFLORES_HEADER,
+            'center': list(MIRAFLORES_CENTER), 'radius_km': MIRAFLORES_RADIUS_KM}
+
+def default_network():
+    """La red de Lima tal como la describe citybike.config."""
+    return _complete({'id': DEFAULT_NETWORK, 'match': DEFAULT_MATCH, 'gbfs_bases': GBFS_BASE_CANDIDATES,
+                      'map_url': CITYBIKE_URL}, default_region())
+
+def _complete(net, region):
+    is_default = net['id'] == DEFAULT_NETWORK
+    return {
+        'id': net['id'],
+        'name': net.get('name') or net['id'],
+        'citybikes_id': net.get('citybikes_id'),
+        'match': [m.lower() for m in net.get('match') or ([] if net.get('citybikes_id') else [net['id']])],
+        'country': net.get('country'),
+        'gbfs_bases': list(net.get('gbfs_bases') or []),
+        'map_url': net.get('map_url'),
+        'zones_kml': net.get('zones_kml'),
+        'tz': net.get('tz') or DEFAULT_TZ,
+        'region': region,
+        'max_concurrency': int(net.get('max_concurrency') or MAX_PROBE_WORKERS),
+        'owm_concurrency': int(net.get('owm_concurrency') or OWM_MAX_WORKERS),
+        'deadline_seconds': float(net.get('deadline_seconds') or SOURCE_DEADLINE_SECONDS),
+        'default': is_default,
+    }
+
+def _region(raw):
+    if not raw.get('id'):
+        raise ValueError("Región sin 'id' en la configuración de redes")
+    center = raw.get('center')
+    return {
+        'id': raw['id'],
+        'clima_url': raw.get('clima_url'),
+        'clima_header': raw.get('clima_header') or raw['id'].replace("-", " ").title(),
+        'center': [float(center[0]), float(center[1])] if center else None,
+        'radius_km': float(raw.get('radius_km') or 0.0),
+    }
+
+def parse_networks(config):
+    """Valida el dict de configuración y devuelve las redes completas (con su región resuelta)."""
+    regions = {r['id']: r for r in (_region(raw) for raw in config.get('regions') or [])}
+    regions.setdefault(default_region()['id'], default_region())
+    out = []
+    seen = set()
+    for raw in config.get('networks') or []:
+        nid = raw.get('id')
+        if not nid or not NETWORK_ID_RE.match(nid):
+            raise ValueError(f"Id de red inválido: {nid!r} (minúsculas, dígitos, '-' y '_')")
+        if nid in seen:
+            raise ValueError(f"Red repetida: {nid}")
+        seen.add(nid)
+        rid = raw.get('region')
+        if rid is not None and rid not in regions:
+            raise ValueError(f"La red {nid} usa una región desconocida: {rid}")
+        if nid == DEFAULT_NETWORK:
+            # la red por defecto parte de la config de siempre; el archivo solo la ajusta
+            raw = {**default_network(), **raw}
+        region = regions[rid] if rid is not None else (default_region() if nid == DEFAULT_NETWORK else None)
+        out.append(_complete(raw, region))
+    return out
+
+def load_networks(path=NETWORKS_FILE):
+    """Redes de 'path' o, si no existe, solo la red por defecto."""
+    if not os.path.exists(path):
+        return [default_network()]
+    with open(path, encoding="utf-8") as f:
+        networks = parse_networks(json.load(f))
+    if not networks:
+        raise ValueError(f"{path} no define ninguna red")
+    return networks
+
+def select(networks, ids=None):
+    """Filtra por ids ('a,b' o lista); None o 'all' = todas."""
+    if ids is None or ids == "all":
+        return networks
+    if isinstance(ids, str):
+        ids = [i.strip() for i in ids.split(",") if i.strip()]
+    known = {n['id']: n for n in networks}
+    missing = [i for i in ids if i not in known]
+    if missing:
+        raise ValueError(f"Redes desconocidas: {', '.join(missing)} (configuradas: {', '.join(known)})")
+    return [known[i] for i in ids]
+
+def get_network(network_id=None, path=NETWORKS_FILE):
+    """Una red por id (None = la por defecto, aunque no haya archivo)."""
+    if network_id is None or network_id == DEFAULT_NETWORK:
+        found = [n for n in load_networks(path) if n['id'] == DEFAULT_NETWORK]
+        return found[0] if found else default_network()
+    return select(load_networks(path), [network_id])[0]
+
+
+# ---------- RUTAS ----------
+def paths(net):
+    """Dónde guarda cada red sus datos y su caché."""
+    if net['default']:
+        return {'store': STORE_ROOT, 'delta': DELTA_ROOT, 'daily': DAILY_ROOT, 'aggregates': AGGREGATES_FILE,
+                'consolidated': CONSOLIDATED_CSV, 'discovery': DISCOVERY_CACHE, 'station_zones': STATION_ZONES_CACHE,
+                'seen': SEEN_ROOT, 'weather': WEATHER_CACHE}
+    data = os.path.join(NETWORKS_DATA_ROOT, net['id'])
+    cache = os.path.join(CACHE_DIR, "networks", net['id'])
+    return {
+        'store': os.path.join(data, "snapshots"),
+        'delta': os.path.join(data, "delta"),
+        'daily': os.path.join(data, "daily"),
+        'aggregates': os.path.join(data, "aggregates.json"),
+        'consolidated': os.path.join(data, f"citybike_{net['id']}_consolidated.csv"),
+        'discovery': os.path.join(cache, "discovery.json"),
+        'station_zones': os.path.join(cache, "station_zones.json"),
+        'seen': os.path.join(cache, "seen"),
+        'weather': os.path.join(cache, "weather.json"),
+    }
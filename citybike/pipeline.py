@@ -0,0 +1,102 @@
+# citybike/pipeline.py
+"""
+Qué se hace con cada snapshot recolectado: almacén, delta o diario +
+agregados incrementales. Antes de grabar se quitan las claves (franja de
+recolección, station_id) ya grabadas (citybike.quality), así un reintento
+del workflow o una corrida repetida en la misma franja no duplican filas.
+"""
+import os
+import logging
+from functools import partial
+import pandas as pd
+
+from citybike import storage, analytics, delta, daily, metrics, quality
+from citybike.config import (
+    RECORD_MODE, RECORD_MODES, DELTA_ROOT, DAILY_ROOT, AGGREGATES_FILE, SEEN_ROOT, INTERVAL_SECONDS,
+)
+from citybike.model import Snapshot
+
+# Historial en el que queda cada modo de grabación (export.iter_rows(source=...))
+HISTORY_SOURCE = {"full": "store", "both": "store", "delta": "delta", "daily": "daily"}
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return 0
+
+def _stored_keys(day, mode, root, delta_root, daily_root):
+    """(scrape_timestamp, station_id) de la partición de 'day' en la salida de 'mode' (para rearmar el índice)."""
+    from citybike import export
+
+    source = HISTORY_SOURCE[mode]
+    src_root = {"store": root, "delta": delta_root, "daily": daily_root}[source]
+    return export.iter_rows(day, day, columns=['scrape_timestamp', 'station_id'], root=src_root, source=source)
+
+def store_snapshot(rows, root=storage.STORE_ROOT, mode=RECORD_MODE, delta_root=DELTA_ROOT, daily_root=DAILY_ROOT,
+                   aggregates_file=AGGREGATES_FILE, seen_root=SEEN_ROOT):
+    """
+    Graba el snapshot (citybike.model.Snapshot o lista de filas) según 'mode':
+    "full" como partición nueva del almacén, "delta" solo los cambios
+    (citybike.delta), "both" ambos o "daily" en el .csv.gz del día
+    (citybike.daily). Siempre actualiza los agregados ('aggregates_file').
+    Devuelve dónde quedó: la ruta de la partición o del archivo del día
+    (None en modo "delta" o si ya estaba todo grabado). Las estaciones
+    que ya tienen fila en la misma franja de INTERVAL_SECONDS según el
+    índice de 'seen_root'/<mode> no se vuelven a grabar.
+    Cada escritura es una etapa 'store.*' de la traza en curso
+    (citybike.metrics), con los bytes escritos.
+    """
+    if not rows:
+        return None
+    if mode not in RECORD_MODES:
+        raise ValueError(f"Modo de grabación desconocido: {mode}")
+    with metrics.stage("store.dedup", rows=len(rows)) as rec:
+        # un índice por salida: que un snapshot esté en el almacén no dice nada del diario
+        index = quality.SeenIndex(os.path.join(seen_root, mode), interval=INTERVAL_SECONDS,
+                                  rebuild=partial(_stored_keys, mode=mode, root=root,
+                                                  delta_root=delta_root, daily_root=daily_root))
+        fresh, dropped = quality.drop_seen(rows, index)
+        rec['dropped'] = dropped
+    if fresh is None:
+        index.save()  # conserva el índice si se acaba de rearmar desde la partición
+        logging.warning(f"Snapshot ya grabado ({dropped} filas repetidas): se omite.")
+        return None
+    if dropped:
+        logging.warning(f"Se omiten {dropped} filas repetidas del snapshot.")
+    rows = fresh
+    index.begin(rows.shared['scrape_timestamp'])
+    where = None
+    if mode in ("full", "both"):
+        with metrics.stage("store.full", rows=len(rows)) as rec:
+            # el Snapshot se escribe directo desde sus columnas (Arrow), sin pasar por filas
+            part = storage.append_snapshot(rows if isinstance(rows, Snapshot) else pd.DataFrame(rows), root)
+            where = f"{root}/{part}"
+            rec['bytes'] = _size(where)
+    if mode in ("delta", "both"):
+        with metrics.stage("store.delta", rows=len(rows)):
+            delta.record(rows, delta_root)
+    if mode == "daily":
+        with metrics.stage("store.daily", rows=len(rows)) as rec:
+            where = daily.append(rows, daily_root)
+            rec['bytes'] = _size(where)
+
+    # Agregados de uso: O(estaciones) por snapshot
+    with metrics.stage("store.aggregates") as rec:
+        state = analytics.load_state(aggregates_file)
+        if analytics.update(state, rows):
+            analytics.note_source(state, HISTORY_SOURCE[mode])
+            analytics.save_state(state, aggregates_file)
+        rec['bytes'] = _size(aggregates_file)
+    quality.mark_stored(rows, index)
+    logging.info(f"Snapshot guardado: {len(rows)} filas"
+                 + (f" en {where}" if where else "") + (f" (delta en {delta_root})" if mode in ("delta", "both") else ""))
+    return where
+
+def store_network_snapshot(rows, net, mode=RECORD_MODE):
+    """store_snapshot() en las rutas de la red 'net' (citybike.networks.paths)."""
+    from citybike.networks import paths
+
+    p = paths(net)
+    return store_snapshot(rows, p['store'], mode, p['delta'], p['daily'], p['aggregates'], p['seen'])
@@ -0,0 +1,376 @@
+# citybike/quality.py
+"""
+Calidad de datos: normalización de fuentes, validación de tipos y
+deduplicación en streaming.
+
+- normalize_stations(): las estaciones de CityBikes, GBFS, el feed XHR y
+  Selenium llegan con nombres y tipos distintos (ids numéricos o de texto,
+  'latitude' o 'lat', 'num_bikes_available' en GBFS...). Se llevan a un solo
+  esquema: id como texto, coordenadas float dentro de rango, conteos int
+  >= 0 o None (GBFS station_information no trae bicis: quedan None, no 0;
+  si hay capacidad y espacios libres se derivan). Sin id o sin coordenadas
+  válidas la estación se descarta; un id repetido se queda con la primera.
+- check_row(): una fila de snapshot con los tipos de citybike.model
+  (valores inválidos -> None); sin scrape_timestamp ISO o sin station_id
+  la fila no vale.
+- SeenIndex: claves (scrape_timestamp, station_id) ya vistas, una
+  partición por día: un set de hashes de 64 bits en memoria y un array
+  ordenado de 8 bytes por clave en disco. Con 'interval' el timestamp se
+  lleva a su franja de recolección (slot_of(): un reintento del workflow
+  minutos después cae en la misma franja y se reconoce como repetido).
+  Solo se cargan los días que se tocan (a lo sumo SEEN_DAYS_IN_MEMORY a la
+  vez); si falta el archivo de un día, o quedó marcado como en escritura
+  (begin()) por un proceso que murió antes de save(), se rearma leyendo
+  solo la partición de ese día. Con hashes exactos
+  (no un filtro de Bloom) nunca se descarta una fila nueva por un falso
+  positivo; una colisión de 64 bits entre las ~10^5 claves de un día es
+  despreciable.
+- clean_rows(): valida y deduplica un flujo de filas en una pasada (lo
+  usan el export y el consolidado); drop_seen() quita de un snapshot lo ya
+  grabado antes de guardarlo (reintentos del workflow, corridas repetidas).
+"""
+import os
+import math
+import hashlib
+import logging
+from array import array
+from collections import Counter, OrderedDict
+from datetime import datetime
+
+from citybike.config import SEEN_ROOT, SEEN_DAYS_IN_MEMORY
+from citybike.model import SHARED_FIELDS, STATION_FIELDS, FLOAT, INT, BOOL, STR, Snapshot
+
+KINDS = {**SHARED_FIELDS, **STATION_FIELDS}
+
+# Nombres que usa cada fuente para el mismo campo (CityBikes, GBFS, feeds del mapa)
+STATION_ALIASES = {
+    'id': ('id', 'station_id', 'uid'),
+    'name': ('name', 'station_name'),
+    'lat': ('lat', 'latitude'),
+    'lon': ('lon', 'lng', 'longitude'),
+    'capacity': ('capacity', 'slots', 'total_slots'),
+    'free_bikes': ('free_bikes', 'num_bikes_available', 'bikes_available', 'bikes'),
+    'empty_slots': ('empty_slots', 'num_docks_available', 'docks_available', 'free_slots'),
+    'timestamp': ('timestamp', 'last_reported', 'last_updated'),
+}
+
+
+# ---------- TIPOS ----------
+def _float(v):
+    if v is None or isinstance(v, bool):
+        return None
+    try:
+        x = float(v)
+    except (TypeError, ValueError):
+        return None
+    return x if math.isfinite(x) else None
+
+def _count(v):
+    """Conteo: int >= 0 o None (acepta '12', 12.0; rechaza 12.5 y negativos)."""
+    x = _float(v)
+    if x is None or x < 0 or x != int(x):
+        return None
+    return int(x)
+
+def _bool(v):
+    if isinstance(v, bool) or v is None:
+        return v
+    if isinstance(v, str):
+        s = v.strip().lower()
+        if s in ("true", "1", "t", "yes"):
+            return True
+        if s in ("false", "0", "f", "no"):
+            return False
+        return None
+    x = _float(v)
+    return None if x is None else bool(x)
+
+def _text(v):
+    if v is None:
+        return None
+    s = str(v).strip()
+    return s or None
+
+def normalize_id(v):
+    """Id de estación como texto: 12, 12.0 y ' 12 ' -> '12'."""
+    if isinstance(v, bool):
+        return None
+    if isinstance(v, float):
+        if not math.isfinite(v):
+            return None
+        if v == int(v):
+            v = int(v)
+    return _text(v)
+
+def _lat_lon(lat, lon):
+    lat, lon = _float(lat), _float(lon)
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180) or (lat == 0 and lon == 0):
+        return None, None
+    return lat, lon
+
+def coerce(kind, v):
+    """Un valor con el tipo de citybike.model ('float', 'int', 'bool', 'str'); inválido -> None."""
+    if kind == FLOAT:
+        return _float(v)
+    if kind == INT:
+        return _count(v)
+    if kind == BOOL:
+        return _bool(v)
+    return _text(v)
+
+
+# ---------- ESTACIONES DE LAS FUENTES ----------
+def _pick(s, field):
+    for name in STATION_ALIASES[field]:
+        v = s.get(name)
+        if v is not None:
+            return v
+    if field == 'capacity':
+        return (s.get('extra') or {}).get('slots')
+    return None
+
+def normalize_station(s):
+    """Una estación de cualquier fuente en el esquema común, o None si no sirve (sin id o coordenadas)."""
+    sid = normalize_id(_pick(s, 'id'))
+    lat, lon = _lat_lon(_pick(s, 'lat'), _pick(s, 'lon'))
+    if sid is None or lat is None:
+        return None
+    capacity, free, empty = _count(_pick(s, 'capacity')), _count(_pick(s, 'free_bikes')), _count(_pick(s, 'empty_slots'))
+    if capacity is not None:
+        if free is None and empty is not None and empty <= capacity:
+            free = capacity - empty
+        elif empty is None and free is not None and free <= capacity:
+            empty = capacity - free
+    return {'id': sid, 'name': _text(_pick(s, 'name')), 'lat': lat, 'lon': lon, 'capacity': capacity,
+            'free_bikes': free, 'empty_slots': empty, 'timestamp': _text(_pick(s, 'timestamp'))}
+
+def normalize_stations(stations):
+    """
+    (estaciones normalizadas, reporte). El reporte cuenta 'in', 'out',
+    'sin_id_o_coords', 'id_repetido', 'sin_bicis' (free_bikes nulo) e
+    'inconsistente' (más bicis que capacidad; se conserva igual).
+    """
+    report = Counter({'in': len(stations)})
+    out = []
+    seen = set()
+    for s in stations:
+        norm = normalize_station(s) if isinstance(s, dict) else None
+        if norm is None:
+            report['sin_id_o_coords'] += 1
+            continue
+        if norm['id'] in seen:
+            report['id_repetido'] += 1
+            continue
+        seen.add(norm['id'])
+        if norm['free_bikes'] is None:
+            report['sin_bicis'] += 1
+        elif norm['capacity'] is not None and norm['free_bikes'] > norm['capacity']:
+            report['inconsistente'] += 1
+        out.append(norm)
+    report['out'] = len(out)
+    return out, dict(report)
+
+
+# ---------- FILAS DE SNAPSHOT ----------
+def parse_ts(v):
+    """scrape_timestamp ISO 8601 como texto, o None si no se puede leer."""
+    s = _text(v)
+    if s is None:
+        return None
+    try:
+        datetime.fromisoformat(s)
+    except ValueError:
+        return None
+    return s
+
+def check_row(row, columns, report=None):
+    """
+    Tupla 'row' (en el orden de 'columns') con cada valor en su tipo. None si
+    la fila no vale (sin timestamp o station_id válidos). Los valores
+    inválidos que se anulan se cuentan en report['anulados'].
+    """
+    out = []
+    for name, v in zip(columns, row):
+        if name == 'scrape_timestamp':
+            c = parse_ts(v)
+            if c is None:
+                return None
+        elif name == 'station_id':
+            c = normalize_id(v)
+            if c is None:
+                return None
+        elif name in ('lat', 'lon'):
+            c = _float(v)
+            if c is not None and not (-90 <= c <= 90 if name == 'lat' else -180 <= c <= 180):
+                c = None
+        else:
+            c = coerce(KINDS.get(name, STR), v)
+        if c is None and v is not None and v != "" and not (isinstance(v, float) and math.isnan(v)):
+            if report is not None:
+                report['anulados'] += 1
+        out.append(c)
+    return tuple(out)
+
+
+# ---------- ÍNDICE DE CLAVES VISTAS ----------
+def key_hash(ts, station_id):
+    raw = f"{ts}|{station_id}".encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "little")
+
+def slot_of(ts, interval):
+    """Inicio de la franja de 'interval' segundos (contada desde la medianoche local) que contiene 'ts'."""
+    dt = datetime.fromisoformat(ts)
+    secs = dt.hour * 3600 + dt.minute * 60 + dt.second
+    secs -= secs % interval
+    return f"{ts[:10]}T{secs // 3600:02d}:{secs // 60 % 60:02d}:{secs % 60:02d}"
+
+class SeenIndex:
+    """
+    Claves (scrape_timestamp, station_id) vistas, por día. Con 'root' cada
+    día se guarda en root/YYYY-MM-DD.bin (save()); sin 'root' vive solo en
+    memoria. 'rebuild(día)' da las claves (ts, station_id) de la partición de
+    ese día cuando no hay archivo o no es confiable. Con 'interval' (s) la
+    clave usa la franja del timestamp en vez del timestamp exacto.
+    """
+
+    def __init__(self, root=SEEN_ROOT, rebuild=None, max_days=SEEN_DAYS_IN_MEMORY, interval=None):
+        self.root = root
+        self.rebuild = rebuild
+        self.max_days = max_days
+        self.interval = interval
+        self.days = OrderedDict()  # día -> set de hashes
+        self.dirty = set()
+
+    def _path(self, day):
+        return os.path.join(self.root, f"{day}.bin")
+
+    def _pending_path(self, day):
+        return os.path.join(self.root, f"{day}.pending")
+
+    def _key(self, ts, station_id):
+        return key_hash(slot_of(ts, self.interval) if self.interval else ts, station_id)
+
+    def _day(self, day):
+        keys = self.days.get(day)
+        if keys is not None:
+            self.days.move_to_end(day)
+            return keys
+        keys = set()
+        path = self._path(day) if self.root else None
+        # una escritura sin save() posterior: el archivo puede no tener las últimas claves
+        torn = path is not None and self.rebuild is not None and os.path.exists(self._pending_path(day))
+        if path and os.path.exists(path) and not torn:
+            a = array("Q")
+            with open(path, "rb") as f:
+                a.frombytes(f.read())
+            keys.update(a)
+        elif self.rebuild is not None:
+            keys.update(self._key(ts, normalize_id(sid)) for ts, sid in self.rebuild(day) if normalize_id(sid))
+            if keys and self.root:
+                logging.info(f"Índice de duplicados del {day} rearmado desde su partición ({len(keys)} claves)")
+                self.dirty.add(day)
+        self.days[day] = keys
+        while len(self.days) > self.max_days:
+            old, old_keys = self.days.popitem(last=False)
+            if old in self.dirty:
+                self._save_day(old, old_keys)
+        return keys
+
+    def seen(self, ts, station_id):
+        return self._key(ts, station_id) in self._day(ts[:10])
+
+    def add(self, ts, station_id):
+        """Marca la clave; True si era nueva."""
+        keys = self._day(ts[:10])
+        h = self._key(ts, station_id)
+        if h in keys:
+            return False
+        keys.add(h)
+        self.dirty.add(ts[:10])
+        return True
+
+    def _save_day(self, day, keys):
+        self.dirty.discard(day)
+        if not self.root:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(day)
+        with open(path + ".tmp", "wb") as f:
+            f.write(array("Q", sorted(keys)).tobytes())
+        os.replace(path + ".tmp", path)
+        try:
+            os.remove(self._pending_path(day))
+        except FileNotFoundError:
+            pass
+
+    def begin(self, ts):
+        """
+        Marca el día de 'ts' como en escritura hasta el próximo save(): si el
+        proceso muere entre grabar y marcar las claves, la próxima carga de
+        ese día se rearma desde la partición en vez de usar un índice viejo.
+        """
+        if not self.root:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        open(self._pending_path(ts[:10]), "w").close()
+
+    def save(self):
+        for day in list(self.dirty):
+            if day in self.days:
+                self._save_day(day, self.days[day])
+
+
+# ---------- ETAPAS ----------
+def clean_rows(rows, columns, index=None, report=None):
+    """
+    Valida (check_row) y deduplica por (scrape_timestamp, station_id) un flujo
+    de tuplas en el orden de 'columns', sin materializarlo. 'index' es un
+    SeenIndex (por defecto uno en memoria: con las filas en orden de fecha
+    solo guarda los últimos días). 'report' (Counter) cuenta 'filas',
+    'invalidas', 'duplicadas' y 'anulados'.
+    """
+    report = report if report is not None else Counter()
+    index = index if index is not None else SeenIndex(root=None)
+    ts_i = columns.index('scrape_timestamp') if 'scrape_timestamp' in columns else None
+    sid_i = columns.index('station_id') if 'station_id' in columns else None
+    for row in rows:
+        report['filas'] += 1
+        clean = check_row(row, columns, report)
+        if clean is None:
+            report['invalidas'] += 1
+            continue
+        if ts_i is not None and sid_i is not None and not index.add(clean[ts_i], clean[sid_i]):
+            report['duplicadas'] += 1
+            continue
+        yield clean
+
+def drop_seen(snapshot, index):
+    """
+    (snapshot sin las estaciones ya grabadas, cuántas se quitaron). Devuelve
+    (None, n) si todo el snapshot ya estaba. Las claves se marcan con
+    mark_stored() después de guardar, así un guardado fallido se reintenta;
+    antes de grabar va index.begin() para que un corte entre ambos pasos no
+    deje el índice atrasado.
+    """
+    snap = snapshot if isinstance(snapshot, Snapshot) else Snapshot.from_rows(snapshot)
+    ts = parse_ts(snap.shared.get('scrape_timestamp'))
+    if ts is None:
+        raise ValueError(f"Snapshot con scrape_timestamp inválido: {snap.shared.get('scrape_timestamp')!r}")
+    keep = []
+    seen = set()
+    for i, sid in enumerate(snap.values('station_id')):
+        sid = normalize_id(sid)
+        if sid is None or sid in seen or index.seen(ts, sid):
+            continue
+        seen.add(sid)
+        keep.append(i)
+    dropped = len(snap) - len(keep)
+    if not keep:
+        return None, dropped
+    return (snap if not dropped else snap.take(keep)), dropped
+
+def mark_stored(snapshot, index):
+    ts = snapshot.shared['scrape_timestamp']
+    for sid in snapshot.values('station_id'):
+        index.add(ts, normalize_id(sid))
+    index.save()
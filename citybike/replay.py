@@ -0,0 +1,124 @@
+# citybike/replay.py
+"""
+Grabación y reproducción de las respuestas HTTP de todos los fetchers.
+
+Todo lo que pasa por citybike.fetch.fetch() (CityBikes, GBFS, feed XHR,
+Clima.com, OWM, KML de My Maps) puede:
+
+- "record": pedirse en vivo y guardarse en un cassette (directorio con
+  ``index.jsonl``, una línea por respuesta grabada, + un ``.body`` por
+  respuesta; si una URL se graba dos veces vale la última línea);
+- "replay": servirse del cassette sin tocar la red (lo que no esté
+  grabado falla como un error de conexión);
+- "standin": pedirse a un servidor local que hace de todos los hosts:
+  ``https://api.citybik.es/v2/networks`` se pide como
+  ``<base>/api.citybik.es/v2/networks`` (ver bench/standin.py, que
+  también sirve cassettes con latencia y fallos inyectados).
+
+Se activa con use() o con las variables de entorno CITYBIKE_HTTP_MODE
+(live/record/replay/standin) y CITYBIKE_CASSETTE (directorio del cassette o
+URL base del stand-in). Las claves de API (parámetro 'appid') no forman
+parte de la clave ni se guardan. El fallback Selenium usa un navegador, no
+fetch(), y queda fuera.
+"""
+import os
+import json
+import hashlib
+import threading
+from urllib.parse import urlsplit
+
+MODES = ("live", "record", "replay", "standin")
+SECRET_PARAMS = {"appid"}
+INDEX_NAME = "index.jsonl"
+
+_state = {'mode': None, 'target': None, 'cassette': None, 'upstream': None}
+_lock = threading.Lock()
+
+
+def use(mode="live", target=None, upstream=None):
+    """
+    Activa un modo: 'target' es el directorio del cassette o la URL base del
+    stand-in. En modo "record", 'upstream' (URL base de un stand-in) graba
+    las respuestas del stand-in en vez de las de la red.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Modo HTTP desconocido: {mode} (válidos: {', '.join(MODES)})")
+    if mode != "live" and not target:
+        raise ValueError(f"El modo {mode} necesita un cassette o una URL base")
+    with _lock:
+        _state['mode'] = mode
+        _state['target'] = target.rstrip("/") if mode == "standin" else target
+        _state['cassette'] = Cassette(target) if mode in ("record", "replay") else None
+        _state['upstream'] = upstream.rstrip("/") if mode == "record" and upstream else None
+
+def mode():
+    """Modo activo (la primera vez se toma del entorno)."""
+    if _state['mode'] is None:
+        use(os.getenv("CITYBIKE_HTTP_MODE") or "live", os.getenv("CITYBIKE_CASSETTE"))
+    return _state['mode']
+
+def cassette():
+    return _state['cassette'] if mode() in ("record", "replay") else None
+
+def routed():
+    """True si las peticiones van a un stand-in y no a su host."""
+    return mode() == "standin" or _state['upstream'] is not None
+
+def route(url):
+    """URL a pedir de verdad: la misma, o su equivalente en el stand-in."""
+    if not routed():
+        return url
+    base = _state['upstream'] or _state['target']
+    parts = urlsplit(url)
+    return f"{base}/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+
+
+# ---------- CASSETTE ----------
+def entry_key(url, params=None):
+    clean = {k: v for k, v in (params or {}).items() if k not in SECRET_PARAMS}
+    raw = url + "?" + json.dumps(clean, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+class Cassette:
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+        self.index = {}
+        self.torn = False  # última línea del índice sin '\n' (se cierra antes del próximo put)
+        path = os.path.join(root, INDEX_NAME)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    self.torn = not line.endswith("\n")
+                    try:
+                        meta = json.loads(line)
+                    except ValueError:
+                        continue  # línea cortada por un corte a mitad de escritura
+                    self.index[meta.pop('key')] = meta
+
+    def get(self, url, params=None):
+        """(status, content_type, body) grabado o None."""
+        meta = self.index.get(entry_key(url, params))
+        if meta is None:
+            return None
+        with open(os.path.join(self.root, meta['body']), "rb") as f:
+            return meta['status'], meta.get('content_type'), f.read()
+
+    def put(self, url, params, status, content_type, body):
+        key = entry_key(url, params)
+        clean = {k: v for k, v in (params or {}).items() if k not in SECRET_PARAMS}
+        with self.lock:
+            os.makedirs(self.root, exist_ok=True)
+            with open(os.path.join(self.root, key + ".body"), "wb") as f:
+                f.write(body)
+            meta = self.index[key] = {'url': url, 'params': clean or None, 'status': status,
+                                      'content_type': content_type, 'body': key + ".body"}
+            with open(os.path.join(self.root, INDEX_NAME), "a", encoding="utf-8") as f:
+                f.write(("\n" if self.torn else "") + json.dumps({'key': key, **meta}, sort_keys=True) + "\n")
+            self.torn = False
+
+    def entries(self):
+        """(url, params, status, content_type, ruta del cuerpo) de cada respuesta grabada."""
+        for meta in self.index.values():
+            yield meta['url'], meta.get('params'), meta['status'], meta.get('content_type'), \
+                os.path.join(self.root, meta['body'])
@@ -0,0 +1,19 @@
+# citybike/runner.py
+from citybike.config import OUTPUT_EXCEL, OUTPUT_CSV, INTERVAL_SECONDS, TOTAL_RUN_SECONDS, RECORD_MODE
+from citybike.daemon import Daemon
+
+
+def run_collector(owm_key=None, out_excel=OUTPUT_EXCEL, out_csv=OUTPUT_CSV,
+                  interval_seconds=INTERVAL_SECONDS, total_seconds=TOTAL_RUN_SECONDS,
+                  export_every_seconds=None, record_mode=RECORD_MODE, networks=None):
+    """
+    Recolección de varios días (interfaz original de prueba_5): un snapshot
+    inmediato y luego en cada borde de reloj del intervalo, vía el daemon.
+    El CSV/Excel de la corrida se exporta al terminar (y cada
+    'export_every_seconds' si se indica). Con 'networks' (citybike.networks)
+    recolecta esas redes en paralelo, cada una con su export.
+    """
+    Daemon(owm_key=owm_key, interval_seconds=interval_seconds, total_seconds=total_seconds,
+           run_now=True, export_every_seconds=export_every_seconds,
+           out_csv=out_csv, out_excel=out_excel, export_at_exit=True, record_mode=record_mode,
+           networks=networks).run()
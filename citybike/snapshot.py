@@ -0,0 +1,123 @@
+# citybike/snapshot.py
+import logging
+from functools import partial
+from dateutil import tz
+
+from citybike import metrics, quality
+from citybike.utils import now_ts, periodo_del_dia
+from citybike.fetch import reset_fetch_stats, log_fetch_summary
+from citybike.stations import resolve_stations
+from citybike.weather import weather_for_stations, scrape_clima_miraflores
+from citybike.enrich import enrich_stations, load_zone_layer
+from citybike.networks import default_network, paths
+from citybike.model import SNAPSHOT_COLUMNS, STATION_FIELDS, Snapshot  # noqa: F401 (SNAPSHOT_COLUMNS se re-exporta)
+
+
+# ---------- PRINCIPAL ----------
+def _zone_loader(net):
+    if net['zones_kml']:
+        return partial(load_zone_layer, net['zones_kml'])
+    # la capa de My Maps es de Lima: las demás redes sin capa propia quedan sin zona
+    return load_zone_layer if net['default'] else list
+
+def collect_snapshot(owm_key=None, net=None, http_summary=True):
+    """
+    Obtiene estaciones de la primera fuente sana (CityBikes API y GBFS en sitio
+    en paralelo, Selenium como último recurso; ver resolve_stations) y las
+    normaliza a un solo esquema (citybike.quality).
+    Extrae clima de Clima.com (Miraflores) y lo asigna a estaciones dentro de Miraflores.
+    Con 'net' (citybike.networks) se recolecta esa red con su región de
+    clima, su zona horaria y sus cachés; por defecto, Lima.
+    'http_summary' reinicia y loguea las estadísticas HTTP del proceso (el
+    recolector de varias redes lo hace una vez para todas).
+    Cada paso es una etapa de la traza en curso (citybike.metrics), si la hay.
+    Devuelve un citybike.model.Snapshot (iterable como lista de filas) o [] si
+    no hubo estaciones.
+    """
+    net = net or default_network()
+    region = net['region'] or {'clima_url': None, 'clima_header': None, 'center': None, 'radius_km': 0.0}
+    label = "" if net['default'] else f"[{net['id']}] "
+    if http_summary:
+        reset_fetch_stats()
+    metrics.annotate(network=net['id'])
+    source, stations = resolve_stations(net=net)
+    if stations:
+        # un solo esquema y tipos para todas las fuentes (ids como texto, conteos int o None)
+        with metrics.stage("validate", source=source) as rec:
+            stations, report = quality.normalize_stations(stations)
+            rec.update(report)
+        if report['out'] < report['in']:
+            logging.warning(f"{label}Validación: {report['out']} de {report['in']} estaciones válidas ({report})")
+    metrics.annotate(source=source, stations=len(stations) if stations else 0)
+    if not stations:
+        metrics.annotate(error="NoStations")
+        logging.error(f"{label}No se pudo obtener lista de estaciones por ninguna vía.")
+        if http_summary:
+            log_fetch_summary()
+        return []
+    logging.info(f"{label}Usando estaciones de {source} ({len(stations)} estaciones)")
+
+    ts = now_ts(tz.gettz(net['tz']))
+    # extraer clima de la región (Miraflores para Lima; una única llamada por snapshot)
+    clima_miraf = None  # {'temp_C': float, 'clima': str}
+    if region['clima_url']:
+        with metrics.stage("clima") as rec:
+            clima_miraf = scrape_clima_miraflores(region['clima_url'], region['clima_header'])
+            rec['ok'] = bool(clima_miraf)
+    if clima_miraf:
+        logging.info(f"{label}Clima.com: temp={clima_miraf.get('temp_C')}°C, desc='{clima_miraf.get('clima')}'")
+    else:
+        logging.info(f"{label}No se obtuvo clima desde Clima.com (fallback a OWM por estación si se proporcionó o None)")
+
+    # fallback: clima por coordenadas (OpenWeatherMap) si no hay clima_miraf; una consulta por celda
+    if clima_miraf or not owm_key:
+        weathers = [None] * len(stations)
+    else:
+        with metrics.stage("owm", stations=len(stations)):
+            weathers = weather_for_stations(stations, owm_key, max_workers=net['owm_concurrency'],
+                                            cache_path=paths(net)['weather'])
+
+    # zona / densidad / in_miraflores: vectorizado y cacheado por station_id
+    with metrics.stage("enrich", stations=len(stations)):
+        geo = enrich_stations(stations, cache_path=paths(net)['station_zones'], load_layer=_zone_loader(net),
+                              center=region['center'], radius_km=region['radius_km'])
+
+    # Lo común a todas las estaciones se guarda una vez; lo demás, por columnas
+    shared = {
+        'scrape_timestamp': ts.isoformat(),
+        'day_of_week': ts.strftime("%A"),
+        'periodo_dia': periodo_del_dia(ts),
+        # Clima específico extraído de Clima.com (si disponible) para Miraflores
+        'clima_miraflores': (clima_miraf.get('clima') if clima_miraf else None),
+        'temp_miraflores': (clima_miraf.get('temp_C') if clima_miraf else None),
+    }
+    values = {name: [] for name in STATION_FIELDS}
+    for s, weather, g in zip(stations, weathers, geo):
+        in_miraflores = g['in_miraflores']
+
+        # asignación de temperatura y descripción:
+        if in_miraflores and clima_miraf:
+            temp_assigned = clima_miraf.get('temp_C')
+        else:
+            # fuera de Miraflores o no se obtuvo clima_miraf: usar OWM si existe o None
+            temp_assigned = weather.get('temp_C') if weather else (clima_miraf.get('temp_C') if clima_miraf else None)
+
+        values['station_id'].append(s.get('id'))
+        values['station_name'].append(s.get('name'))
+        values['lat'].append(s.get('lat'))
+        values['lon'].append(s.get('lon'))
+        values['capacity'].append(s.get('capacity'))
+        values['free_bikes'].append(s.get('free_bikes'))
+        values['empty_slots'].append(s.get('empty_slots'))
+        # Si hay OWM quedará en weather_main/desc; temp_C prioriza clima.com para Miraflores
+        values['weather_main'].append(weather.get('weather_main') if weather else None)
+        values['weather_desc'].append(weather.get('weather_desc') if weather else None)
+        values['temp_C'].append(temp_assigned)
+        values['wind_speed'].append(weather.get('wind_speed') if weather else None)
+        values['in_miraflores'].append(in_miraflores)
+        # Zona (capa de My Maps que contiene o está junto a la estación) y densidad de esa zona
+        values['zona_inferida'].append(g['zona_inferida'])
+        values['densidad_poblacional'].append(g['densidad_poblacional'])
+    if http_summary:
+        log_fetch_summary()
+    return Snapshot.from_values(shared, values, source=source)
@@ -0,0 +1,389 @@
+# citybike/stations.py
+"""
+Fuentes de estaciones: API pública de CityBikes, GBFS directo en el sitio,
+el feed JSON que Selenium descubrió en una corrida anterior y, como último
+recurso, Selenium (pool de navegadores de citybike.browser, que importa
+Selenium y webdriver_manager solo al lanzar el primer Chrome).
+"""
+import json
+import time
+import logging
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+
+from citybike import discovery, metrics
+from citybike.fetch import fetch
+from citybike.jsonscan import extract_stations
+from citybike.networks import default_network, paths, DEFAULT_MATCH
+from citybike.config import CITYBIKE_URL, CITYBIKES_API_ROOT
+
+
+# ---------- CITYBIKE: intentos de extracción ----------
+def find_citybikes_network(timeout=20, match=DEFAULT_MATCH, country=None):
+    """
+    Descarga la lista completa de redes y devuelve el id de la primera cuyo
+    nombre o ciudad contenga alguno de los términos de 'match' (por defecto,
+    la red de Lima), opcionalmente solo del país 'country'. None si no hay.
+    """
+    with metrics.stage("stations.networks_list"):
+        resp = fetch(CITYBIKES_API_ROOT, timeout=timeout, conditional=True)
+        resp.raise_for_status()
+        data = resp.json()
+    networks = data.get('networks', [])
+    for net in networks:
+        location = net.get('location', {})
+        if country and (location.get('country') or "").upper() != country.upper():
+            continue
+        nname = (net.get('name') or "").lower()
+        city = (location.get('city') or "").lower()
+        if any(m in nname or m in city for m in match):
+            return net.get('id')
+    return None
+
+def fetch_citybikes_network(network_id, timeout=20):
+    with metrics.stage("stations.citybikes") as rec:
+        r2 = fetch(f"{CITYBIKES_API_ROOT}/{network_id}", timeout=timeout, conditional=True)
+        r2.raise_for_status()
+        netdata = r2.json().get('network', {})
+        rec['stations'] = len(netdata.get('stations') or [])
+    stations = netdata.get('stations') or []
+    out = []
+    for s in stations:
+        out.append({
+            'id': s.get('id'),
+            'name': s.get('name'),
+            'lat': s.get('latitude'),
+            'lon': s.get('longitude'),
+            'capacity': s.get('extra', {}).get('slots') or s.get('capacity') or None,
+            'free_bikes': s.get('free_bikes'),
+            'empty_slots': s.get('empty_slots'),
+            'timestamp': s.get('timestamp')
+        })
+    return out
+
+def try_citybikes_api(timeout=20, network_id=None, found=None, match=DEFAULT_MATCH, country=None):
+    """
+    Estaciones desde api.citybik.es. Con 'network_id' (p.ej. de la caché) es una
+    sola petición; sin él primero se busca la red en la lista completa (por
+    'match' y 'country', ver find_citybikes_network).
+    Si se pasa el dict 'found', se anota ahí el id de red resuelto.
+    """
+    logging.info("Intentando API pública de CityBikes (api.citybik.es)...")
+    try:
+        target = network_id or find_citybikes_network(timeout, match, country)
+        if not target:
+            logging.info(f"No se encontró red clara para {'/'.join(match)} en api.citybik.es")
+            return None
+        logging.info(f"Encontrada red: {target}. Descargando estaciones...")
+        out = fetch_citybikes_network(target, timeout)
+        if found is not None:
+            found['network_id'] = target
+        return out
+    except Exception as e:
+        logging.warning(f"CityBikes API fallo: {e}")
+        return None
+
+GBFS_PATHS = [
+    "/gbfs/gbfs.json", "/gbfs.json", "/gbfs/en/station_information.json", "/gbfs/en/station_status.json",
+    "/station_information.json", "/system_information.json"
+]
+
+def gbfs_candidate_urls(base_url_candidates):
+    return [base.rstrip("/") + path for base in base_url_candidates for path in GBFS_PATHS]
+
+def _gbfs_status(info_url, timeout=10):
+    """station_status.json hermano de un station_information.json: {station_id: estado} ({} si no hay)."""
+    status_url = info_url.replace("station_information.json", "station_status.json")
+    try:
+        r = fetch(status_url, timeout=timeout, conditional=True, retries=0)
+        if r.status_code != 200:
+            return {}
+        return {str(s.get('station_id')): s for s in r.json().get('data', {}).get('stations') or []}
+    except Exception as e:
+        logging.info(f"GBFS sin station_status en {status_url}: {e}")
+        return {}
+
+def probe_gbfs_url(url, timeout=10):
+    """
+    Prueba una sola URL GBFS; devuelve la lista de estaciones o None. A un
+    station_information (sin bicis) se le suman las bicis y anclajes libres
+    de su station_status; un feed sin coordenadas no sirve como fuente.
+    """
+    with metrics.stage("stations.gbfs", url=url) as rec:
+        try:
+            # sin reintentos: en el descubrimiento la mayoría de rutas no existen
+            r = fetch(url, timeout=timeout, conditional=True, retries=0)
+            if r.status_code != 200:
+                rec['error'] = f"HTTP{r.status_code}"
+                return None
+            j = r.json()
+            if 'data' in j and ('stations' in j['data']):
+                stations = j['data']['stations']
+                status = _gbfs_status(url, timeout) if url.endswith("station_information.json") else {}
+                out = []
+                for s in stations:
+                    sid = s.get('station_id') or s.get('id')
+                    st = status.get(str(sid)) or s
+                    out.append({
+                        'id': sid,
+                        'name': s.get('name'),
+                        'lat': s.get('lat') or s.get('latitude'),
+                        'lon': s.get('lon') or s.get('longitude'),
+                        'capacity': s.get('capacity'),
+                        'free_bikes': st.get('num_bikes_available'),
+                        'empty_slots': st.get('num_docks_available'),
+                    })
+                if not any(e['lat'] is not None and e['lon'] is not None for e in out):
+                    rec['error'] = "NoCoords"
+                    return None
+                rec['stations'] = len(out)
+                return out
+        except Exception as e:
+            rec['error'] = type(e).__name__
+    return None
+
+def try_gbfs_direct(base_url_candidates):
+    # versión secuencial; collect_snapshot usa resolve_stations() que prueba todo en paralelo
+    for url in gbfs_candidate_urls(base_url_candidates):
+        out = probe_gbfs_url(url)
+        if out:
+            return out
+    return None
+
+def _station_like(d):
+    return isinstance(d, dict) and (('lat' in d and 'lon' in d) or ('latitude' in d and 'longitude' in d))
+
+def stations_from_json(obj):
+    """Busca (en profundidad) la primera lista de dicts con lat/lon o latitude/longitude."""
+    stack = [obj]
+    while stack:
+        cur = stack.pop()
+        if isinstance(cur, list):
+            hits = [e for e in cur if _station_like(e)]
+            if hits:
+                return [{
+                    'id': e.get('station_id') or e.get('id'),
+                    'name': e.get('name'),
+                    'lat': e.get('lat', e.get('latitude')),
+                    'lon': e.get('lon', e.get('longitude')),
+                    'capacity': e.get('capacity'),
+                    'free_bikes': e.get('free_bikes', e.get('num_bikes_available')),
+                    'empty_slots': e.get('empty_slots', e.get('num_docks_available')),
+                } for e in hits]
+            stack.extend(reversed(cur))
+        elif isinstance(cur, dict):
+            stack.extend(reversed(list(cur.values())))
+    return None
+
+def probe_xhr_feed(url, timeout=10):
+    """Pide por HTTP el feed JSON que Selenium vio en la página; estaciones o None."""
+    with metrics.stage("stations.xhr") as rec:
+        try:
+            r = fetch(url, timeout=timeout, conditional=True, retries=0)
+            if r.status_code != 200:
+                rec['error'] = f"HTTP{r.status_code}"
+                return None
+            return stations_from_json(r.json())
+        except Exception as e:
+            rec['error'] = type(e).__name__
+            return None
+
+def selenium_scrape_citybike(url=CITYBIKE_URL, headless=True, found=None, timeout=None):
+    """
+    Renderiza el mapa con un Chrome del pool (se reutiliza entre snapshots) y
+    extrae estaciones de los marcadores, de los scripts o de las respuestas
+    JSON que la página pidió. Si una de esas respuestas trae estaciones y se
+    pasa el dict 'found', se anota su URL en found['xhr_feed_url']. Si en
+    'timeout' s no se libera un navegador del pool, el fallback falla (None).
+    """
+    with metrics.stage("stations.selenium") as rec:
+        stations = _selenium_scrape(url, found, rec, timeout)
+        rec['stations'] = len(stations) if stations else 0
+        return stations
+
+def _selenium_scrape(url, found, rec, timeout=None):
+    logging.info("Usando Selenium para renderizar y extraer estaciones del mapa (fallback)...")
+    from citybike.browser import get_browser_pool
+
+    try:
+        with get_browser_pool().session(timeout) as s:
+            s.load(url)
+            stations = []
+            for m in s.markers():
+                if m.get('lat') and m.get('lon'):
+                    stations.append({'id': m.get('id'), 'name': (m.get('name') or "").strip(),
+                                     'lat': float(m['lat']), 'lon': float(m['lon'])})
+            # Si no se encontraron candidatos, intentar buscar JSON embebido en scripts
+            if not stations:
+                stations = extract_stations(s.station_scripts())
+            # El feed XHR que pinta el mapa: con él las próximas corridas no necesitan navegador
+            for feed_url, body in s.json_responses():
+                try:
+                    feed = stations_from_json(json.loads(body))
+                except ValueError:
+                    continue
+                if feed:
+                    logging.info(f"Feed JSON de estaciones detectado: {feed_url}")
+                    if found is not None:
+                        found['xhr_feed_url'] = feed_url
+                    if not stations:
+                        stations = feed
+                    break
+    except ImportError as e:
+        logging.error(f"Selenium no disponible: {e}")
+        rec['error'] = type(e).__name__
+        return None
+    except TimeoutError as e:
+        logging.warning(f"Selenium: {e}")
+        rec['error'] = type(e).__name__
+        return None
+    except Exception as e:
+        logging.error("Error Selenium: " + str(e))
+        rec['error'] = type(e).__name__
+        return None
+    if not stations:
+        logging.warning("No se encontraron estaciones con Selenium (estructura inesperada).")
+        return None
+    logging.info(f"Extraídas {len(stations)} estaciones vía Selenium.")
+    return stations
+
+
+# ---------- RESOLUCIÓN CONCURRENTE ----------
+def _remaining(t_end):
+    return max(0.0, t_end - time.monotonic())
+
+def _try_cached_source(cache, deadline):
+    """Una sola petición a la fuente que funcionó la última vez. Devuelve estaciones o None."""
+    preferred = cache['preferred']
+    if preferred == "citybikes" and cache.get('network_id'):
+        logging.info(f"Caché: usando red {cache['network_id']} de api.citybik.es")
+        return try_citybikes_api(timeout=min(20, deadline), network_id=cache['network_id'])
+    if preferred and preferred.startswith("gbfs:") and cache.get('gbfs_url'):
+        logging.info(f"Caché: usando GBFS {cache['gbfs_url']}")
+        return probe_gbfs_url(cache['gbfs_url'], timeout=min(10, deadline))
+    if preferred == "xhr" and cache.get('xhr_feed_url'):
+        logging.info(f"Caché: usando feed JSON {cache['xhr_feed_url']}")
+        return probe_xhr_feed(cache['xhr_feed_url'], timeout=min(10, deadline))
+    return None
+
+def _remember(cache, name, found):
+    cache['preferred'] = name
+    cache['discovered_at'] = time.time()
+    if name == "citybikes":
+        cache['network_id'] = found.get('network_id') or cache.get('network_id')
+    elif name.startswith("gbfs:"):
+        cache['gbfs_url'] = name[len("gbfs:"):]
+    if found.get('xhr_feed_url'):
+        cache['xhr_feed_url'] = found['xhr_feed_url']
+
+def resolve_stations(deadline=None, base_url_candidates=None, use_selenium=True, use_cache=True, net=None):
+    """
+    Estaciones de la red 'net' (citybike.networks; por defecto Lima), con su
+    propia caché de descubrimiento:
+
+    1) Si la caché de descubrimiento tiene una fuente vigente, una sola petición a ella.
+    2) Si falla (o no hay caché): redescubrimiento. Lanza en paralelo la API de
+       CityBikes y las sondas GBFS que no estén en backoff, y se queda con el
+       primer resultado válido; las sondas pendientes se cancelan.
+    3) Selenium (caro: usa un Chrome del pool) solo si ninguna fuente HTTP
+       respondió; si ve pasar el feed JSON del mapa, se guarda como fuente
+       "xhr" y las próximas corridas lo piden por HTTP.
+    Todo bajo un plazo total de 'deadline' s (por defecto el de la red), con
+    a lo sumo net['max_concurrency'] sondas a la vez. Devuelve (fuente,
+    estaciones) o (None, None).
+    """
+    net = net or default_network()
+    deadline = net['deadline_seconds'] if deadline is None else deadline
+    if base_url_candidates is None:
+        base_url_candidates = net['gbfs_bases']
+    with metrics.stage("stations") as rec:
+        source, stations = _resolve(net, deadline, base_url_candidates, use_selenium, use_cache)
+        rec.update(source=source, stations=len(stations) if stations else 0)
+        return source, stations
+
+def _resolve(net, deadline, base_url_candidates, use_selenium, use_cache):
+    t_end = time.monotonic() + deadline
+    cache_path = paths(net)['discovery']
+    cache = discovery.load_cache(cache_path) if use_cache else discovery.empty_cache()
+
+    try:
+        if use_cache and discovery.is_fresh(cache):
+            with metrics.stage("stations.cached", source=cache['preferred']) as rec:
+                stations = _try_cached_source(cache, deadline)
+                rec['stations'] = len(stations) if stations else 0
+            if stations:
+                discovery.record_success(cache, cache['preferred'])
+                return cache['preferred'], stations
+            logging.warning(f"La fuente en caché ({cache['preferred']}) falló; redescubriendo...")
+            if cache['preferred'] == "citybikes":
+                # puede que solo haya cambiado el id de la red: la búsqueda completa sí se reintenta
+                cache['network_id'] = None
+            else:
+                discovery.record_failure(cache, cache['preferred'])
+            cache['preferred'] = None
+
+        return _discover(cache, t_end, deadline, base_url_candidates, use_selenium, net)
+    finally:
+        if use_cache:
+            discovery.save_cache(cache, cache_path)
+
+def _discover(cache, t_end, deadline, base_url_candidates, use_selenium, net):
+    found = {}
+    probes = []
+    if net['citybikes_id'] or net['match']:
+        probes.append(("citybikes", partial(try_citybikes_api, timeout=min(20, deadline), found=found,
+                                            network_id=net['citybikes_id'], match=net['match'],
+                                            country=net['country'])))
+    probes += [(f"gbfs:{url}", partial(probe_gbfs_url, url, timeout=min(10, deadline)))
+               for url in gbfs_candidate_urls(base_url_candidates)]
+    if cache.get('xhr_feed_url'):
+        probes.append(("xhr", partial(probe_xhr_feed, cache['xhr_feed_url'], timeout=min(10, deadline))))
+    live = [(name, fn) for name, fn in probes if not discovery.is_backed_off(cache, name)]
+    if not live:
+        # todas en backoff: mejor probar todo que no tener datos
+        live = probes
+    elif len(live) < len(probes):
+        logging.info(f"Omitiendo {len(probes) - len(live)} sondas en backoff.")
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(net['max_concurrency'], len(live))),
+                              thread_name_prefix=f"probe-{net['id']}")
+    # cada sonda corre dentro de la traza en curso (sus bytes cuentan en 'stations')
+    futures = {pool.submit(metrics.bind(fn)): name for name, fn in live}
+    try:
+        for fut in as_completed(futures, timeout=_remaining(t_end)):
+            name = futures[fut]
+            try:
+                stations = fut.result()
+            except Exception:
+                stations = None
+            if stations:
+                discovery.record_success(cache, name)
+                _remember(cache, name, found)
+                return name, stations
+            discovery.record_failure(cache, name)
+    except FuturesTimeout:
+        logging.warning(f"Plazo de {deadline}s agotado esperando fuentes HTTP de estaciones.")
+    finally:
+        # cancela lo que no empezó; las sondas en curso terminan por su propio timeout
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    if use_selenium and net['map_url'] and _remaining(t_end) > 0:
+        sel_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="selenium")
+        # sin plazo propio, con varias redes en el fallback esperarían el navegador para siempre
+        fut = sel_pool.submit(metrics.bind(selenium_scrape_citybike), net['map_url'], found=found,
+                              timeout=_remaining(t_end))
+        try:
+            stations = fut.result(timeout=_remaining(t_end))
+            if stations:
+                if found.get('xhr_feed_url'):
+                    # con feed detectado, la próxima corrida lo pide directo sin navegador
+                    discovery.record_success(cache, "xhr")
+                    _remember(cache, "xhr", found)
+                return "selenium", stations
+        except FuturesTimeout:
+            logging.warning(f"Selenium no terminó dentro del plazo de {deadline}s.")
+        except Exception as e:
+            logging.error(f"Error Selenium: {e}")
+        finally:
+            sel_pool.shutdown(wait=False)
+    return None, None
@@ -0,0 +1,216 @@
+# storage.py
+"""
+Almacén columnar append-only para los snapshots de CityBike Lima.
+
+Cada snapshot se guarda como su propia partición Parquet dentro de
+``data/snapshots/date=YYYY-MM-DD/`` y se registra con una línea en un log
+append-only (``manifest.jsonl``). Escribir un snapshot cuesta O(tamaño del
+snapshot), no O(historial total) como el antiguo leer-concatenar-reescribir
+del CSV. compact() deja el estado completo en ``manifest.json`` (punto de
+control) y vacía el log; al leer se aplica el log sobre ese estado.
+
+- append_snapshot(): escribe un snapshot nuevo (una partición)
+- read_all():        devuelve un único DataFrame con todas las particiones
+- compact():         une las particiones de cada día en un solo archivo
+"""
+import os
+import json
+import logging
+import pandas as pd
+
+from citybike.config import STORE_ROOT
+MANIFEST_NAME = "manifest.json"
+MANIFEST_LOG_NAME = "manifest.jsonl"
+MANIFEST_VERSION = 1
+
+
+# ---------- MANIFEST ----------
+def _manifest_path(root):
+    return os.path.join(root, MANIFEST_NAME)
+
+def _log_path(root):
+    return os.path.join(root, MANIFEST_LOG_NAME)
+
+def load_manifest(root=STORE_ROOT):
+    """Estado del punto de control (manifest.json) con el log de altas y bajas aplicado encima."""
+    path = _manifest_path(root)
+    manifest = {'version': MANIFEST_VERSION, 'files': []}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    log = _log_path(root)
+    if os.path.exists(log):
+        files = {f['path']: f for f in manifest['files']}
+        with open(log, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    continue  # última línea cortada por un corte a mitad de escritura
+                # altas y bajas por ruta: aplicarlas dos veces da lo mismo
+                if op.get('op') == "remove":
+                    files.pop(op['path'], None)
+                else:
+                    files[op['path']] = op['entry']
+        manifest['files'] = list(files.values())
+    return manifest
+
+def _log_ops(root, ops):
+    """Agrega operaciones ({'op': 'add', 'path', 'entry'} / {'op': 'remove', 'path'}) al log: O(1) por partición."""
+    with open(_log_path(root), "a", encoding="utf-8") as f:
+        f.write("".join(json.dumps(op, sort_keys=True) + "\n" for op in ops))
+        f.flush()
+        os.fsync(f.fileno())
+
+def _write_manifest(root, manifest):
+    """Punto de control: el estado completo en manifest.json y el log vacío."""
+    # escritura atómica: un corte a mitad de run no deja un manifest roto; si el corte
+    # cae antes de vaciar el log, reaplicarlo sobre el nuevo estado no cambia nada
+    path = _manifest_path(root)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+    try:
+        os.remove(_log_path(root))
+    except FileNotFoundError:
+        pass
+
+def _write_parquet(df, path):
+    tmp = path + ".tmp"
+    if isinstance(df, pd.DataFrame):
+        df.to_parquet(tmp, index=False)
+    else:
+        import pyarrow.parquet as pq
+
+        # citybike.model.Snapshot: textos como string plano, mismo esquema que las particiones viejas
+        pq.write_table(df.to_arrow(dictionary=False), tmp)
+    os.replace(tmp, path)
+
+
+# ---------- ESCRITURA ----------
+def _file_token(ts_iso):
+    # '2024-05-01T10:30:00.123456-05:00' -> '20240501T103000123456' (hora local)
+    return pd.Timestamp(ts_iso).strftime("%Y%m%dT%H%M%S%f")
+
+def append_snapshot(df, root=STORE_ROOT):
+    """Agrega un snapshot (DataFrame con 'scrape_timestamp' o citybike.model.Snapshot) como partición nueva."""
+    if df is None or len(df) == 0:
+        return None
+    if isinstance(df, pd.DataFrame):
+        ts, last_ts = str(df['scrape_timestamp'].iloc[0]), str(df['scrape_timestamp'].iloc[-1])
+    else:
+        ts = last_ts = df.shared['scrape_timestamp']
+    date = ts[:10]
+    part_dir = os.path.join(root, f"date={date}")
+    os.makedirs(part_dir, exist_ok=True)
+
+    fname = f"part-{_file_token(ts)}.parquet"
+    rel = f"date={date}/{fname}"
+    _write_parquet(df, os.path.join(root, rel))
+
+    entry = {
+        'path': rel,
+        'date': date,
+        'rows': int(len(df)),
+        'min_ts': ts,
+        'max_ts': last_ts,
+    }
+    _log_ops(root, [{'op': "add", 'path': rel, 'entry': entry}])
+    return rel
+
+
+# ---------- LECTURA ----------
+def list_partitions(root=STORE_ROOT, start=None, end=None):
+    """Entradas del manifest cuyo día está en [start, end] (fechas 'YYYY-MM-DD')."""
+    files = load_manifest(root)['files']
+    if start:
+        files = [f for f in files if f['date'] >= start]
+    if end:
+        files = [f for f in files if f['date'] <= end]
+    return sorted(files, key=lambda f: (f['min_ts'], f['path']))
+
+def read_all(root=STORE_ROOT, start=None, end=None, columns=None):
+    """Lee todas las particiones (opcionalmente filtradas por día) en un solo DataFrame."""
+    parts = list_partitions(root, start, end)
+    if not parts:
+        return pd.DataFrame()
+    frames = [pd.read_parquet(os.path.join(root, p['path']), columns=columns) for p in parts]
+    return pd.concat(frames, ignore_index=True)
+
+
+# ---------- COMPACTACIÓN ----------
+def compact(root=STORE_ROOT, date=None):
+    """
+    Une todas las particiones de un día en un único archivo ordenado.
+    Si no se indica 'date', compacta todos los días con más de un archivo.
+    Devuelve la lista de días compactados.
+    """
+    manifest = load_manifest(root)
+    by_date = {}
+    for f in manifest['files']:
+        by_date.setdefault(f['date'], []).append(f)
+
+    compacted = []
+    for d, files in sorted(by_date.items()):
+        if date and d != date:
+            continue
+        if len(files) < 2:
+            continue
+        files = sorted(files, key=lambda f: (f['min_ts'], f['path']))
+        df = pd.concat([pd.read_parquet(os.path.join(root, f['path'])) for f in files], ignore_index=True)
+        df = df.sort_values(['scrape_timestamp', 'station_id'], kind="mergesort", ignore_index=True)
+
+        rel = f"date={d}/compacted-{_file_token(files[-1]['max_ts'])}.parquet"
+        _write_parquet(df, os.path.join(root, rel))
+
+        old = {f['path'] for f in files}
+        manifest['files'] = [f for f in manifest['files'] if f['path'] not in old]
+        manifest['files'].append({
+            'path': rel,
+            'date': d,
+            'rows': int(len(df)),
+            'min_ts': files[0]['min_ts'],
+            'max_ts': files[-1]['max_ts'],
+        })
+        # primero el manifest, luego borrar: un corte aquí solo deja archivos huérfanos
+        _write_manifest(root, manifest)
+        for p in old:
+            if p != rel:
+                try:
+                    os.remove(os.path.join(root, p))
+                except FileNotFoundError:
+                    pass
+        logging.info(f"Compactado {d}: {len(files)} particiones -> {rel} ({len(df)} filas)")
+        compacted.append(d)
+    if not compacted and os.path.exists(_log_path(root)):
+        _write_manifest(root, manifest)  # sin días que unir: al menos vaciar el log
+    return compacted
+
+
+# ---------- MIGRACIÓN ----------
+def import_legacy_csv(csv_path, root=STORE_ROOT):
+    """
+    Importa el CSV acumulado antiguo al almacén, una partición por
+    scrape_timestamp. Las filas sin station_id o sin timestamp se descartan
+    como inválidas (como 'invalidas' en quality.clean_rows) y las repetidas
+    (mismo timestamp y estación, de corridas concatenadas dos veces) se
+    importan una sola vez.
+    """
+    from citybike.quality import normalize_id
+
+    df = pd.read_csv(csv_path)
+    df['station_id'] = df['station_id'].map(normalize_id)
+    before = len(df)
+    df = df[df['station_id'].notna() & df['scrape_timestamp'].notna()]
+    if len(df) < before:
+        logging.warning(f"{csv_path}: {before - len(df)} filas inválidas (sin station_id o timestamp) omitidas")
+    before = len(df)
+    df = df.drop_duplicates(['scrape_timestamp', 'station_id'], keep="first")
+    if len(df) < before:
+        logging.warning(f"{csv_path}: {before - len(df)} filas repetidas omitidas")
+    n = 0
+    for _, group in df.groupby('scrape_timestamp', sort=True):
+        append_snapshot(group.reset_index(drop=True), root)
+        n += 1
+    return n
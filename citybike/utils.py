@@ -0,0 +1,17 @@
+# citybike/utils.py
+from datetime import datetime
+
+from citybike.config import LIMA_TZ
+
+
+# ---------- UTILIDADES ----------
+def now_ts(tzinfo=LIMA_TZ):
+    return datetime.now(tz=tzinfo)
+
+def periodo_del_dia(dt):
+    h = dt.hour
+    if 5 <= h < 12:
+        return "mañana"
+    if 12 <= h < 18:
+        return "tarde"
+    return "noche"
@@ -0,0 +1,180 @@
+# citybike/weather.py
+"""
+Fuentes de clima: Clima.com (Miraflores, principal) y OpenWeatherMap
+por coordenadas (fallback). El parser de Clima.com (citybike.clima) se
+importa solo al scrapear.
+"""
+import os
+import json
+import math
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from citybike import metrics
+from citybike.fetch import fetch
+from citybike.config import (
+    OWM_BASE, CLIMA_MIRAFLORES_URL, CLIMA_MIRAFLORES_HEADER, USER_AGENT, WEATHER_CELL_DEG, WEATHER_TTL_SECONDS,
+    WEATHER_CACHE, OWM_MAX_WORKERS, OWM_MAX_PER_SECOND,
+)
+
+
+# ---------- CLIMA ----------
+def get_weather_for_coord(lat, lon, owm_key):
+    """Fallback: OpenWeatherMap (si no hay datos de clima.com o si estación fuera de Miraflores)"""
+    if not owm_key:
+        return None
+    params = {"lat": lat, "lon": lon, "appid": owm_key, "units": "metric", "lang": "es"}
+    try:
+        r = fetch(OWM_BASE, params=params, timeout=10)
+        r.raise_for_status()
+        j = r.json()
+        return {
+            'weather_main': j.get('weather', [{}])[0].get('main'),
+            'weather_desc': j.get('weather', [{}])[0].get('description'),
+            'temp_C': j.get('main', {}).get('temp'),
+            'wind_speed': j.get('wind', {}).get('speed'),
+        }
+    except Exception as e:
+        logging.warning(f"OWM fallo para {lat},{lon}: {e}")
+        return None
+
+# ---------- CLIMA POR CELDAS ----------
+def weather_cell(lat, lon, cell_deg=WEATHER_CELL_DEG):
+    """Celda de grilla (i, j) de lado cell_deg grados que contiene el punto."""
+    return int(math.floor(float(lat) / cell_deg)), int(math.floor(float(lon) / cell_deg))
+
+def _cell_center(cell, cell_deg):
+    i, j = cell
+    return round((i + 0.5) * cell_deg, 6), round((j + 0.5) * cell_deg, 6)
+
+def _load_weather_cache(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_weather_cache(cache, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # con varias redes en paralelo, cada hilo escribe su propio temporal
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    os.replace(tmp, path)
+
+class RateLimiter:
+    """Espacia las llamadas para no superar 'per_second' (compartido entre hilos y redes, ver owm_limiter())."""
+
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second else 0.0
+        self.next_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            at = max(now, self.next_at)
+            self.next_at = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def owm_limiter(owm_key, per_second=OWM_MAX_PER_SECOND):
+    """
+    El limitador de una clave OWM, único en el proceso: la cuota del plan es
+    por clave, así que las redes recolectadas en paralelo lo comparten. Si
+    se pide con otro 'per_second' queda el más restrictivo.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(owm_key)
+        if limiter is None:
+            limiter = _limiters[owm_key] = RateLimiter(per_second)
+        elif per_second:
+            limiter.interval = max(limiter.interval, 1.0 / per_second)
+        return limiter
+
+def weather_for_stations(stations, owm_key, cell_deg=WEATHER_CELL_DEG, ttl=WEATHER_TTL_SECONDS,
+                         max_workers=OWM_MAX_WORKERS, per_second=OWM_MAX_PER_SECOND, cache_path=WEATHER_CACHE):
+    """
+    Clima OWM para una lista de estaciones con una sola consulta por celda de
+    grilla (no por estación). Las celdas con dato en caché de menos de 'ttl' s
+    no se consultan; el resto va en paralelo, limitado a 'per_second' por
+    clave entre todas las llamadas del proceso.
+    Devuelve una lista alineada con 'stations' (dict de clima o None).
+    """
+    out = [None] * len(stations)
+    if not owm_key:
+        return out
+
+    cells = {}
+    for idx, s in enumerate(stations):
+        lat, lon = s.get('lat'), s.get('lon')
+        if not lat or not lon:
+            continue
+        try:
+            cells.setdefault(weather_cell(lat, lon, cell_deg), []).append(idx)
+        except (TypeError, ValueError):
+            continue
+
+    now = time.time()
+    cache = _load_weather_cache(cache_path)
+    results = {}
+    pending = []
+    for cell in cells:
+        key = f"{cell_deg}:{cell[0]}:{cell[1]}"
+        hit = cache.get(key)
+        if hit and now - hit['at'] < ttl:
+            results[cell] = hit['weather']
+        else:
+            pending.append((cell, key))
+
+    if pending:
+        limiter = owm_limiter(owm_key, per_second)
+
+        def lookup(cell):
+            limiter.wait()
+            lat, lon = _cell_center(cell, cell_deg)
+            return get_weather_for_coord(lat, lon, owm_key)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending))), thread_name_prefix="owm") as pool:
+            futures = [pool.submit(metrics.bind(lookup), cell) for cell, _ in pending]
+            fetched = [f.result() for f in futures]
+        for (cell, key), weather in zip(pending, fetched):
+            results[cell] = weather
+            if weather:
+                cache[key] = {'at': now, 'weather': weather}
+        # no acumular celdas viejas
+        cache = {k: v for k, v in cache.items() if now - v['at'] < ttl}
+        _save_weather_cache(cache, cache_path)
+
+    logging.info(f"Clima OWM: {len(stations)} estaciones en {len(cells)} celdas, "
+                 f"{len(cells) - len(pending)} desde caché, {len(pending)} consultadas")
+    for cell, idxs in cells.items():
+        for idx in idxs:
+            out[idx] = results.get(cell)
+    return out
+
+def scrape_clima_miraflores(url=CLIMA_MIRAFLORES_URL, header=CLIMA_MIRAFLORES_HEADER):
+    """
+    Extrae temperatura y descripción del tiempo desde Clima.com (Miraflores,
+    o la página de otra región con 'url' y su encabezado 'header').
+    Nota: la página puede cambiar la estructura; citybike.clima.parse_clima
+    usa una estrategia por pasos:
+    1) desde el header de la región, el primer número con '°' y el primer img alt
+    2) heurística: buscar 'Image: ...' seguido de '##°' en el HTML
+    3) fallback: primer número seguido de '°' en la página
+    """
+    try:
+        from citybike.clima import parse_clima  # import diferido
+
+        headers = {"User-Agent": USER_AGENT}
+        resp = fetch(url, timeout=20, headers=headers, conditional=True)
+        resp.raise_for_status()
+        return parse_clima(resp.text, header=header)
+    except Exception as e:
+        logging.warning(f"No se pudo scrapear Clima.com ({url}): {e}")
+        return None
@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# como en bench/: el paquete se importa desde la raíz del repo sin instalarlo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
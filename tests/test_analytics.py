@@ -0,0 +1,70 @@
+# tests/test_analytics.py
+"""citybike.analytics: agregados incrementales contra el cálculo desde cero."""
+import pandas as pd
+
+from citybike import analytics
+from citybike.config import AGGREGATE_MAX_GAP_SECONDS
+from citybike.model import SNAPSHOT_COLUMNS
+
+
+def _snap(ts, free, cap=10, periodo="mañana"):
+    rows = []
+    for sid, f in free.items():
+        row = {c: None for c in SNAPSHOT_COLUMNS}
+        row.update(scrape_timestamp=ts, station_id=sid, capacity=cap, free_bikes=f,
+                   empty_slots=None if f is None else cap - f, day_of_week="Monday", periodo_dia=periodo)
+        rows.append(row)
+    return rows
+
+SNAPS = [
+    _snap("2025-01-06T08:00:00-05:00", {'a': 0, 'b': 5}),
+    _snap("2025-01-06T08:30:00-05:00", {'a': 4, 'b': 10}),
+    _snap("2025-01-06T09:00:00-05:00", {'a': 4, 'b': None}),
+    _snap("2025-01-06T12:00:00-05:00", {'a': 2, 'b': 3}, periodo="tarde"),  # hueco largo
+]
+
+def _history(snaps):
+    return pd.DataFrame([r for rows in snaps for r in rows], columns=SNAPSHOT_COLUMNS)
+
+
+def test_incremental_coincide_con_el_historial():
+    state = analytics.new_state()
+    for rows in SNAPS:
+        assert analytics.update(state, rows)
+    assert analytics.check(state, _history(SNAPS)).empty
+
+def test_rebuild_desde_el_historial_coincide():
+    state = analytics.rebuild(analytics.iter_store_snapshots(_history(SNAPS)), "daily")
+    assert analytics.history_source(state) == "daily"
+    assert analytics.check(state, _history(SNAPS)).empty
+
+def test_check_detecta_diferencias():
+    state = analytics.rebuild(SNAPS[:-1])
+    diff = analytics.check(state, _history(SNAPS))
+    assert set(diff['periodo_dia']) == {"tarde"}  # falta el último snapshot
+    state = analytics.rebuild(SNAPS)
+    state['buckets'][analytics._bucket_key('b', "Monday", "mañana")]['full_n'] += 1
+    diff = analytics.check(state, _history(SNAPS))
+    assert list(diff['station_id']) == ['b']
+
+def test_snapshot_repetido_o_anterior_se_ignora():
+    state = analytics.rebuild(SNAPS[:2])
+    assert not analytics.update(state, SNAPS[1])
+    assert not analytics.update(state, SNAPS[0])
+    assert analytics.check(state, _history(SNAPS[:2])).empty
+
+def test_hueco_largo_no_suma_tiempo_ni_rotacion():
+    state = analytics.rebuild(SNAPS)
+    assert 3 * 3600 > AGGREGATE_MAX_GAP_SECONDS  # de 9:00 a 12:00
+    b = state['buckets'][analytics._bucket_key('a', "Monday", "tarde")]
+    assert b['turnover_n'] == 0
+    morning = state['buckets'][analytics._bucket_key('a', "Monday", "mañana")]
+    assert morning['empty_seconds'] == 1800  # vacía de 8:00 a 8:30; de 9:00 a 12:00 no cuenta
+
+def test_fuente_mezclada():
+    state = analytics.new_state()
+    analytics.note_source(state, "daily")
+    analytics.note_source(state, "daily")
+    assert analytics.history_source(state) == "daily"
+    analytics.note_source(state, "store")
+    assert analytics.history_source(state) == analytics.MIXED_SOURCE
@@ -0,0 +1,44 @@
+# tests/test_clima.py
+"""citybike.clima: temperatura y descripción de la página de Clima.com."""
+import os
+import json
+
+import pytest
+
+from citybike.clima import parse_clima
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench", "fixtures", "clima")
+
+with open(os.path.join(FIXTURES, "expected.json"), encoding="utf-8") as f:
+    EXPECTED = json.load(f)
+
+
+def _page(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+@pytest.mark.parametrize("name", sorted(EXPECTED))
+@pytest.mark.parametrize("chunk_chars", [1, 7, 64, 4096])
+def test_fixtures_en_cualquier_trozo(name, chunk_chars):
+    assert parse_clima(_page(name), chunk_chars=chunk_chars) == EXPECTED[name]
+
+def test_encabezado_de_otra_region():
+    page = ('<div><h2>Miraflores 15°</h2><img alt="Nublado"></div>'
+            '<div><h2>Providencia</h2><p>21°</p><img alt="Soleado"></div>')
+    assert parse_clima(page, header="Providencia") == {'temp_C': 21.0, 'clima': "Soleado"}
+    assert parse_clima(page) == {'temp_C': 15.0, 'clima': "Nublado"}
+
+def test_pagina_sin_el_encabezado():
+    # sin encabezado no se toma el <img alt> de cualquier lado: solo el primer número con °
+    page = '<div><h1>Lima</h1><p>Hoy 20°</p><img alt="Soleado"></div>'
+    assert parse_clima(page) == {'temp_C': 20.0, 'clima': None}
+    assert parse_clima(_page("temp_in_header.html"), header="Providencia") == {'temp_C': 22.0, 'clima': None}
+
+def test_encabezado_fuera_de_h1_h2_h3_div_no_cuenta():
+    page = '<p>Miraflores</p><span>19°</span><img alt="Nuboso">'
+    assert parse_clima(page) == {'temp_C': 19.0, 'clima': None}
+
+def test_scripts_y_estilos_no_se_leen():
+    page = ('<div><h2>Miraflores</h2><script>var t="99°";</script><style>.x{content:"88°"}</style>'
+            '<span>17°</span><img alt="Despejado"></div>')
+    assert parse_clima(page) == {'temp_C': 17.0, 'clima': "Despejado"}
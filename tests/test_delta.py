@@ -0,0 +1,81 @@
+# tests/test_delta.py
+"""citybike.delta: grabar solo cambios y rearmar los snapshots completos."""
+from citybike import delta
+from citybike.model import SNAPSHOT_COLUMNS
+
+
+def _row(ts, sid, free, cap=10, name=None, **extra):
+    row = {c: None for c in SNAPSHOT_COLUMNS}
+    row.update(scrape_timestamp=ts, station_id=sid, station_name=name or f"Estación {sid}", lat=-12.1, lon=-77.0,
+               capacity=cap, free_bikes=free, empty_slots=cap - free, day_of_week="Monday", periodo_dia="mañana",
+               in_miraflores=False, clima_miraflores="Nuboso", temp_miraflores=18.0)
+    row.update(extra)
+    return row
+
+def _record(tmp_path, snaps):
+    return [delta.record(rows, str(tmp_path)) for rows in snaps]
+
+def _read(tmp_path, **kw):
+    """{scrape_timestamp: filas} rearmados desde el registro delta."""
+    return {ts: rows for ts, rows in delta.iter_snapshots(root=str(tmp_path), **kw)}
+
+def _by_station(rows):
+    return {r['station_id']: r for r in rows}
+
+
+def test_keyframe_y_deltas_se_rearman_igual(tmp_path):
+    snaps = [
+        [_row("2025-01-06T08:00:00-05:00", "a", 3), _row("2025-01-06T08:00:00-05:00", "b", 5)],
+        [_row("2025-01-06T08:30:00-05:00", "a", 4), _row("2025-01-06T08:30:00-05:00", "b", 5)],
+        [_row("2025-01-06T09:00:00-05:00", "a", 4), _row("2025-01-06T09:00:00-05:00", "b", 1)],
+    ]
+    summaries = _record(tmp_path, snaps)
+    assert [s['keyframe'] for s in summaries] == [True, False, False]
+    assert [s['status_rows'] for s in summaries] == [2, 1, 1]  # solo lo que cambió
+
+    got = _read(tmp_path)
+    assert list(got) == [rows[0]['scrape_timestamp'] for rows in snaps]
+    for rows in snaps:
+        assert _by_station(got[rows[0]['scrape_timestamp']]) == _by_station(rows)
+
+def test_estacion_que_desaparece_y_cambio_de_dimension(tmp_path):
+    snaps = [
+        [_row("2025-01-06T08:00:00-05:00", "a", 3), _row("2025-01-06T08:00:00-05:00", "b", 5)],
+        [_row("2025-01-06T08:30:00-05:00", "a", 3, name="Larco renombrada")],
+        [_row("2025-01-06T09:00:00-05:00", "a", 3, name="Larco renombrada"),
+         _row("2025-01-06T09:00:00-05:00", "b", 2)],
+    ]
+    _record(tmp_path, snaps)
+    got = _read(tmp_path)
+    assert set(_by_station(got["2025-01-06T08:30:00-05:00"])) == {"a"}
+    assert got["2025-01-06T08:00:00-05:00"][0]['station_name'] == "Estación a"
+    assert _by_station(got["2025-01-06T09:00:00-05:00"])['a']['station_name'] == "Larco renombrada"
+    assert _by_station(got["2025-01-06T09:00:00-05:00"])['b']['free_bikes'] == 2
+
+def test_dia_nuevo_arranca_en_keyframe(tmp_path):
+    snaps = [
+        [_row("2025-01-06T23:30:00-05:00", "a", 3)],
+        [_row("2025-01-07T00:00:00-05:00", "a", 3)],
+    ]
+    assert [s['keyframe'] for s in _record(tmp_path, snaps)] == [True, True]
+    # el día 7 se lee sin el 6
+    got = _read(tmp_path, start="2025-01-07", end="2025-01-07")
+    assert _by_station(got["2025-01-07T00:00:00-05:00"]) == _by_station(snaps[1])
+
+def test_desde_un_snapshot_que_no_es_keyframe(tmp_path):
+    snaps = [
+        [_row("2025-01-06T08:00:00-05:00", "a", 3), _row("2025-01-06T08:00:00-05:00", "b", 5)],
+        [_row("2025-01-06T08:30:00-05:00", "a", 4), _row("2025-01-06T08:30:00-05:00", "b", 5)],
+    ]
+    _record(tmp_path, snaps)
+    got = _read(tmp_path, start="2025-01-06T08:30:00-05:00")
+    assert list(got) == ["2025-01-06T08:30:00-05:00"]
+    assert _by_station(got["2025-01-06T08:30:00-05:00"]) == _by_station(snaps[1])
+    assert _by_station(delta.snapshot_at("2025-01-06T08:45:00-05:00", str(tmp_path))) == _by_station(snaps[1])
+
+def test_snapshot_repetido_o_anterior_se_omite(tmp_path):
+    rows = [_row("2025-01-06T08:00:00-05:00", "a", 3)]
+    assert delta.record(rows, str(tmp_path))['keyframe']
+    assert delta.record(rows, str(tmp_path)) is None
+    assert delta.record([_row("2025-01-06T07:00:00-05:00", "a", 1)], str(tmp_path)) is None
+    assert len(_read(tmp_path)) == 1
@@ -0,0 +1,35 @@
+# tests/test_jsonscan.py
+"""citybike.jsonscan: arrays de estaciones embebidos en scripts."""
+import json
+
+from citybike.jsonscan import iter_station_spans, iter_station_arrays, extract_stations
+
+
+def test_corchetes_dentro_de_strings_y_comentarios():
+    text = ('var s="texto con ] y } sueltos"; var q=\'otro } [\'; /* { [ */ // ]]}}\n'
+            'var t=`template ${"[x"} con ] raro`;'
+            'var e=[{"id":"a","name":"Av. \\"Larco\\" [1] {2}","lat":-12.1,"lon":-77.0}];')
+    assert extract_stations([text]) == [{'id': "a", 'name': 'Av. "Larco" [1] {2}', 'lat': -12.1, 'lon': -77.0}]
+
+def test_corchete_desbalanceado_resincroniza():
+    text = 'var re=/\\[(\\d+)/g; x=a]; var e=[{"lat":1,"lon":2}];'
+    assert extract_stations([text]) == [{'id': None, 'name': None, 'lat': 1, 'lon': 2}]
+
+def test_array_anidado_sale_primero_el_interior():
+    text = '{"grupos":[{"estaciones":[{"lat":1,"lon":2},{"lat":3,"lon":4}]}]}'
+    spans = list(iter_station_spans(text))
+    assert len(spans) == 1
+    assert json.loads(text[slice(*spans[0])]) == [{"lat": 1, "lon": 2}, {"lat": 3, "lon": 4}]
+
+def test_json_truncado_no_falla_y_sigue_con_lo_siguiente():
+    assert extract_stations(['var a=[{"lat":1,"lon":2},{"lat":3']) == []
+    text = 'var a=[{"lat":1,"lon":2},{"lat":3; var b=[{"station_id":"x","lat":5,"lon":6}];'
+    assert extract_stations([text]) == [{'id': "x", 'name': None, 'lat': 5, 'lon': 6}]
+
+def test_array_que_no_es_json_valido_se_salta():
+    text = "var a=[{lat:1, 'lon':2, f:function(){}}]; var b=[{\"latitude\":7,\"longitude\":8}];"
+    assert list(iter_station_arrays(text)) == [[{"latitude": 7, "longitude": 8}]]
+    assert extract_stations([text]) == [{'id': None, 'name': None, 'lat': 7, 'lon': 8}]
+
+def test_sin_estaciones():
+    assert extract_stations([None, "", 'var p=[{"x":1,"y":2}]; var c={"center":[-12,-77]};']) == []
@@ -0,0 +1,92 @@
+# tests/test_quality.py
+"""citybike.quality: validación de filas y deduplicación por (franja, station_id)."""
+import os
+from collections import Counter
+
+from citybike import quality
+from citybike.model import SNAPSHOT_COLUMNS, Snapshot
+
+COLUMNS = ['scrape_timestamp', 'station_id', 'free_bikes']
+
+
+def _snap(ts, ids):
+    return Snapshot.from_rows([{'scrape_timestamp': ts, 'station_id': sid, 'free_bikes': 1} for sid in ids])
+
+
+def test_normalize_id():
+    assert quality.normalize_id(12) == quality.normalize_id(12.0) == quality.normalize_id(" 12 ") == "12"
+    assert quality.normalize_id(None) is None
+    assert quality.normalize_id("  ") is None
+    assert quality.normalize_id(float("nan")) is None
+    assert quality.normalize_id(True) is None
+
+def test_slot_of():
+    assert quality.slot_of("2025-01-06T10:29:59.999999-05:00", 1800) == "2025-01-06T10:00:00"
+    assert quality.slot_of("2025-01-06T10:30:00-05:00", 1800) == "2025-01-06T10:30:00"
+    assert quality.slot_of("2025-01-06T23:59:59-05:00", 1800) == "2025-01-06T23:30:00"
+
+def test_clean_rows_cuenta_invalidas_y_duplicadas():
+    rows = [
+        ("2025-01-06T10:00:00", "a", "3"),
+        ("2025-01-06T10:00:00", 1.0, "-2"),     # conteo negativo: se anula
+        ("2025-01-06T10:00:00", "1", 4),        # mismo id normalizado
+        ("2025-01-06T10:00:00", None, 1),
+        ("ayer", "b", 1),
+    ]
+    report = Counter()
+    out = list(quality.clean_rows(rows, COLUMNS, report=report))
+    assert out == [("2025-01-06T10:00:00", "a", 3), ("2025-01-06T10:00:00", "1", None)]
+    assert (report['filas'], report['invalidas'], report['duplicadas'], report['anulados']) == (5, 2, 1, 1)
+
+def test_dedup_en_el_cambio_de_dia(tmp_path):
+    index = quality.SeenIndex(str(tmp_path), max_days=1)
+    assert index.add("2025-01-06T23:59:00-05:00", "a")
+    assert index.add("2025-01-07T00:00:00-05:00", "a")   # otro día: clave nueva
+    assert not index.add("2025-01-07T00:00:00-05:00", "a")
+    # el 6 salió de memoria al cargar el 7 y se guardó: se lee de disco
+    assert sorted(os.listdir(tmp_path)) == ["2025-01-06.bin"]
+    assert index.seen("2025-01-06T23:59:00-05:00", "a")
+    index.save()
+    again = quality.SeenIndex(str(tmp_path))
+    assert again.seen("2025-01-07T00:00:00-05:00", "a") and not again.seen("2025-01-07T00:00:00-05:00", "b")
+
+def test_clean_rows_con_filas_de_dos_dias():
+    rows = [("2025-01-06T23:30:00", "a", 1), ("2025-01-07T00:00:00", "a", 1), ("2025-01-06T23:30:00", "a", 1)]
+    index = quality.SeenIndex(root=None, max_days=2)
+    assert len(list(quality.clean_rows(rows, COLUMNS, index))) == 2
+
+def test_reintento_en_la_misma_franja(tmp_path):
+    index = quality.SeenIndex(str(tmp_path), interval=1800)
+    snap = _snap("2025-01-06T10:01:00.123456-05:00", ["a", "b"])
+    fresh, dropped = quality.drop_seen(snap, index)
+    assert dropped == 0
+    quality.mark_stored(fresh, index)
+    retry = _snap("2025-01-06T10:04:30.5-05:00", ["a", "b", "c"])
+    fresh, dropped = quality.drop_seen(retry, quality.SeenIndex(str(tmp_path), interval=1800))
+    assert dropped == 2 and fresh.values('station_id') == ["c"]
+    fresh, dropped = quality.drop_seen(_snap("2025-01-06T10:31:00-05:00", ["a"]), index)
+    assert dropped == 0
+
+def test_indice_se_rearma_si_se_corto_entre_grabar_y_marcar(tmp_path):
+    stored = []   # lo que quedó en la partición del día
+    rebuild = lambda day: [(ts, sid) for ts, sid in stored if ts[:10] == day]  # noqa: E731
+    index = quality.SeenIndex(str(tmp_path), rebuild=rebuild, interval=1800)
+    snap = _snap("2025-01-06T10:00:00-05:00", ["a"])
+    quality.mark_stored(snap, index)
+    snap = _snap("2025-01-06T10:30:00-05:00", ["a", "b"])
+    quality.drop_seen(snap, index)
+    index.begin(snap.shared['scrape_timestamp'])
+    stored += [("2025-01-06T10:00:00-05:00", "a"), ("2025-01-06T10:30:00-05:00", "a"),
+               ("2025-01-06T10:30:00-05:00", "b")]
+    # ... y el proceso muere antes de mark_stored()
+    retry = quality.SeenIndex(str(tmp_path), rebuild=rebuild, interval=1800)
+    fresh, dropped = quality.drop_seen(_snap("2025-01-06T10:40:00-05:00", ["a", "b"]), retry)
+    assert fresh is None and dropped == 2
+    retry.save()
+    assert not os.path.exists(os.path.join(tmp_path, "2025-01-06.pending"))
+
+def test_snapshot_completo_de_snapshot_columns():
+    row = {c: None for c in SNAPSHOT_COLUMNS}
+    row.update(scrape_timestamp="2025-01-06T10:00:00-05:00", station_id="a")
+    fresh, dropped = quality.drop_seen([row, dict(row)], quality.SeenIndex(root=None))
+    assert dropped == 1 and len(fresh) == 1